@@ -0,0 +1,170 @@
+"""Throughput and accuracy of the inference backends against the Keras model.
+
+Each recording is processed with the Keras model of orcAI, the reference,
+and with every exported backend (TFLite or ONNX Runtime, optionally
+quantised). Models are exported on first use into the export cache of
+orcaigui.inference_backend. Inference time comes from the ``inference``
+stage of orcaigui.instrumentation, the fastest of ``--repeats`` runs.
+
+Accuracy is measured on the aggregated predictions: the largest and mean
+absolute difference from the reference, and the fraction of prediction
+steps and calls on the same side of the 0.5 threshold. Use held-out
+recordings, not seen in training, with ``--audio``; without it a synthetic
+recording of ``--duration`` is written to the work directory.
+
+Usage:
+    python benchmarks/inference_backends.py [--audio FILE ...]
+        [--duration 10m] [--backends tflite,tflite-float16,...]
+        [--model NAME_OR_DIR] [--repeats 3] [--max-error 0.05]
+        [--min-agreement 0.99] [--work-dir DIR] [--output FILE]
+
+The exit code is 1 if no exported backend is within ``--max-error`` and
+``--min-agreement`` of the reference.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from pipeline import parse_duration, write_synthetic_wav
+
+
+def load_reference(model: str | None):
+    from orcAI.io import load_orcai_model
+
+    from orcaigui.models import DEFAULT_MODEL, available_models
+
+    model = model or DEFAULT_MODEL
+    model_dir = Path(model) if Path(model).is_dir() else available_models()[model]
+    return model_dir, *load_orcai_model(model_dir)
+
+
+def run_backend(
+    wav_file: np.ndarray,
+    wav_path: Path,
+    orcai_parameter: dict,
+    model,
+    shape: dict,
+    repeats: int,
+) -> tuple[np.ndarray, float]:
+    """Aggregated predictions and the fastest inference time of a model."""
+    from orcaigui.audio_file_loader import compute_channel
+    from orcaigui.instrumentation import recorder
+
+    seconds = []
+    for _ in range(repeats):
+        recorder.clear()
+        results = compute_channel(wav_file, wav_path, 1, orcai_parameter, model, shape)
+        seconds.append(recorder.summary()["inference"]["wall"])
+    return results["aggregated_predictions"], min(seconds)
+
+
+def print_results(results: dict) -> None:
+    print(
+        f"{'backend':>16} {'seconds':>9} {'x realtime':>11} {'speed-up':>9}"
+        f" {'max error':>10} {'mean error':>11} {'agreement':>10}"
+    )
+    reference = results["keras"]["seconds"]
+    for backend, result in results.items():
+        seconds = result["seconds"]
+        print(
+            f"{backend:>16} {seconds:9.2f}"
+            f" {result['duration'] / seconds:11.1f} {reference / seconds:9.2f}"
+            f" {result['max_error']:10.4f} {result['mean_error']:11.5f}"
+            f" {result['agreement']:10.4f}"
+        )
+
+
+def main(argv=None) -> int:
+    from orcaigui.inference_backend import BACKENDS, available_backends
+
+    exported = [backend for backend in available_backends() if BACKENDS[backend][0]]
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--audio", type=Path, nargs="+", default=None)
+    parser.add_argument("--duration", default="10m")
+    parser.add_argument("--backends", default=",".join(exported))
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-error", type=float, default=0.05)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--work-dir", type=Path, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    from orcaigui.audio_file_loader import load_recording
+    from orcaigui.inference_backend import backend_model, compare_predictions
+
+    work_dir = args.work_dir or Path(tempfile.gettempdir()) / "orcaigui-benchmarks"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    audio = args.audio
+    if audio is None:
+        wav_path = work_dir / f"synthetic_{args.duration}_1ch.wav"
+        if not wav_path.exists():
+            print(f"Writing {wav_path.name}...", file=sys.stderr)
+            write_synthetic_wav(wav_path, parse_duration(args.duration), 1)
+        audio = [wav_path]
+    model_dir, keras_model, orcai_parameter, shape = load_reference(args.model)
+    sampling_rate = orcai_parameter["spectrogram"]["sampling_rate"]
+
+    # per backend: predictions of all recordings, inference seconds, duration
+    predictions = {}
+    seconds = {}
+    duration = 0.0
+    backends = ["keras", *args.backends.split(",")]
+    models = {}
+    for backend in backends:
+        try:
+            models[backend] = backend_model(keras_model, model_dir, shape, backend)
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}", file=sys.stderr)
+    for wav_path in audio:
+        wav_file = load_recording(wav_path, sampling_rate)
+        duration += wav_file.shape[-1] / sampling_rate
+        for backend, model in models.items():
+            print(f"Running {wav_path.name} with {backend}...", file=sys.stderr)
+            backend_predictions, backend_seconds = run_backend(
+                wav_file, wav_path, orcai_parameter, model, shape, args.repeats
+            )
+            predictions.setdefault(backend, []).append(backend_predictions)
+            seconds[backend] = seconds.get(backend, 0.0) + backend_seconds
+
+    reference = np.concatenate(predictions["keras"])
+    results = {
+        backend: {
+            "seconds": seconds[backend],
+            "duration": duration,
+            **compare_predictions(reference, np.concatenate(predictions[backend])),
+        }
+        for backend in models
+    }
+    print_results(results)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    acceptable = [
+        backend
+        for backend, result in results.items()
+        if backend != "keras"
+        and result["max_error"] <= args.max_error
+        and result["agreement"] >= args.min_agreement
+    ]
+    if len(results) == 1:
+        print("No exported backend could be run")
+        return 1
+    if not acceptable:
+        print("No exported backend is as accurate as required")
+        return 1
+    fastest = min(acceptable, key=lambda backend: results[backend]["seconds"])
+    print(
+        f"Fastest accurate backend: {fastest}, "
+        f"{results['keras']['seconds'] / results[fastest]['seconds']:.2f} times "
+        "as fast as keras"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Scaling of label operations with the number of labels.
+
+Builds OrcaiData objects with synthetic label tables of increasing size and
+times the label operations headlessly, wired like the main window:
+
+interactive, once per key press or click
+    update_label_texts, mark_as_correct (including the label update in the
+    spectrogram and moving to the next label), update_prediction_label,
+    create_new_label (including drawing the label in the spectrogram)
+bulk, once per file operation
+    export_labels_as_tsv, save_labels, load_labels (HDF5 label table)
+
+The exponent of each operation is the slope of log time against log label
+count. An interactive action with a slope above ``--max-slope`` grows faster
+than O(log n) and is flagged; over 1k to 100k labels a logarithmic cost has a
+slope of about 0.1. Bulk operations are flagged above ``--max-bulk-slope``.
+
+Usage:
+    python benchmarks/label_scaling.py [--sizes 1000,3000,...,100000]
+        [--repeats 20] [--max-slope 0.25] [--max-bulk-slope 1.25]
+        [--output curves.json]
+
+The exit code is 1 if an operation is flagged.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pandas as pd
+
+INTERACTIVE = (
+    "update_label_texts",
+    "mark_as_correct",
+    "update_prediction_label",
+    "create_new_label",
+)
+BULK = ("export_labels_as_tsv", "save_labels", "load_labels")
+CALLS = ["KW", "SW", "BR", "HE"]
+SPECTROGRAM_PARAMETER = {"sampling_rate": 48000, "n_overlap": 512}
+N_FREQUENCIES = 16  # the label operations do not depend on the spectrogram
+STEPS_PER_LABEL = 10
+PREDICTION_STEP = 8
+
+
+def make_data(n_labels: int, seed: int = 0):
+    """OrcaiData with ``n_labels`` short labels and a minimal spectrogram."""
+    from orcaigui.orcaidata import OrcaiData
+
+    rng = np.random.default_rng(seed)
+    n_steps = n_labels * STEPS_PER_LABEL
+    starts = np.arange(n_labels) * STEPS_PER_LABEL
+    labels = pd.DataFrame(
+        {
+            "start": starts,
+            "stop": starts + rng.integers(2, STEPS_PER_LABEL, n_labels),
+            "label": rng.choice([f"{call}*" for call in CALLS], n_labels),
+            "label_checked": False,
+            "label_ok": True,
+            "label_source": "auto",
+        }
+    )
+    step = SPECTROGRAM_PARAMETER["n_overlap"] / SPECTROGRAM_PARAMETER["sampling_rate"]
+    return OrcaiData(
+        recording_path=Path("synthetic.wav"),
+        channel=1,
+        spectrogram=rng.random((N_FREQUENCIES, n_steps), dtype=np.float32),
+        frequencies=np.linspace(
+            0, SPECTROGRAM_PARAMETER["sampling_rate"] / 2, N_FREQUENCIES
+        ),
+        times=np.arange(n_steps) * step,
+        pp_spectrogram=rng.random((n_steps, N_FREQUENCIES), dtype=np.float32),
+        aggregated_predictions=rng.random((n_steps // PREDICTION_STEP, len(CALLS))),
+        prediction_times=np.arange(n_steps // PREDICTION_STEP) * PREDICTION_STEP,
+        predicted_labels=labels,
+    )
+
+
+def median_time(func, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def run_size(n_labels: int, repeats: int, work_dir: Path) -> dict[str, float]:
+    """Median seconds per call of every operation for one label count."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QWidget
+
+    from orcaigui.curate_widget import CurateWidget
+    from orcaigui.orcaidata import read_labels, write_labels
+    from orcaigui.spectrogram_widget import SpectrogramWidget
+
+    app = QApplication.instance() or QApplication([])
+    data = make_data(n_labels)
+
+    # stand-in for the main window, with what CurateWidget reads from it
+    host = QWidget()
+    host.username = "benchmark"
+    host.orcai_parameter = {"calls": list(CALLS)}
+    spectrogram_widget = SpectrogramWidget(
+        spectrogram_parameter=SPECTROGRAM_PARAMETER, calls=list(CALLS)
+    )
+    curate_widget = CurateWidget(host)
+    curate_widget.label.connect(spectrogram_widget.focus_on_label)
+    curate_widget.label_updated.connect(spectrogram_widget.update_prediction_label)
+    spectrogram_widget.update_data(data)
+    curate_widget.update_data(data)
+    app.processEvents()
+
+    rng = np.random.default_rng(1)
+
+    def update_prediction_label():
+        spectrogram_widget.update_prediction_label(
+            int(rng.integers(len(data.predicted_labels))), True
+        )
+
+    def create_new_label():
+        curate_widget.create_new_label(
+            int(rng.integers(len(data.times))), extent=4, label_name="KW"
+        )
+        spectrogram_widget.update_label_count()
+
+    project_path = work_dir / f"labels_{n_labels}.hdf5"
+
+    def save_labels():
+        with h5py.File(project_path, "w") as f:
+            write_labels(f.create_group("predicted_labels"), data.predicted_labels)
+
+    def load_labels():
+        with h5py.File(project_path, "r") as f:
+            read_labels(f["predicted_labels"])
+
+    operations = {
+        "update_label_texts": curate_widget.update_label_texts,
+        "mark_as_correct": curate_widget.mark_as_correct,
+        "update_prediction_label": update_prediction_label,
+        "create_new_label": create_new_label,
+        "export_labels_as_tsv": lambda: data.export_labels_as_tsv(
+            work_dir / f"labels_{n_labels}.txt"
+        ),
+        "save_labels": save_labels,
+        "load_labels": load_labels,
+    }
+    results = {}
+    for name, func in operations.items():
+        # bulk operations are slow at large sizes and vary little
+        results[name] = median_time(
+            func, repeats if name in INTERACTIVE else max(1, repeats // 5)
+        )
+        app.processEvents()
+    return results
+
+
+def slope(sizes: list[int], seconds: list[float]) -> float:
+    """Exponent of a power law fitted to the timings, in log-log space."""
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+
+def print_results(
+    sizes: list[int], curves: dict, slopes: dict, flagged: set[str]
+) -> None:
+    print(f"{'operation':>24}" + "".join(f"{n:>10}" for n in sizes) + f"{'slope':>8}")
+    for name, seconds in curves.items():
+        print(
+            f"{name:>24}"
+            + "".join(f"{s * 1000:8.2f}ms" for s in seconds)
+            + f"{slopes[name]:8.2f}"
+            + ("  FLAGGED" if name in flagged else "")
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1000,3000,10000,30000,100000")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--max-slope", type=float, default=0.25)
+    parser.add_argument("--max-bulk-slope", type=float, default=1.25)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    curves = {name: [] for name in (*INTERACTIVE, *BULK)}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_labels in sizes:
+            print(f"Timing {n_labels} labels...", file=sys.stderr)
+            for name, seconds in run_size(
+                n_labels, args.repeats, Path(tmp_dir)
+            ).items():
+                curves[name].append(seconds)
+
+    slopes = {name: slope(sizes, seconds) for name, seconds in curves.items()}
+    flagged = {
+        name
+        for name, value in slopes.items()
+        if value > (args.max_slope if name in INTERACTIVE else args.max_bulk_slope)
+    }
+    print_results(sizes, curves, slopes, flagged)
+
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps({"sizes": sizes, "seconds": curves, "slopes": slopes}, indent=2)
+        )
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""End-to-end benchmark of the processing pipeline on synthetic recordings.
+
+Synthetic multi-channel WAVs with noise and tonal call-like sweeps are
+generated once per duration (and kept in the work directory). Each
+recording is then run through decode -> spectrogram -> preprocessing ->
+predictions -> labels -> SpectrogramWidget.update_plots (offscreen) ->
+save_as_hdf5 -> load_from_hdf5_file in a fresh process, so peak memory is
+measured per recording. Stage times come from orcaigui.instrumentation.
+
+``stand-in`` replaces the neural network by a cheap band-energy model with
+the output shape of the orcAI models, to measure everything around
+inference. ``bundled`` uses the model shipped with orcAI.
+
+Usage:
+    python benchmarks/pipeline.py [--durations 1m,10m,1h] [--channels 4]
+        [--model stand-in|bundled|all] [--work-dir DIR]
+        [--save-baseline FILE] [--baseline FILE] [--tolerance 1.25]
+
+With ``--baseline`` the exit code is 1 if a stage is slower than
+``tolerance`` times its baseline.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import soundfile
+
+STAGES = (
+    "decode",
+    "stft",
+    "preprocess",
+    "inference",
+    "labels",
+    "render",
+    "save",
+    "load",
+)
+MODELS = ("stand-in", "bundled")
+CHUNK_SECONDS = 60
+MIN_STAGE_SECONDS = 0.05  # shorter stages are too noisy to compare
+
+
+def parse_duration(text: str) -> float:
+    """Seconds of a duration such as ``90s``, ``10m`` or ``24h``."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def write_synthetic_wav(
+    path: Path,
+    duration: float,
+    n_channels: int,
+    sampling_rate: int = 48000,
+    seed: int = 0,
+) -> None:
+    """Write noise with random harmonic sweeps, chunk by chunk.
+
+    Every channel gets its own calls, about one every five seconds, lasting
+    0.3 to 1.5 s with a fundamental sweeping between 1 and 6 kHz.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sampling_rate)
+    chunk = CHUNK_SECONDS * sampling_rate
+    with soundfile.SoundFile(
+        path, "w", samplerate=sampling_rate, channels=n_channels, subtype="PCM_16"
+    ) as f:
+        for start in range(0, n_samples, chunk):
+            length = min(chunk, n_samples - start)
+            audio = rng.normal(0, 0.01, (length, n_channels)).astype(np.float32)
+            t = np.arange(length) / sampling_rate
+            for channel in range(n_channels):
+                n_calls = rng.poisson(length / sampling_rate / 5)
+                for onset in rng.uniform(0, length / sampling_rate, n_calls):
+                    call_duration = rng.uniform(0.3, 1.5)
+                    inside = (t >= onset) & (t < onset + call_duration)
+                    tau = t[inside] - onset
+                    f0, f1 = rng.uniform(1000, 6000, 2)
+                    phase = (
+                        2 * np.pi * (f0 * tau + (f1 - f0) * tau**2 / 2 / call_duration)
+                    )
+                    envelope = np.sin(np.pi * tau / call_duration)
+                    audio[inside, channel] += (
+                        0.2 * envelope * (np.sin(phase) + 0.5 * np.sin(2 * phase))
+                    )
+            f.write(np.clip(audio, -1, 1))
+
+
+class StandInModel:
+    """Cheap replacement for an orcAI model with the same output shape.
+
+    Predictions are a sigmoid of the band energy of the input, pooled in time
+    by ``2 ** n_filters`` like the orcAI models.
+    """
+
+    def __init__(self, n_calls: int, n_filters: int):
+        self.n_calls = n_calls
+        self.pool = 2**n_filters
+
+    def predict(self, x, *args, **kwargs):
+        x = np.asarray(x, dtype=np.float32)
+        n_batch, n_time = x.shape[:2]
+        energy = x.reshape(n_batch, n_time, -1).mean(axis=2)
+        n_out = n_time // self.pool
+        pooled = energy[:, : n_out * self.pool].reshape(n_batch, n_out, self.pool)
+        pooled = pooled.mean(axis=2)
+        pooled = (pooled - pooled.mean()) / (pooled.std() + 1e-6)
+        bands = pooled[:, :, None] - np.arange(self.n_calls)[None, None, :]
+        return 1 / (1 + np.exp(-bands))
+
+    __call__ = predict
+
+
+def load_model(model_name: str):
+    from importlib.resources import files
+
+    from orcAI.io import load_orcai_model
+
+    from orcaigui.models import DEFAULT_MODEL
+
+    model, orcai_parameter, shape = load_orcai_model(
+        files("orcAI.models").joinpath(DEFAULT_MODEL)
+    )
+    if model_name == "stand-in":
+        model = StandInModel(
+            len(orcai_parameter["calls"]), len(orcai_parameter["model"]["filters"])
+        )
+    return model, orcai_parameter, shape
+
+
+def run_case(wav_path: Path, model_name: str, work_dir: Path) -> dict:
+    """Run the whole pipeline on one recording, in the current process."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from librosa import load
+    from PyQt6.QtWidgets import QApplication
+
+    from orcaigui.audio_file_loader import compute_channel
+    from orcaigui.instrumentation import peak_rss, recorder, stage
+    from orcaigui.orcaidata import OrcaiData
+    from orcaigui.spectrogram_widget import SpectrogramWidget
+
+    app = QApplication.instance() or QApplication([])
+    model, orcai_parameter, shape = load_model(model_name)
+    recorder.clear()
+
+    with stage("decode") as record:
+        wav_file, _ = load(
+            wav_path, sr=orcai_parameter["spectrogram"]["sampling_rate"], mono=False
+        )
+        record.size(audio=wav_file)
+    data = OrcaiData(
+        **compute_channel(wav_file, wav_path, 1, orcai_parameter, model, shape)
+    )
+    del wav_file
+    widget = SpectrogramWidget(
+        spectrogram_parameter=orcai_parameter["spectrogram"],
+        calls=orcai_parameter["calls"],
+    )
+    widget.update_data(data)
+    app.processEvents()
+    project_path = work_dir / f"{wav_path.stem}_{model_name}.hdf5.orcai"
+    data.save_as_hdf5(project_path)
+    with stage("load"):
+        OrcaiData.load_from_hdf5_file(project_path)
+    project_size = project_path.stat().st_size
+    project_path.unlink()
+
+    stages = {name: summary["wall"] for name, summary in recorder.summary().items()}
+    return {
+        "stages": stages,
+        "peak_rss": peak_rss(),
+        "labels": len(data.predicted_labels),
+        "project_bytes": project_size,
+    }
+
+
+def run_isolated(wav_path: Path, model_name: str, work_dir: Path) -> dict:
+    """Run a case in a fresh process so peak memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (wav_path, model_name, work_dir))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Stages slower than ``tolerance`` times the baseline."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for name, seconds in result["stages"].items():
+            reference = baseline[key]["stages"].get(name)
+            if reference is None or max(seconds, reference) < MIN_STAGE_SECONDS:
+                continue
+            if seconds > tolerance * reference:
+                regressions.append(
+                    f"{key} {name}: {seconds:.2f} s, baseline {reference:.2f} s"
+                )
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    print(
+        f"{'recording':>24} {'stage':>10} {'seconds':>9} {'x realtime':>11}"
+        f" {'peak RSS':>10}"
+    )
+    for key, result in results.items():
+        duration = result["duration"]
+        for name in STAGES:
+            seconds = result["stages"].get(name)
+            if seconds is None:
+                continue
+            speed = duration / seconds if seconds > 0 else float("inf")
+            print(
+                f"{key:>24} {name:>10} {seconds:9.2f} {speed:11.1f}"
+                f" {result['peak_rss'] / 2**20:7.0f} MB"
+            )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--durations", default="1m,10m,1h")
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--model", choices=(*MODELS, "all"), default="stand-in")
+    parser.add_argument("--sampling-rate", type=int, default=48000)
+    parser.add_argument("--work-dir", type=Path, default=None)
+    parser.add_argument("--save-baseline", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or Path(tempfile.gettempdir()) / "orcaigui-benchmarks"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    models = MODELS if args.model == "all" else (args.model,)
+
+    results = {}
+    for text in args.durations.split(","):
+        duration = parse_duration(text)
+        wav_path = work_dir / f"synthetic_{text}_{args.channels}ch.wav"
+        if not wav_path.exists():
+            print(f"Writing {wav_path.name}...", file=sys.stderr)
+            write_synthetic_wav(
+                wav_path, duration, args.channels, sampling_rate=args.sampling_rate
+            )
+        for model_name in models:
+            print(f"Running {wav_path.name} with {model_name}...", file=sys.stderr)
+            result = run_isolated(wav_path, model_name, work_dir)
+            result["duration"] = duration
+            results[f"{text} {model_name}"] = result
+    print_results(results)
+
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+    if args.baseline is not None:
+        regressions = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Compare project file size and memory for the spectrogram storage options.
+
+Usage: python benchmarks/storage.py <project.hdf5.orcai>
+"""
+
+import sys
+import tempfile
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+
+from orcaigui.orcaidata import (
+    PP_SPECTROGRAM_STORAGE,
+    SPECTROGRAM_STORAGE,
+    OrcaiData,
+)
+
+
+def _mb(n_bytes: int) -> str:
+    return f"{n_bytes / 2**20:9.1f} MB"
+
+
+def main(project_path: Path):
+    data = OrcaiData.load_from_hdf5_file(project_path)
+    reference = data.spectrogram_values().astype(np.float64)
+    print(f"{project_path.name}: spectrogram {data.spectrogram.shape}")
+    print(
+        f"{'spectrogram':>12} {'pp_spectrogram':>15} {'file':>12} {'memory':>12}"
+        f" {'max error':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for spectrogram_storage, pp_spectrogram_storage in product(
+            SPECTROGRAM_STORAGE, PP_SPECTROGRAM_STORAGE
+        ):
+            file_path = Path(tmp_dir) / "project.hdf5.orcai"
+            data.save_as_hdf5(
+                file_path,
+                spectrogram_storage=spectrogram_storage,
+                pp_spectrogram_storage=pp_spectrogram_storage,
+            )
+            loaded = OrcaiData.load_from_hdf5_file(file_path)
+            error = np.max(np.abs(loaded.spectrogram_values() - reference))
+            print(
+                f"{spectrogram_storage:>12} {pp_spectrogram_storage:>15}"
+                f" {_mb(file_path.stat().st_size)} {_mb(sum(loaded.memory_usage().values()))}"
+                f" {error:10.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]))
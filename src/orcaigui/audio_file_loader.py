@@ -1,8 +1,16 @@
+import multiprocessing
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing import shared_memory
 from pathlib import Path
 
+import h5py
 import numpy as np
 import pandas as pd
-from librosa import load
+from librosa import load, resample
 from orcAI.predict import (
     compute_aggregated_predictions,
     compute_binary_predictions,
@@ -14,7 +22,21 @@ from orcAI.spectrogram import (
 )
 from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
 
-from orcaigui.orcaidata import OrcaiData
+from orcaigui.inference_backend import DEFAULT_BACKEND, load_model_backend
+from orcaigui.instrumentation import StageRecord, recorder, stage
+from orcaigui.merge import merge_projects
+from orcaigui.orcaidata import (
+    PROJECT_ARRAYS,
+    OrcaiData,
+    ProjectInfo,
+    probe_project,
+    read_labels,
+)
+from orcaigui.scheduler import configure_worker, scheduler
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
 
 
 def _convert_seconds_to_steps(
@@ -46,6 +68,170 @@ def _convert_seconds_to_steps(
     return predicted_labels
 
 
+def channel_count(wav_file: np.ndarray) -> int:
+    """Number of channels of audio decoded by librosa with ``mono=False``."""
+    return wav_file.shape[0] if wav_file.ndim > 1 else 1
+
+
+@dataclass
+class WavLayout:
+    """Where the samples of a WAV file are and how they are encoded."""
+
+    data_offset: int
+    n_frames: int
+    n_channels: int
+    sampling_rate: int
+    sample_width: int  # bytes
+    is_float: bool
+
+
+def wav_layout(path: Path) -> WavLayout:
+    """Read the header of a WAV file that may still be written.
+
+    Recorders often only update the size of the data chunk when the file is
+    closed, so the frames are counted from the file size unless a chunk
+    follows the data chunk.
+    """
+    file_size = Path(path).stat().st_size
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError(f"{path} is not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                f.seek(chunk_size % 2, 1)
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+        if fmt is None:
+            raise ValueError(f"{path} has no format chunk")
+        format_tag, n_channels, sampling_rate, _, block_align, bits = struct.unpack(
+            "<HHIIHH", fmt[:16]
+        )
+        if format_tag == WAVE_FORMAT_EXTENSIBLE:
+            format_tag = struct.unpack("<H", fmt[24:26])[0]
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"{path} has an unsupported sample format")
+
+        data_size = file_size - data_offset
+        data_end = data_offset + chunk_size + chunk_size % 2
+        if 0 < chunk_size < 0xFFFFFFFF and data_end + 8 <= file_size:
+            f.seek(data_end)
+            next_id, next_size = struct.unpack("<4sI", f.read(8))
+            if next_id.isalnum() and data_end + 8 + next_size <= file_size:
+                data_size = chunk_size
+    return WavLayout(
+        data_offset=data_offset,
+        n_frames=data_size // block_align,
+        n_channels=n_channels,
+        sampling_rate=sampling_rate,
+        sample_width=bits // 8,
+        is_float=format_tag == WAVE_FORMAT_IEEE_FLOAT,
+    )
+
+
+def read_frames(path: Path, layout: WavLayout, first: int, last: int) -> np.ndarray:
+    """Decode frames ``first`` to ``last`` as float32, (channels, frames)."""
+    frame_size = layout.sample_width * layout.n_channels
+    with open(path, "rb") as f:
+        f.seek(layout.data_offset + first * frame_size)
+        raw = f.read((last - first) * frame_size)
+    raw = raw[: len(raw) // frame_size * frame_size]
+    if layout.is_float:
+        dtype = "<f4" if layout.sample_width == 4 else "<f8"
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    elif layout.sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif layout.sample_width == 3:
+        bytes_ = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = bytes_[:, 0] | (bytes_[:, 1] << 8) | (bytes_[:, 2] << 16)
+        values = np.where(values >= 2**23, values - 2**24, values)
+        samples = values.astype(np.float32) / 2**23
+    else:
+        bits = 8 * layout.sample_width
+        samples = np.frombuffer(raw, dtype=f"<i{layout.sample_width}").astype(
+            np.float32
+        ) / np.float32(2 ** (bits - 1))
+    return samples.reshape(-1, layout.n_channels).T
+
+
+def load_recording(recording_path: Path, sampling_rate: float) -> np.ndarray:
+    """Decode and resample a recording, (channels, samples) or (samples,).
+
+    A WAV file that is still being recorded may not have the size of its
+    data in the header yet, so librosa reads less than the file holds. It
+    is then decoded from the file size instead.
+    """
+    with scheduler.slot("decode"):
+        wav_file, _ = load(recording_path, sr=sampling_rate, mono=False)
+        if Path(recording_path).suffix.lower() != ".wav":
+            return wav_file
+        layout = wav_layout(recording_path)
+        n_samples = int(layout.n_frames * sampling_rate / layout.sampling_rate)
+        if wav_file.shape[-1] >= n_samples - 1:
+            return wav_file
+        wav_file = read_frames(recording_path, layout, 0, layout.n_frames)
+        if layout.sampling_rate != sampling_rate:
+            wav_file = resample(
+                wav_file, orig_sr=layout.sampling_rate, target_sr=sampling_rate
+            )
+    return wav_file[0] if layout.n_channels == 1 else wav_file
+
+
+class DecodedAudioCache:
+    """Decoded recordings, least recently used dropped first.
+
+    Holds at most ``max_bytes`` of audio so other channels of recently
+    opened recordings can be processed without decoding the file again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._audio: OrderedDict[tuple[Path, float], np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._audio)
+
+    def nbytes(self) -> int:
+        return sum(wav_file.nbytes for wav_file in self._audio.values())
+
+    def get(self, recording_path: Path, sampling_rate: float) -> np.ndarray | None:
+        key = (Path(recording_path).resolve(), sampling_rate)
+        wav_file = self._audio.get(key)
+        if wav_file is not None:
+            self._audio.move_to_end(key)
+        return wav_file
+
+    def put(
+        self, recording_path: Path, sampling_rate: float, wav_file: np.ndarray
+    ) -> None:
+        if wav_file.nbytes > self.max_bytes:
+            return
+        key = (Path(recording_path).resolve(), sampling_rate)
+        self._audio[key] = wav_file
+        self._audio.move_to_end(key)
+        while self.nbytes() > self.max_bytes:
+            self._audio.popitem(last=False)
+
+    def evict(self) -> bool:
+        """Drop the least recently used recording, if there is one."""
+        if not self._audio:
+            return False
+        self._audio.popitem(last=False)
+        return True
+
+    def clear(self) -> None:
+        self._audio.clear()
+
+
 class AudioFileLoaderSignals(QObject):
     """Signals for the AudioFileLoader class."""
 
@@ -66,12 +252,10 @@ class AudioFileLoader(QRunnable):
             self.signals.progress.emit(
                 f"(1/5) Loading & resampling {self.recording_path.name}..."
             )
-            wav_file, _ = load(
-                self.recording_path,
-                sr=self.sampling_rate,
-                mono=False,
-            )
-            n_channels = wav_file.ndim
+            with stage("decode", recording=self.recording_path.name) as record:
+                wav_file = load_recording(self.recording_path, self.sampling_rate)
+                record.size(audio=wav_file)
+            n_channels = channel_count(wav_file)
         except Exception as e:
             print(e)
             self.signals.error.emit((type(e), e))
@@ -85,6 +269,115 @@ class AudioFileLoader(QRunnable):
             )
 
 
+def compute_channel(
+    wav_file: np.ndarray,
+    recording_path: Path,
+    channel: int,
+    orcai_parameter: dict,
+    model,
+    shape: dict,
+    progress=None,
+    inference_lock=None,
+) -> dict:
+    """Spectrogram, predictions and labels of one channel of a recording.
+
+    Parameters
+    ----------
+    wav_file : np.ndarray
+        Decoded audio, (channels, samples) or (samples,).
+    recording_path : Path
+        Path of the recording.
+    channel : int
+        Channel to process, starting at 1.
+    orcai_parameter : dict
+        orcAI model parameters.
+    model :
+        orcAI model.
+    shape : dict
+        Input shape of the model.
+    progress : callable | None
+        Called with a message before each step.
+    inference_lock : context manager | None
+        Held while the model runs instead of an inference slot of the
+        scheduler, e.g. a semaphore shared between processes.
+
+    Returns
+    -------
+    dict
+        Keyword arguments of ``OrcaiData``.
+    """
+    progress = progress or (lambda message: None)
+    name = recording_path.name
+    info = {"recording": name, "channel": channel}
+    progress(f"(2/5) Calculating spectrogram for {name}...")
+    with scheduler.slot("stft"), stage("stft", **info) as record:
+        spectrogram, frequencies, times = calculate_spectrogram(
+            wav_file,
+            channel=channel,
+            spectrogram_parameter=orcai_parameter["spectrogram"],
+        )
+        record.size(spectrogram=spectrogram)
+
+    progress(f"(3/5) Preprocessing spectrogram for {name}...")
+    with scheduler.slot("stft"), stage("preprocess", **info) as record:
+        pp_spectrogram = preprocess_spectrogram(
+            spectrogram, frequencies, orcai_parameter["spectrogram"]
+        )
+        record.size(pp_spectrogram=pp_spectrogram)
+
+    progress(f"(4/5) Computing predictions for {name}...")
+    with (
+        inference_lock or scheduler.slot("inference"),
+        stage("inference", model=orcai_parameter["name"], **info) as record,
+    ):
+        aggregated_predictions, overlap_count = compute_aggregated_predictions(
+            recording_path=recording_path,
+            spectrogram=pp_spectrogram,
+            model=model,
+            orcai_parameter=orcai_parameter,
+            shape=shape,
+        )
+        record.size(aggregated_predictions=aggregated_predictions)
+    time_steps_per_output_step = 2 ** len(orcai_parameter["model"]["filters"])
+    prediction_times = (
+        np.arange(0, len(aggregated_predictions)) * time_steps_per_output_step
+    )
+
+    progress(f"5/5 Computing labels for {name}...")
+    with stage("labels", **info) as record:
+        row_starts, row_stops, label_names = compute_binary_predictions(
+            aggregated_predictions=aggregated_predictions,
+            overlap_count=overlap_count,
+            calls=orcai_parameter["calls"],
+            threshold=0.5,
+        )
+        predicted_labels = compute_labels(
+            row_starts,
+            row_stops,
+            label_names,
+            time_steps_per_output_step=time_steps_per_output_step,
+            label_suffix="*",
+        )
+        record.size(predicted_labels=predicted_labels)
+    predicted_labels["label_source"] = f"auto:{orcai_parameter['name']}"
+    predicted_labels["label_checked"] = False
+    predicted_labels["label_ok"] = True
+
+    return {
+        "recording_path": recording_path,
+        "channel": channel,
+        "spectrogram": spectrogram,
+        "frequencies": frequencies,
+        "times": times,
+        "pp_spectrogram": pp_spectrogram,
+        "aggregated_predictions": aggregated_predictions,
+        "prediction_times": prediction_times,
+        "predicted_labels": predicted_labels,
+        "model_name": orcai_parameter["name"],
+        "spectrogram_parameter": orcai_parameter["spectrogram"],
+    }
+
+
 class SpectrogramProcessorSignals(QObject):
     """Signals for the SpectrogramProcessor class."""
 
@@ -113,89 +406,362 @@ class SpectrogramProcessor(QRunnable):
         self.model = model
 
     def run(self):
-        self.signals.progress.emit(
-            f"(2/5) Calculating spectrogram for {self.recording_path.name}..."
-        )
         try:
-            spectrogram, frequencies, times = calculate_spectrogram(
+            results = compute_channel(
                 self.wav_file,
-                channel=1,
-                spectrogram_parameter=self.orcai_parameter["spectrogram"],
+                self.recording_path,
+                self.channel,
+                self.orcai_parameter,
+                self.model,
+                self.shape,
+                progress=self.signals.progress.emit,
             )
         except Exception as e:
             print(e)
             self.signals.error.emit((type(e), e))
             return
 
-        self.signals.progress.emit(
-            f"(3/5) Preprocessing spectrogram for {self.recording_path.name}..."
+        self.signals.progress.emit(f"Loaded file {self.recording_path.name}")
+        self.signals.result.emit(OrcaiData(**results))
+
+
+_worker_models = {}
+
+
+def process_channel(
+    shm_name: str,
+    audio_shape: tuple[int, ...],
+    audio_dtype: str,
+    recording_path: Path,
+    channel: int,
+    orcai_parameter: dict,
+    model_dir: Path,
+    backend: str = DEFAULT_BACKEND,
+) -> tuple[dict, list[StageRecord]]:
+    """Process one channel of audio in shared memory in a worker process.
+
+    The model is loaded once per worker process, for the inference backend
+    ``backend``. Returns the arguments of an ``OrcaiData``, which is
+    constructed in the main process, and the stage records made while
+    processing.
+    """
+    recorder.clear()
+    if (model_dir, backend) not in _worker_models:
+        model, _, shape = load_model_backend(model_dir, backend)
+        _worker_models[(model_dir, backend)] = (model, shape)
+    model, shape = _worker_models[(model_dir, backend)]
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        wav_file = np.ndarray(audio_shape, dtype=audio_dtype, buffer=shm.buf)
+        results = compute_channel(
+            wav_file, recording_path, channel, orcai_parameter, model, shape
         )
+        del wav_file
+    finally:
+        shm.close()
+    return results, list(recorder.records)
+
 
+class AllChannelsProcessorSignals(QObject):
+    """Signals for the AllChannelsProcessor class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    decoded = pyqtSignal(object)
+    result = pyqtSignal(OrcaiData)
+    finished = pyqtSignal()
+
+
+class AllChannelsProcessor(QRunnable):
+    """Processes several channels of a recording in parallel worker processes.
+
+    The decoded audio is placed in shared memory once and every worker reads
+    its channel from there, so channels are neither copied to the workers
+    nor processed under the GIL of the GUI process. One ``OrcaiData`` is
+    emitted per channel as soon as it is done.
+
+    If ``wav_file`` is None the recording is decoded first and the audio is
+    emitted with ``decoded``.
+    """
+
+    def __init__(
+        self,
+        wav_file: np.ndarray | None,
+        recording_path: Path,
+        orcai_parameter: dict,
+        model_dir: Path,
+        skip_channels: set[int] = frozenset(),
+        max_workers: int | None = None,
+        backend: str = DEFAULT_BACKEND,
+    ):
+        super().__init__()
+        self.signals = AllChannelsProcessorSignals()
+        self.wav_file = wav_file
+        self.recording_path = recording_path
+        self.orcai_parameter = orcai_parameter
+        self.model_dir = model_dir
+        self.skip_channels = skip_channels
+        self.max_workers = max_workers
+        self.backend = backend
+
+    def run(self):
+        shm = None
         try:
-            pp_spectrogram = preprocess_spectrogram(
-                spectrogram, frequencies, self.orcai_parameter["spectrogram"]
+            if self.wav_file is None:
+                self.signals.progress.emit(
+                    f"Loading & resampling {self.recording_path.name}..."
+                )
+                with stage("decode", recording=self.recording_path.name) as record:
+                    self.wav_file = load_recording(
+                        self.recording_path,
+                        self.orcai_parameter["spectrogram"]["sampling_rate"],
+                    )
+                    record.size(audio=self.wav_file)
+                self.signals.decoded.emit(self.wav_file)
+            channels = [
+                channel
+                for channel in range(1, channel_count(self.wav_file) + 1)
+                if channel not in self.skip_channels
+            ]
+            if not channels:
+                self.signals.progress.emit("All channels are processed already")
+                return
+            max_workers = self.max_workers or min(len(channels), os.cpu_count() or 1)
+            shm = shared_memory.SharedMemory(create=True, size=self.wav_file.nbytes)
+            shared = np.ndarray(
+                self.wav_file.shape, dtype=self.wav_file.dtype, buffer=shm.buf
+            )
+            shared[:] = self.wav_file
+            del shared
+
+            self.signals.progress.emit(
+                f"Processing {len(channels)} channels of "
+                f"{self.recording_path.name} in {max_workers} processes..."
             )
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure_worker,
+                initargs=(max_workers,),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        process_channel,
+                        shm.name,
+                        self.wav_file.shape,
+                        self.wav_file.dtype.str,
+                        self.recording_path,
+                        channel,
+                        self.orcai_parameter,
+                        self.model_dir,
+                        self.backend,
+                    ): channel
+                    for channel in channels
+                }
+                for n_done, future in enumerate(as_completed(futures), start=1):
+                    results, records = future.result()
+                    recorder.extend(records)
+                    self.signals.result.emit(OrcaiData(**results))
+                    self.signals.progress.emit(
+                        f"Processed channel {futures[future]} of "
+                        f"{self.recording_path.name} "
+                        f"({n_done}/{len(channels)})"
+                    )
         except Exception as e:
             print(e)
             self.signals.error.emit((type(e), e))
-            return
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            self.signals.finished.emit()
 
-        self.signals.progress.emit(
-            f"(4/5) Computing predictions for {self.recording_path.name}..."
-        )
+
+class ProjectFileLoaderSignals(QObject):
+    """Signals for the ProjectFileLoader class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    preview = pyqtSignal(OrcaiData)
+    result = pyqtSignal(OrcaiData)
+    cancelled = pyqtSignal()
+
+
+class ProjectFileLoader(QRunnable):
+    """Loads an orcAI project file in the background.
+
+    Labels, predictions and a low-resolution overview of the spectrogram are
+    read first and emitted as a preview, so they can be shown before the
+    full arrays have been read. Arrays are read in chunks of about
+    ``chunk_bytes`` along their time axis.
+    """
+
+    # the time axis of arrays that do not have it first
+    TIME_AXES = {"spectrogram": 1}
+
+    def __init__(
+        self,
+        project_path: Path,
+        overview_frames: int = 4000,
+        chunk_bytes: int = 32 * 2**20,
+    ):
+        super().__init__()
+        self.signals = ProjectFileLoaderSignals()
+        self.project_path = project_path
+        self.overview_frames = overview_frames
+        self.chunk_bytes = chunk_bytes
+        self._cancelled = False
+
+    def cancel(self):
+        """Request the loader to stop after the current chunk."""
+        self._cancelled = True
+
+    def _read(self, f: h5py.File, name: str, step: str) -> np.ndarray | None:
+        """Read a dataset in chunks, reporting progress and checking for cancellation."""
+        if name not in f:
+            return None
+        dataset = f[name]
+        array = np.empty(dataset.shape, dtype=dataset.dtype)
+        if array.size == 0:
+            return array
+        axis = self.TIME_AXES.get(name, 0)
+        n_steps = dataset.shape[axis]
+        step_bytes = array.nbytes // n_steps
+        chunk_steps = max(1, self.chunk_bytes // step_bytes)
+        reported = -1
+        for start in range(0, n_steps, chunk_steps):
+            if self._cancelled:
+                return None
+            stop = min(start + chunk_steps, n_steps)
+            selection = (slice(None),) * axis + (slice(start, stop),)
+            dataset.read_direct(array, selection, selection)
+            percent = 100 * stop // n_steps
+            if percent // 10 > reported:
+                reported = percent // 10
+                self.signals.progress.emit(
+                    f"{step} Reading {name} of {self.project_path.name}... {percent}%"
+                )
+        return array
+
+    def run(self):
         try:
-            aggregated_predictions, overlap_count = compute_aggregated_predictions(
-                recording_path=self.recording_path,
-                spectrogram=pp_spectrogram,
-                model=self.model,
-                orcai_parameter=self.orcai_parameter,
-                shape=self.shape,
-            )
+            with (
+                stage("load", project=self.project_path.name),
+                h5py.File(self.project_path, "r") as f,
+            ):
+                self.signals.progress.emit(
+                    f"(1/3) Reading labels of {self.project_path.name}..."
+                )
+                arrays = {}
+                for name in PROJECT_ARRAYS[:4]:
+                    arrays[name] = self._read(f, name, "(1/3)")
+                    if self._cancelled:
+                        self.signals.cancelled.emit()
+                        return
 
-            prediction_times = np.arange(0, len(aggregated_predictions)) * (
-                2 ** len(self.orcai_parameter["model"]["filters"])
-            )
+                self.signals.progress.emit(
+                    f"(2/3) Reading overview of {self.project_path.name}..."
+                )
+                step = max(1, f["spectrogram"].shape[1] // self.overview_frames)
+                preview = OrcaiData(
+                    recording_path=Path(f.attrs["recording_path"]),
+                    channel=int(f.attrs["channel"]),
+                    spectrogram=f["spectrogram"][:, ::step],
+                    pp_spectrogram=None,
+                    predicted_labels=read_labels(f["predicted_labels"]),
+                    **arrays,
+                )
+                self.signals.preview.emit(preview)
+
+                for name in PROJECT_ARRAYS[4:]:
+                    arrays[name] = self._read(f, name, "(3/3)")
+                    if self._cancelled:
+                        self.signals.cancelled.emit()
+                        return
+                data = OrcaiData.from_hdf5(f, self.project_path, arrays)
         except Exception as e:
             print(e)
             self.signals.error.emit((type(e), e))
-            return
+        else:
+            self.signals.result.emit(data)
 
-        self.signals.progress.emit(
-            f"5/5 Computing labels for {self.recording_path.name}..."
-        )
+
+class ProjectProberSignals(QObject):
+    """Signals for the ProjectProber class."""
+
+    result = pyqtSignal(ProjectInfo)
+    failed = pyqtSignal(Path, str)
+    finished = pyqtSignal()
+
+
+class ProjectProber(QRunnable):
+    """Reads the summaries of project files in the background.
+
+    Folders in ``paths`` are searched for project files. Each summary is
+    emitted when it has been read, files that cannot be read are reported
+    with the error.
+    """
+
+    def __init__(self, paths: list[Path]):
+        super().__init__()
+        self.signals = ProjectProberSignals()
+        self.paths = paths
+        self._cancelled = False
+
+    def cancel(self):
+        """Request the prober to stop after the current file."""
+        self._cancelled = True
+
+    def run(self):
         try:
-            row_starts, row_stops, label_names = compute_binary_predictions(
-                aggregated_predictions=aggregated_predictions,
-                overlap_count=overlap_count,
-                calls=self.orcai_parameter["calls"],
-                threshold=0.5,
-            )
-            predicted_labels = compute_labels(
-                row_starts,
-                row_stops,
-                label_names,
-                time_steps_per_output_step=2
-                ** len(self.orcai_parameter["model"]["filters"]),
-                label_suffix="*",
+            for path in self.paths:
+                try:
+                    if path.is_dir():
+                        file_paths = sorted(path.rglob("*.hdf5.orcai"))
+                    else:
+                        file_paths = [path]
+                except OSError as e:
+                    print(f"Could not read {path}: {e}")
+                    self.signals.failed.emit(path, str(e))
+                    continue
+                for file_path in file_paths:
+                    if self._cancelled:
+                        return
+                    try:
+                        info = probe_project(file_path)
+                    except (OSError, KeyError) as e:
+                        print(f"Could not read {file_path}: {e}")
+                        self.signals.failed.emit(file_path, str(e))
+                    else:
+                        self.signals.result.emit(info)
+        finally:
+            self.signals.finished.emit()
+
+
+class ProjectMergerSignals(QObject):
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    result = pyqtSignal(object)
+
+
+class ProjectMerger(QRunnable):
+    """Merges the labels of several projects in the background."""
+
+    def __init__(self, project_paths: list[Path], output_path: Path, rule: str):
+        super().__init__()
+        self.signals = ProjectMergerSignals()
+        self.project_paths = project_paths
+        self.output_path = output_path
+        self.rule = rule
+
+    def run(self):
+        try:
+            self.signals.progress.emit(f"Merging {len(self.project_paths)} projects...")
+            _, report = merge_projects(
+                self.project_paths, output_path=self.output_path, rule=self.rule
             )
-            predicted_labels["label_source"] = f"auto:{self.orcai_parameter['name']}"
-            predicted_labels["label_checked"] = False
-            predicted_labels["label_ok"] = True
         except Exception as e:
+            print(e)
             self.signals.error.emit((type(e), e))
-            return
-
-        self.signals.progress.emit(f"Loaded file {self.recording_path.name}")
-        self.signals.result.emit(
-            OrcaiData(
-                recording_path=self.recording_path,
-                channel=self.channel,
-                spectrogram=spectrogram,
-                frequencies=frequencies,
-                times=times,
-                pp_spectrogram=pp_spectrogram,
-                aggregated_predictions=aggregated_predictions,
-                prediction_times=prediction_times,
-                predicted_labels=predicted_labels,
-            )
-        )
+        else:
+            self.signals.result.emit(report)
@@ -0,0 +1,81 @@
+import numpy as np
+
+from orcaigui.orcaidata import OrcaiData
+from orcaigui.review import label_scores
+
+
+def select_labels(
+    data: OrcaiData,
+    calls: list[str],
+    call: str | None = None,
+    min_confidence: float | None = None,
+    max_duration: float | None = None,
+    region: tuple[float, float] | None = None,
+    unchecked_only: bool = True,
+) -> np.ndarray:
+    """Indices of the labels matching all given criteria.
+
+    Parameters
+    ----------
+    data : OrcaiData
+        Data with the predicted labels.
+    calls : list[str]
+        Call names in the order of the prediction columns.
+    call : str | None
+        Only labels of this call type.
+    min_confidence : float | None
+        Only labels whose mean prediction is at least this value.
+    max_duration : float | None
+        Only labels shorter than this duration in seconds.
+    region : tuple[float, float] | None
+        Only labels lying completely within this range of time steps.
+    unchecked_only : bool
+        Skip labels already checked by a curator.
+
+    Returns
+    -------
+    np.ndarray
+        Indices of the matching labels.
+    """
+    labels = data.predicted_labels
+    starts = labels["start"].to_numpy()
+    stops = labels["stop"].to_numpy()
+    selected = np.ones(len(labels), dtype=bool)
+    if unchecked_only:
+        selected &= ~labels["label_checked"].to_numpy(dtype=bool)
+    if call is not None:
+        selected &= labels["label"].str.replace("*", "", regex=False).to_numpy() == call
+    if max_duration is not None:
+        selected &= (stops - starts) * data.delta_t() < max_duration
+    if region is not None:
+        selected &= (starts >= region[0]) & (stops <= region[1])
+    if min_confidence is not None:
+        candidates = np.flatnonzero(selected)
+        scores = label_scores(data, calls, indices=candidates)
+        selected[candidates[~(scores >= min_confidence)]] = False
+    return np.flatnonzero(selected)
+
+
+def accept_labels(data: OrcaiData, indices: np.ndarray, username: str) -> np.ndarray:
+    """Mark labels as correct in one undoable journal batch."""
+    return data.journal.record_many(
+        "mark",
+        indices,
+        label_checked=True,
+        label_source=f"manual:{username}",
+        label_ok=True,
+        label=data.predicted_labels.loc[indices, "label"]
+        .str.replace("*", "", regex=False)
+        .to_numpy(),
+    )
+
+
+def reject_labels(data: OrcaiData, indices: np.ndarray, username: str) -> np.ndarray:
+    """Mark labels as incorrect in one undoable journal batch."""
+    return data.journal.record_many(
+        "mark",
+        indices,
+        label_checked=True,
+        label_source=f"manual:{username}",
+        label_ok=False,
+    )
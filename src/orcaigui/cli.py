@@ -1,6 +1,9 @@
+import time
+from pathlib import Path
+
 import rich_click as click
 
-from orcaigui.main import predict_gui
+from orcaigui.inference_backend import DEFAULT_BACKEND, available_backends
 
 click.rich_click.STYLE_OPTIONS_PANEL_BOX = "SIMPLE"
 click.rich_click.STYLE_COMMANDS_PANEL_BOX = "SIMPLE"
@@ -9,6 +12,205 @@ click.rich_click.STYLE_OPTIONS_PANEL_BORDER = "bold"
 click.rich_click.MAX_WIDTH = 100
 
 
-@click.command()
-def cli():
-    predict_gui()
+@click.group(invoke_without_command=True)
+@click.pass_context
+def cli(ctx):
+    """Curate orcAI predictions. Without a command, starts the GUI."""
+    if ctx.invoked_subcommand is None:
+        from orcaigui.main import predict_gui
+
+        predict_gui()
+
+
+@cli.command()
+@click.argument(
+    "projects",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.option(
+    "-o",
+    "--output",
+    required=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Path of the merged project, a copy of the first project.",
+)
+@click.option(
+    "-r",
+    "--rule",
+    type=click.Choice(["majority", "any", "all"]),
+    default="majority",
+    show_default=True,
+    help="How to decide labels curators disagree on.",
+)
+def merge(projects, output, rule):
+    """Merge the curated labels of several projects of the same recording."""
+    from orcaigui.merge import merge_projects
+
+    if len(projects) < 2:
+        raise click.UsageError("At least two projects are needed for a merge")
+    try:
+        _, report = merge_projects(list(projects), output_path=output, rule=rule)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(report.summary())
+    click.echo(f"Merged project written to {output}")
+
+
+@cli.command()
+@click.argument(
+    "directory",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Folder of the projects, with the subfolders of the recordings. "
+    "Defaults to the watched folder.",
+)
+@click.option(
+    "-m",
+    "--model",
+    default=None,
+    help="Name of an orcAI model or path of a model directory.",
+)
+@click.option(
+    "-b",
+    "--backend",
+    type=click.Choice(available_backends()),
+    default=DEFAULT_BACKEND,
+    show_default=True,
+    help="Run the model with Keras, or exported to TFLite or ONNX Runtime, "
+    "optionally quantised. Only installed backends are offered, install the "
+    "tflite or onnx extra of orcaigui for the others.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Recordings processed at the same time.",
+)
+@click.option(
+    "--max-inference",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Workers running a model at the same time.",
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0.1),
+    default=10,
+    show_default=True,
+    help="Seconds between scans of the folder.",
+)
+@click.option(
+    "--settle-time",
+    type=click.FloatRange(min=0),
+    default=30,
+    show_default=True,
+    help="Seconds a recording must stay unchanged before it is processed.",
+)
+@click.option("-r", "--recursive", is_flag=True, help="Also watch subfolders.")
+@click.option(
+    "--spectrogram-storage",
+    type=click.Choice(["full", "uint16", "uint8"]),
+    default="full",
+    show_default=True,
+)
+@click.option(
+    "--pp-spectrogram-storage",
+    type=click.Choice(["full", "float16", "regenerate"]),
+    default="full",
+    show_default=True,
+    help="regenerate recomputes it when needed; with a uint8 spectrogram it is "
+    "stored as float16 instead.",
+)
+@click.option(
+    "--state-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Folder of the queue and status files. Defaults to .orcaigui-watch "
+    "in the watched folder.",
+)
+@click.option(
+    "--once", is_flag=True, help="Stop when all recordings found are processed."
+)
+@click.option(
+    "--status",
+    "show_status",
+    is_flag=True,
+    help="Show the status of the daemon watching the folder and exit.",
+)
+def watch(
+    directory,
+    output,
+    model,
+    backend,
+    workers,
+    max_inference,
+    poll_interval,
+    settle_time,
+    recursive,
+    spectrogram_storage,
+    pp_spectrogram_storage,
+    state_dir,
+    once,
+    show_status,
+):
+    """Turn WAV files appearing in a folder into projects ready to curate.
+
+    The queue is kept in the state folder and resumed on restart. Stop with
+    Ctrl-C; a second Ctrl-C abandons the recordings being processed.
+    """
+    if show_status:
+        from orcaigui.watch import read_status
+
+        try:
+            status = read_status(directory, state_dir)
+        except FileNotFoundError:
+            raise click.ClickException(f"{directory} has not been watched")
+        throughput = status["throughput"]
+        click.echo(
+            f"{status['state']} (pid {status['pid']}), "
+            f"updated {time.ctime(status['updated'])}\n"
+            f"queue depth {status['queue_depth']}, running {len(status['running'])}, "
+            f"done {status['counts']['done']}, failed {status['counts']['failed']}\n"
+            f"{throughput['recordings_per_hour']:.1f} recordings per hour, "
+            f"{throughput['audio_seconds_per_second']:.1f} x realtime"
+        )
+        for path, seconds in status["running"].items():
+            click.echo(f"  {Path(path).name}: {seconds:.0f} s")
+        return
+
+    from orcaigui.models import DEFAULT_MODEL, available_models
+    from orcaigui.watch import WatchDaemon
+
+    model = model or DEFAULT_MODEL
+    model_dir = Path(model) if Path(model).is_dir() else available_models().get(model)
+    if model_dir is None:
+        raise click.BadParameter(f"Unknown model {model}", param_hint="--model")
+    daemon = WatchDaemon(
+        directory,
+        model_dir,
+        output_dir=output,
+        state_dir=state_dir,
+        workers=workers,
+        max_inference=max_inference,
+        poll_interval=poll_interval,
+        settle_time=settle_time,
+        recursive=recursive,
+        spectrogram_storage=spectrogram_storage,
+        pp_spectrogram_storage=pp_spectrogram_storage,
+        backend=backend,
+        log=click.echo,
+    )
+    try:
+        daemon.run(once=once)
+    except ImportError as e:
+        raise click.ClickException(f"The {backend} backend is not installed: {e}")
@@ -1,14 +1,27 @@
 from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot
 from PyQt6.QtWidgets import (
+    QComboBox,
     QFrame,
     QGridLayout,
+    QHBoxLayout,
     QLabel,
     QPushButton,
     QSizePolicy,
     QVBoxLayout,
 )
 
+from orcaigui.embeddings import LabelEmbeddingsBuilder
+from orcaigui.label_index import STATUSES, FilteredOrder, LabelIndex
 from orcaigui.orcaidata import OrcaiData
+from orcaigui.prefetch import PREFETCH_LABELS
+from orcaigui.review import ReviewQueue
+from orcaigui.scheduler import scheduler
+
+ORDERS = {
+    "index": "Index order",
+    "uncertainty": "Most uncertain first",
+    "similar": "Most similar first",
+}
 
 
 class CurateWidget(QFrame):
@@ -17,14 +30,23 @@ class CurateWidget(QFrame):
     status = pyqtSignal(str)
     label = pyqtSignal(int)
     label_updated = pyqtSignal(int, bool)
+    upcoming = pyqtSignal(list)
+    similar_available = pyqtSignal(bool)
 
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.data = None
         self.username = parent.username
+        self.calls = parent.orcai_parameter["calls"]
         self.current_label = 0
         self.n_labels = 0
+        self.order = None
+        self.label_index = None
+        self.embeddings = None
+        self.embeddings_builder = None
+        # label changes made while the embeddings are computed
+        self.embedding_changes = []
 
         self.curate_buttons = {
             "first": self._create_button_and_label(
@@ -63,7 +85,24 @@ class CurateWidget(QFrame):
             alignment=Qt.AlignmentFlag.AlignLeft,
         )
 
-        curate_layout.addWidget(self.current_label_label)
+        self.order_select_box = QComboBox()
+        self.order_select_box.addItems(ORDERS.values())
+        self.order_select_box.setToolTip("Order in which to step through the labels")
+        self.order_select_box.currentIndexChanged.connect(self.set_order)
+
+        self.call_filter_box = QComboBox()
+        self.call_filter_box.setToolTip("Only step through labels of this call type")
+        self.call_filter_box.currentIndexChanged.connect(self.set_filter)
+        self.status_filter_box = QComboBox()
+        self.status_filter_box.setToolTip("Only step through labels with this status")
+        self.status_filter_box.currentIndexChanged.connect(self.set_filter)
+
+        status_layout = QHBoxLayout()
+        status_layout.addWidget(self.current_label_label, stretch=1)
+        status_layout.addWidget(self.call_filter_box)
+        status_layout.addWidget(self.status_filter_box)
+        status_layout.addWidget(self.order_select_box)
+        curate_layout.addLayout(status_layout)
 
         self.setLayout(curate_layout)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
@@ -79,11 +118,154 @@ class CurateWidget(QFrame):
 
     def update_data(self, data: OrcaiData):
         """Update the widget with the current label and predicted labels."""
+        if (
+            self.data is not None
+            and self.on_journal_change in self.data.journal.listeners
+        ):
+            self.data.journal.listeners.remove(self.on_journal_change)
         self.data = data
         self.current_label = 0
         self.n_labels = len(self.data.predicted_labels) if self.data is not None else 0
+        if self.label_index is not None:
+            self.label_index.close()
+        if self.embeddings is not None:
+            self.embeddings.close()
+            self.embeddings = None
+        self.stop_embeddings_builder()
+        self.label_index = LabelIndex(self.data) if self.data is not None else None
+        if self.label_index is not None:
+            self.data.journal.listeners.append(self.on_journal_change)
+            self.build_embeddings()
+        self.update_filter_boxes()
+        self.set_order(self.order_select_box.currentIndex())
+
+    def build_embeddings(self):
+        """Compute the label embeddings for similarity search in the background."""
+        if self.data.predicted_labels.empty:
+            return
+        self.embeddings_builder = LabelEmbeddingsBuilder(self.data)
+        self.embeddings_builder.signals.result.connect(
+            lambda embeddings, builder=self.embeddings_builder: self.embeddings_built(
+                embeddings, builder
+            )
+        )
+        self.embeddings_builder.signals.error.connect(
+            lambda error, builder=self.embeddings_builder: self.embeddings_error(
+                error, builder
+            )
+        )
+        self.data.journal.listeners.append(self.embedding_changes.append)
+        scheduler.start(self.embeddings_builder, "embeddings")
+
+    def stop_embeddings_builder(self):
+        """Forget embeddings being computed, their result is ignored."""
+        if self.embeddings_builder is not None:
+            journal = self.embeddings_builder.data.journal
+            if self.embedding_changes.append in journal.listeners:
+                journal.listeners.remove(self.embedding_changes.append)
+        self.embeddings_builder = None
+        self.embedding_changes = []
+        self.similar_available.emit(False)
+
+    def embeddings_built(self, embeddings, builder: LabelEmbeddingsBuilder):
+        if builder is not self.embeddings_builder:
+            return
+        changes = self.embedding_changes
+        self.stop_embeddings_builder()
+        embeddings.follow(changes)
+        self.embeddings = embeddings
+        self.similar_available.emit(True)
+        if list(ORDERS)[self.order_select_box.currentIndex()] == "similar":
+            self.set_order(self.order_select_box.currentIndex())
+
+    def embeddings_error(self, error, builder: LabelEmbeddingsBuilder):
+        if builder is not self.embeddings_builder:
+            return
+        _, error_value = error
+        self.stop_embeddings_builder()
+        self.status.emit(f"Error computing label embeddings: {error_value}")
+
+    def update_filter_boxes(self):
+        """Update the filter choices and the number of labels for each."""
+        for box in (self.call_filter_box, self.status_filter_box):
+            box.blockSignals(True)
+        call = self.call_filter_box.currentData()
+        status = self.status_filter_box.currentData()
+        self.call_filter_box.clear()
+        self.status_filter_box.clear()
+        if self.label_index is not None:
+            self.call_filter_box.addItem(
+                f"All calls ({self.label_index.count(status=status)})", None
+            )
+            for name in self.label_index.calls():
+                count = self.label_index.count(call=name, status=status)
+                self.call_filter_box.addItem(f"{name} ({count})", name)
+            self.status_filter_box.addItem(
+                f"Any status ({self.label_index.count(call=call)})", None
+            )
+            for name in STATUSES:
+                count = self.label_index.count(call=call, status=name)
+                self.status_filter_box.addItem(f"{name} ({count})", name)
+            self.call_filter_box.setCurrentIndex(
+                max(0, self.call_filter_box.findData(call))
+            )
+            self.status_filter_box.setCurrentIndex(
+                max(0, self.status_filter_box.findData(status))
+            )
+        for box in (self.call_filter_box, self.status_filter_box):
+            box.blockSignals(False)
+
+    def on_journal_change(self, records):
+        self.update_filter_boxes()
+
+    def set_filter(self, _index: int = 0):
+        """Restrict navigation to the selected call type and status."""
+        self.update_filter_boxes()
+        self.set_order(self.order_select_box.currentIndex())
+
+    def set_order(self, order_index: int):
+        """Set the order in which the navigation buttons step through labels."""
+        if self.order is not None:
+            self.order.close()
+        order = list(ORDERS)[order_index]
+        self.call_filter_box.setEnabled(order == "index")
+        self.status_filter_box.setEnabled(order == "index")
+        # until the embeddings are computed, labels are stepped through in
+        # index order from the current one
+        waiting = order == "similar" and self.embeddings is None
+        if self.data is None:
+            self.order = None
+        elif order == "uncertainty":
+            self.order = ReviewQueue(self.data, self.calls)
+        elif order == "similar" and not waiting:
+            self.order = self.embeddings.similar(self.current_label)
+        else:
+            if waiting:
+                self.status.emit("Computing label embeddings...")
+            self.order = self.label_index.filtered(
+                call=self.call_filter_box.currentData(),
+                status=self.status_filter_box.currentData(),
+            )
         self.update_buttons()
         self.update_label_texts()
+        if (
+            self.order is not None
+            and len(self.order) > 0
+            and not waiting
+            and (order != "index" or self.order.position(self.current_label) is None)
+        ):
+            self.go_to_first_label()
+
+    def find_similar(self):
+        """Step through the labels most similar to the current label."""
+        if self.data is None or self.data.predicted_labels.empty:
+            self.status.emit("No labels available")
+            return
+        order_index = list(ORDERS).index("similar")
+        if self.order_select_box.currentIndex() == order_index:
+            self.set_order(order_index)
+        else:
+            self.order_select_box.setCurrentIndex(order_index)
 
     def update_buttons(self):
         """Update the state of the navigation buttons based on the current label."""
@@ -93,14 +275,12 @@ class CurateWidget(QFrame):
                 value["button"].setEnabled(False)
                 value["label"].setText("")
         else:
-            self.curate_buttons["first"]["button"].setEnabled(self.current_label >= 0)
-            self.curate_buttons["previous"]["button"].setEnabled(self.current_label > 0)
-            self.curate_buttons["next"]["button"].setEnabled(
-                self.current_label < self.n_labels - 1
-            )
-            self.curate_buttons["last"]["button"].setEnabled(
-                self.current_label < self.n_labels - 1
-            )
+            has_previous = self.order.previous_before(self.current_label) is not None
+            has_next = self.order.next_after(self.current_label) is not None
+            self.curate_buttons["first"]["button"].setEnabled(len(self.order) > 0)
+            self.curate_buttons["previous"]["button"].setEnabled(has_previous)
+            self.curate_buttons["next"]["button"].setEnabled(has_next)
+            self.curate_buttons["last"]["button"].setEnabled(has_next)
             self.curate_buttons["check"]["button"].setEnabled(
                 not self.current_label < 0
             )
@@ -108,39 +288,56 @@ class CurateWidget(QFrame):
                 not self.current_label < 0
             )
 
+    def _label_text(self, index: int | None) -> str:
+        if index is None:
+            return ""
+        return f"{index + 1}: {self.data.predicted_labels.at[index, 'label']}"
+
     def update_label_texts(self):
         """Update the label texts in the bottom control widget."""
         if self.data is None or self.data.predicted_labels.empty:
             return
 
-        label = self.data.predicted_labels.iloc[self.current_label]
-
         label_texts = {
-            "first": f"{self.data.predicted_labels.index[0] + 1}: {self.data.predicted_labels.iloc[0].label}",
-            "previous": f"{self.data.predicted_labels.index[max(0, self.current_label - 1)] + 1}: {self.data.predicted_labels.iloc[max(0, self.current_label - 1)].label}",
-            "check": f"{self.data.predicted_labels.index[self.current_label] + 1}: {label.label}",
-            "wrong": f"{self.data.predicted_labels.index[self.current_label] + 1}: {label.label}",
-            "next": f"{self.data.predicted_labels.index[min(len(self.data.predicted_labels) - 1, self.current_label + 1)] + 1}: {self.data.predicted_labels.iloc[min(len(self.data.predicted_labels) - 1, self.current_label + 1)].label}",
-            "last": f"{self.data.predicted_labels.index[-1] + 1}: {self.data.predicted_labels.iloc[-1].label}",
+            "first": self._label_text(self.order.first()),
+            "previous": self._label_text(
+                self.order.previous_before(self.current_label)
+            ),
+            "check": self._label_text(self.current_label),
+            "wrong": self._label_text(self.current_label),
+            "next": self._label_text(self.order.next_after(self.current_label)),
+            "last": self._label_text(self.order.last()),
         }
 
         for key, value in label_texts.items():
             if key in self.curate_buttons:
                 self.curate_buttons[key]["label"].setText(value)
 
-        self.current_label_label.setText(
-            f"Current label: {self.current_label + 1} / {self.n_labels} - {label.label}"
-        )
+        label = self.data.predicted_labels.at[self.current_label, "label"]
+        text = f"Current label: {self.current_label + 1} / {self.n_labels} - {label}"
+        if (
+            not isinstance(self.order, FilteredOrder)
+            or self.order.call
+            or self.order.status
+        ):
+            position = self.order.position(self.current_label)
+            text += (
+                f" ({position + 1} of {len(self.order)} in order)"
+                if position is not None
+                else f" ({len(self.order)} in order)"
+            )
+        self.current_label_label.setText(text)
 
     def mark_as_correct(self):
         """Mark the current label as correct."""
-        self.data.predicted_labels.loc[self.current_label, "label_checked"] = True
-        self.data.predicted_labels.loc[self.current_label, "label_source"] = (
-            f"manual:{self.username}"
-        )
-        self.data.predicted_labels.loc[self.current_label, "label_ok"] = True
-        self.data.predicted_labels.loc[self.current_label, "label"] = (
-            self.data.predicted_labels.loc[self.current_label, "label"].replace("*", "")
+        label = self.data.predicted_labels.loc[self.current_label, "label"]
+        self.data.journal.record(
+            "mark",
+            self.current_label,
+            label_checked=True,
+            label_source=f"manual:{self.username}",
+            label_ok=True,
+            label=label.replace("*", ""),
         )
 
         self.label_updated.emit(self.current_label, False)
@@ -149,12 +346,13 @@ class CurateWidget(QFrame):
 
     def mark_as_incorrect(self):
         """Mark the current label as incorrect."""
-        self.data.predicted_labels.loc[self.current_label, "label_checked"] = True
-        self.data.predicted_labels.loc[self.current_label, "label_source"] = (
-            f"manual:{self.username}"
+        self.data.journal.record(
+            "mark",
+            self.current_label,
+            label_checked=True,
+            label_source=f"manual:{self.username}",
+            label_ok=False,
         )
-        self.data.predicted_labels.loc[self.current_label, "label_ok"] = False
-        self.data.predicted_labels.loc[self.current_label, "label_ok"] = False
         self.label_updated.emit(self.current_label, False)
         self.status.emit("Label marked as incorrect")
         self.go_to_next_label()
@@ -164,7 +362,11 @@ class CurateWidget(QFrame):
         if self.data.predicted_labels is None or self.data.predicted_labels.empty:
             self.status.emit("No labels available")
             return
-        self.current_label = 0
+        index = self.order.first()
+        if index is None:
+            self.status.emit("No labels left in this order")
+            return
+        self.current_label = index
         self.go_to_label()
 
     def go_to_previous_label(self):
@@ -172,10 +374,11 @@ class CurateWidget(QFrame):
         if self.data.predicted_labels is None or self.data.predicted_labels.empty:
             self.status.emit("No labels available")
             return
-        if self.current_label < 1:
+        index = self.order.previous_before(self.current_label)
+        if index is None:
             self.status.emit("Already at the first label")
             return
-        self.current_label -= 1
+        self.current_label = index
         self.go_to_label()
 
     def go_to_next_label(self):
@@ -183,10 +386,11 @@ class CurateWidget(QFrame):
         if self.data.predicted_labels is None or self.data.predicted_labels.empty:
             self.status.emit("No labels available")
             return
-        if self.current_label >= len(self.data.predicted_labels) - 1:
+        index = self.order.next_after(self.current_label)
+        if index is None:
             self.status.emit("Already at the last label")
             return
-        self.current_label += 1
+        self.current_label = index
         self.go_to_label()
 
     def go_to_last_label(self):
@@ -194,7 +398,11 @@ class CurateWidget(QFrame):
         if self.data.predicted_labels is None or self.data.predicted_labels.empty:
             self.status.emit("No labels available")
             return
-        self.current_label = len(self.data.predicted_labels) - 1
+        index = self.order.last()
+        if index is None:
+            self.status.emit("No labels left in this order")
+            return
+        self.current_label = index
         self.go_to_label()
 
     @pyqtSlot(int)
@@ -214,6 +422,21 @@ class CurateWidget(QFrame):
         self.label.emit(self.current_label)
         self.update_label_texts()
         self.update_buttons()
+        self.upcoming.emit(self.upcoming_labels())
+
+    def upcoming_labels(self, n: int = PREFETCH_LABELS) -> list[int]:
+        """Labels likely to be visited next: the next ``n`` and the previous one."""
+        upcoming = []
+        index = self.current_label
+        for _ in range(n):
+            index = self.order.next_after(index)
+            if index is None:
+                break
+            upcoming.append(index)
+        previous = self.order.previous_before(self.current_label)
+        if previous is not None:
+            upcoming.append(previous)
+        return upcoming
 
     def create_new_label(
         self, x_pos: int, extent: int = 2, label_name: str = "NEW_LABEL"
@@ -230,8 +453,14 @@ class CurateWidget(QFrame):
             "label_ok": False,
             "label_source": f"manual:{self.username}",
         }
-        self.data.predicted_labels.loc[len(self.data.predicted_labels)] = new_label
+        self.data.journal.create(new_label)
         self.n_labels = len(self.data.predicted_labels)
         self.current_label = self.n_labels - 1
-        print(self.data.predicted_labels)
         self.go_to_label()
+
+    def refresh(self):
+        """Refresh after labels were changed outside of the widget."""
+        self.n_labels = len(self.data.predicted_labels) if self.data is not None else 0
+        self.current_label = min(self.current_label, max(0, self.n_labels - 1))
+        self.update_buttons()
+        self.update_label_texts()
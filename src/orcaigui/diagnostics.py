@@ -0,0 +1,149 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QLabel
+
+from orcaigui.instrumentation import StageRecord, recorder
+
+TICK_INTERVAL = 20  # milliseconds between event loop probes
+STALL_THRESHOLD = 0.05  # seconds of delay counted as a stall
+WINDOW = 500  # recent measurements kept per event
+
+
+class Diagnostics:
+    """Opt-in measurement of GUI responsiveness.
+
+    While enabled, a timer probes the event loop every ``TICK_INTERVAL`` ms;
+    a probe that arrives more than ``stall_threshold`` late is a stall.
+    Paints and slots decorated with ``timed_slot`` record their duration.
+    Every measurement is kept in a window for ``summary`` and passed to the
+    instrumentation recorder as a ``ui:`` stage, so it also ends up in its
+    log file.
+    """
+
+    def __init__(self, stall_threshold: float = STALL_THRESHOLD):
+        self.enabled = False
+        self.stall_threshold = stall_threshold
+        self.timings: dict[str, deque[float]] = {}
+        self._timer = None
+        self._last_tick = None
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        if enabled:
+            if self._timer is None:
+                self._timer = QTimer()
+                self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+                self._timer.timeout.connect(self._tick)
+            self._last_tick = time.perf_counter()
+            self._timer.start(TICK_INTERVAL)
+        elif self._timer is not None:
+            self._timer.stop()
+
+    def _tick(self) -> None:
+        now = time.perf_counter()
+        delay = now - self._last_tick - TICK_INTERVAL / 1000
+        self._last_tick = now
+        if delay > self.stall_threshold:
+            self.record("event loop stall", delay)
+
+    def record(self, name: str, seconds: float, cpu: float = 0.0) -> None:
+        """Keep a measurement that just ended and log it as a stage."""
+        self.timings.setdefault(name, deque(maxlen=WINDOW)).append(seconds)
+        recorder.add(
+            StageRecord(
+                name=f"ui:{name}",
+                start=time.time() - seconds,
+                wall=seconds,
+                cpu=cpu,
+                peak_rss=None,
+                pid=os.getpid(),
+                thread=threading.current_thread().name,
+            )
+        )
+
+    def summary(self) -> dict[str, dict]:
+        """Count, mean, 95th percentile and maximum of the recent measurements."""
+        summary = {}
+        for name, timings in self.timings.items():
+            values = np.fromiter(timings, dtype=np.float64)
+            summary[name] = {
+                "count": len(values),
+                "mean": float(values.mean()),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(values.max()),
+            }
+        return summary
+
+    def clear(self) -> None:
+        self.timings.clear()
+
+
+diagnostics = Diagnostics()
+
+
+def timed_slot(name: str | None = None):
+    """Record the duration of a method when diagnostics are enabled.
+
+    Put it below ``pyqtSlot`` so the slot signature stays the same.
+    """
+
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not diagnostics.enabled:
+                return func(*args, **kwargs)
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                diagnostics.record(
+                    label, time.perf_counter() - wall, time.process_time() - cpu
+                )
+
+        return wrapper
+
+    return decorator
+
+
+class DiagnosticsHud(QLabel):
+    """Small overlay with the recent responsiveness measurements."""
+
+    def __init__(self, parent=None, interval: int = 500):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: white;"
+            "font-family: monospace; padding: 4px;"
+        )
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.setInterval(interval)
+        self.hide()
+
+    def setVisible(self, visible: bool) -> None:
+        super().setVisible(visible)
+        if visible:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self) -> None:
+        lines = [
+            f"{name:<24} n={stats['count']:<4} mean {stats['mean'] * 1000:6.1f} ms"
+            f"  p95 {stats['p95'] * 1000:6.1f} ms  max {stats['max'] * 1000:6.1f} ms"
+            for name, stats in sorted(diagnostics.summary().items())
+        ]
+        self.setText("\n".join(lines) or "No measurements yet")
+        self.adjustSize()
+        self.move(8, 8)
+        self.raise_()
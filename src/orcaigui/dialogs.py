@@ -1,16 +1,32 @@
 from pathlib import Path
 
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtWidgets import (
+    QAbstractItemView,
     QComboBox,
+    QCompleter,
     QDialog,
     QDialogButtonBox,
+    QDoubleSpinBox,
     QFileDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QHeaderView,
     QLabel,
-    QVBoxLayout,
     QLineEdit,
-    QCompleter,
+    QListWidget,
+    QListWidgetItem,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
 )
 
+from orcaigui.audio_file_loader import ProjectProber
+from orcaigui.merge import RULES
+from orcaigui.orcaidata import ProjectInfo
+from orcaigui.scheduler import scheduler
+
 
 class ChannelSelectDialog(QDialog):
     def __init__(self, n_channels: int, parent=None):
@@ -66,6 +82,140 @@ class LabelNameDialog(QDialog):
         self.setLayout(layout)
 
 
+class BulkAcceptDialog(QDialog):
+    """Choose a call type and the confidence above which to accept its labels."""
+
+    def __init__(self, calls: list[str], parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Accept Confident Labels")
+        message = QLabel("Accept all unchecked labels of a call type with confidence:")
+
+        self.call_select_box = QComboBox()
+        self.call_select_box.addItems(calls)
+        self.confidence_input = QDoubleSpinBox()
+        self.confidence_input.setRange(0.0, 1.0)
+        self.confidence_input.setSingleStep(0.05)
+        self.confidence_input.setValue(0.9)
+
+        QBtn = (
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        form = QFormLayout()
+        form.addRow("Call", self.call_select_box)
+        form.addRow("Minimum confidence", self.confidence_input)
+
+        layout = QVBoxLayout()
+        layout.addWidget(message)
+        layout.addLayout(form)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+
+class BulkRejectDialog(QDialog):
+    """Choose the duration below which to reject labels."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Reject Short Labels")
+        message = QLabel("Reject all unchecked labels shorter than:")
+
+        self.duration_input = QDoubleSpinBox()
+        self.duration_input.setRange(0.0, 60.0)
+        self.duration_input.setDecimals(3)
+        self.duration_input.setSingleStep(0.05)
+        self.duration_input.setSuffix(" s")
+        self.duration_input.setValue(0.2)
+
+        QBtn = (
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(message)
+        layout.addWidget(self.duration_input)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+
+class RefineBandDialog(QDialog):
+    """Choose the frequency band label boundaries are refined in, per call.
+
+    A call without a band of its own uses the band of all calls.
+    """
+
+    ALL_CALLS = "All calls"
+
+    def __init__(
+        self, calls: list[str], bands: dict[str, tuple[float, float]], parent=None
+    ):
+        super().__init__(parent)
+
+        self.setWindowTitle("Refine Band")
+        message = QLabel("Snap label boundaries to the call energy between:")
+        self.bands = dict(bands)
+
+        self.call_select_box = QComboBox()
+        self.call_select_box.addItems([self.ALL_CALLS, *calls])
+        self.low_input = QDoubleSpinBox()
+        self.high_input = QDoubleSpinBox()
+        for spin_box in (self.low_input, self.high_input):
+            spin_box.setRange(0.0, 200.0)
+            spin_box.setDecimals(1)
+            spin_box.setSingleStep(0.5)
+            spin_box.setSuffix(" kHz")
+        self.show_band()
+        self.call_select_box.currentTextChanged.connect(self.show_band)
+        self.low_input.valueChanged.connect(self.store_band)
+        self.high_input.valueChanged.connect(self.store_band)
+
+        QBtn = (
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        form = QFormLayout()
+        form.addRow("Call", self.call_select_box)
+        form.addRow("From", self.low_input)
+        form.addRow("To", self.high_input)
+
+        layout = QVBoxLayout()
+        layout.addWidget(message)
+        layout.addLayout(form)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+    def show_band(self):
+        call = self.call_select_box.currentText()
+        low, high = self.bands.get(call, self.bands[self.ALL_CALLS])
+        for spin_box, value in ((self.low_input, low), (self.high_input, high)):
+            spin_box.blockSignals(True)
+            spin_box.setValue(value / 1000)
+            spin_box.blockSignals(False)
+
+    def store_band(self):
+        call = self.call_select_box.currentText()
+        low, high = sorted((self.low_input.value(), self.high_input.value()))
+        band = (low * 1000, high * 1000)
+        if call != self.ALL_CALLS and band == self.bands[self.ALL_CALLS]:
+            self.bands.pop(call, None)
+        else:
+            self.bands[call] = band
+
+
 class ExportLabelsAsDialog(QFileDialog):
     def __init__(self, default_labels_path: str | Path, parent=None):
         super().__init__(parent)
@@ -86,3 +236,273 @@ class SaveProjectAsDialog(QFileDialog):
         self.setNameFilter("orcai project files (*.hdf5.orcai)")
         self.setDefaultSuffix(".hdf5.orcai")
         self.selectFile(str(parent.data.recording_path.with_suffix(".hdf5.orcai")))
+
+
+class ProjectBrowserDialog(QDialog):
+    """Lists the projects in a folder using only their metadata."""
+
+    project_selected = pyqtSignal(ProjectInfo)
+    project_opened = pyqtSignal(Path)
+
+    COLUMNS = [
+        "Project",
+        "Recording",
+        "Channel",
+        "Model",
+        "Duration",
+        "Labels",
+        "Checked",
+    ]
+
+    def __init__(self, directory: str | Path | None = None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Browse Projects")
+        self.projects: list[ProjectInfo] = []
+        self.failed: dict[Path, str] = {}
+        self.prober = None
+
+        self.directory_label = QLabel("")
+        self.choose_directory_button = QPushButton("Choose Folder...")
+        self.choose_directory_button.clicked.connect(self.choose_directory)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.ResizeToContents
+        )
+        self.table.itemSelectionChanged.connect(self._selection_changed)
+        self.table.cellDoubleClicked.connect(self._open_row)
+
+        self.status_label = QLabel("")
+
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Open)
+        self.buttonBox.accepted.connect(self._open_selected)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.directory_label)
+        layout.addWidget(self.choose_directory_button)
+        layout.addWidget(self.table)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+        self.resize(900, 500)
+
+        if directory:
+            self.scan(Path(directory))
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Choose project folder")
+        if directory:
+            self.scan(Path(directory))
+
+    def scan(self, directory: Path):
+        """Probe all project files below ``directory`` in the background."""
+        self.stop_prober()
+        self.directory_label.setText(str(directory))
+        self.projects = []
+        self.failed = {}
+        self.table.setRowCount(0)
+        self.status_label.setText(f"Searching {directory} for projects...")
+        self.status_label.setToolTip("")
+        prober = ProjectProber([directory])
+        prober.signals.result.connect(
+            lambda info, prober=prober: self.add_project(info, prober)
+        )
+        prober.signals.failed.connect(
+            lambda path, error, prober=prober: self.add_failure(path, error, prober)
+        )
+        prober.signals.finished.connect(
+            lambda prober=prober: self.scan_finished(prober)
+        )
+        self.prober = prober
+        scheduler.start(prober, "open")
+
+    def stop_prober(self):
+        """Cancel a scan still running, its results are ignored."""
+        if self.prober is not None:
+            self.prober.cancel()
+            self.prober = None
+
+    def add_project(self, info: ProjectInfo, prober: ProjectProber):
+        if prober is not self.prober:
+            return
+        self.projects.append(info)
+        row = self.table.rowCount()
+        self.table.setRowCount(row + 1)
+        values = [
+            info.path.name,
+            info.recording_path.name,
+            str(info.channel),
+            info.model_name or "",
+            info.duration_string(),
+            str(info.n_labels()),
+            f"{info.progress():.0%}",
+        ]
+        for col, value in enumerate(values):
+            self.table.setItem(row, col, QTableWidgetItem(value))
+
+    def add_failure(self, path: Path, error: str, prober: ProjectProber):
+        if prober is not self.prober:
+            return
+        self.failed[path] = error
+        self.show_failures()
+
+    def scan_finished(self, prober: ProjectProber):
+        if prober is not self.prober:
+            return
+        self.prober = None
+        self.status_label.setText(f"{len(self.projects)} projects")
+        self.show_failures()
+
+    def show_failures(self):
+        """List the files that could not be read in the status line."""
+        if not self.failed:
+            return
+        text = f"{len(self.projects)} projects"
+        if self.prober is not None:
+            text = f"Searching... {text}"
+        self.status_label.setText(f"{text}, {len(self.failed)} files could not be read")
+        self.status_label.setToolTip(
+            "\n".join(f"{path}: {error}" for path, error in self.failed.items())
+        )
+
+    def done(self, result: int):
+        self.stop_prober()
+        super().done(result)
+
+    def _selection_changed(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self.project_selected.emit(self.projects[rows[0].row()])
+
+    def _open_row(self, row: int, _col: int = 0):
+        self.project_opened.emit(self.projects[row].path)
+        self.accept()
+
+    def _open_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self._open_row(rows[0].row())
+
+
+class MergeProjectsDialog(QDialog):
+    """Choose the projects to merge and the rule for conflicting decisions."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Merge Projects")
+        message = QLabel(
+            "Projects of the same recording curated by different people. "
+            "The first project is the base of the merged project."
+        )
+        message.setWordWrap(True)
+
+        self.project_list = QListWidget()
+        self.add_button = QPushButton("Add...")
+        self.add_button.clicked.connect(self.add_projects)
+        self.remove_button = QPushButton("Remove")
+        self.remove_button.clicked.connect(self.remove_selected)
+
+        self.rule_select_box = QComboBox()
+        self.rule_select_box.addItems(RULES)
+
+        QBtn = (
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.add_button)
+        button_layout.addWidget(self.remove_button)
+        form = QFormLayout()
+        form.addRow("Conflicts", self.rule_select_box)
+
+        layout = QVBoxLayout()
+        layout.addWidget(message)
+        layout.addWidget(self.project_list)
+        layout.addLayout(button_layout)
+        layout.addLayout(form)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+        self.resize(600, 400)
+
+    def add_projects(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Add Projects", "", "orcai project files (*.hdf5.orcai)"
+        )
+        self.project_list.addItems(file_paths)
+
+    def remove_selected(self):
+        for item in self.project_list.selectedItems():
+            self.project_list.takeItem(self.project_list.row(item))
+
+    def projects(self) -> list[Path]:
+        return [
+            Path(self.project_list.item(row).text())
+            for row in range(self.project_list.count())
+        ]
+
+
+class ModelSelectDialog(QDialog):
+    """Choose models to run on the current recording for comparison."""
+
+    add_model_dir = pyqtSignal(str)
+
+    def __init__(self, models: list[str], parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Run Models")
+        message = QLabel(
+            "Models to run on the preprocessed spectrogram of the current "
+            "recording. Their predictions are stored with the project."
+        )
+        message.setWordWrap(True)
+
+        self.model_list = QListWidget()
+        self.set_models(models)
+        self.add_button = QPushButton("Add Model Directory...")
+        self.add_button.clicked.connect(self.add_directory)
+
+        QBtn = (
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+
+        self.buttonBox = QDialogButtonBox(QBtn)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(message)
+        layout.addWidget(self.model_list)
+        layout.addWidget(self.add_button)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+        self.resize(400, 300)
+
+    def set_models(self, models: list[str]):
+        checked = set(self.selected_models())
+        self.model_list.clear()
+        for name in models:
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(
+                Qt.CheckState.Checked if name in checked else Qt.CheckState.Unchecked
+            )
+            self.model_list.addItem(item)
+
+    def add_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Add Model Directory")
+        if directory:
+            self.add_model_dir.emit(directory)
+
+    def selected_models(self) -> list[str]:
+        return [
+            self.model_list.item(row).text()
+            for row in range(self.model_list.count())
+            if self.model_list.item(row).checkState() == Qt.CheckState.Checked
+        ]
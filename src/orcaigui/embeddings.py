@@ -0,0 +1,263 @@
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.journal import ACTIONS
+from orcaigui.orcaidata import OrcaiData
+
+N_BANDS = 16
+N_SEGMENTS = 3
+
+
+def _time_major(pp_spectrogram: np.ndarray, n_frames: int) -> np.ndarray:
+    """Preprocessed spectrogram as (time, frequency)."""
+    pp_spectrogram = np.squeeze(pp_spectrogram)
+    if pp_spectrogram.shape[0] != n_frames and pp_spectrogram.shape[1] == n_frames:
+        return pp_spectrogram.T
+    return pp_spectrogram
+
+
+def band_energies(pp_spectrogram: np.ndarray, n_bands: int = N_BANDS) -> np.ndarray:
+    """Mean of the spectrogram in ``n_bands`` equally wide frequency bands."""
+    n_frequencies = pp_spectrogram.shape[1]
+    bounds = np.unique(np.linspace(0, n_frequencies, n_bands + 1).astype(np.intp))
+    sums = np.add.reduceat(pp_spectrogram, bounds[:-1], axis=1, dtype=np.float64)
+    return (sums / np.diff(bounds)).astype(np.float32)
+
+
+def _window_sums(
+    values: np.ndarray, starts: np.ndarray, stops: np.ndarray, power: int = 1
+) -> np.ndarray:
+    """Sum of ``values**power`` over the rows ``starts[i]:stops[i]`` for every i.
+
+    Only the rows spanned by the windows are touched.
+    """
+    first, last = starts.min(), stops.max()
+    window = values[first:last].astype(np.float64)
+    if power != 1:
+        window **= power
+    padded = np.vstack([window, np.zeros((1, values.shape[1]))])
+    bounds = np.column_stack([starts - first, stops - first]).ravel()
+    return np.add.reduceat(padded, bounds, axis=0)[::2]
+
+
+def label_embeddings(
+    data: OrcaiData,
+    indices: np.ndarray | None = None,
+    bands: np.ndarray | None = None,
+    n_bands: int = N_BANDS,
+) -> np.ndarray:
+    """Fixed-length feature vector for each label.
+
+    The preprocessed spectrogram is pooled into frequency bands. Each label
+    is described by the mean band energies in the first, middle and last
+    third of its span and the standard deviation of each band over the whole
+    span. Window sums are taken with one ``reduceat`` over the label
+    boundaries, so the cost grows with the total label length, not with the
+    length of the recording.
+
+    Parameters
+    ----------
+    data : OrcaiData
+        Data with preprocessed spectrogram and predicted labels.
+    indices : np.ndarray | None
+        Labels to compute, all labels if None.
+    bands : np.ndarray | None
+        Result of ``band_energies``, computed here if None.
+    n_bands : int
+        Number of frequency bands.
+
+    Returns
+    -------
+    np.ndarray
+        float32 array of shape (n_labels, (N_SEGMENTS + 1) * n_bands).
+    """
+    labels = data.predicted_labels
+    if indices is None:
+        indices = np.arange(len(labels))
+    if len(indices) == 0:
+        return np.zeros((0, (N_SEGMENTS + 1) * n_bands), dtype=np.float32)
+    if bands is None:
+        bands = band_energies(
+            _time_major(data.preprocessed_spectrogram(), len(data.times)), n_bands
+        )
+    n_frames = len(bands)
+    # label positions are in spectrogram time steps
+    factor = n_frames / len(data.times) if len(data.times) else 1.0
+    starts = np.clip(
+        np.floor(labels["start"].to_numpy()[indices] * factor), 0, n_frames - 1
+    ).astype(np.intp)
+    stops = np.clip(
+        np.ceil(labels["stop"].to_numpy()[indices] * factor), starts + 1, n_frames
+    ).astype(np.intp)
+
+    features = []
+    edges = [starts + (stops - starts) * k // N_SEGMENTS for k in range(N_SEGMENTS + 1)]
+    for first, last in zip(edges[:-1], edges[1:]):
+        last = np.maximum(last, first + 1)
+        features.append(_window_sums(bands, first, last) / (last - first)[:, None])
+    lengths = (stops - starts)[:, None]
+    mean = _window_sums(bands, starts, stops) / lengths
+    variance = _window_sums(bands, starts, stops, power=2) / lengths - mean**2
+    features.append(np.sqrt(np.maximum(variance, 0)))
+    return np.hstack(features).astype(np.float32)
+
+
+class LabelEmbeddings:
+    """Normalised label embeddings for similarity search.
+
+    Raw embeddings are kept in ``data.label_embeddings`` so they are saved
+    with the project. They are computed when missing and recomputed for
+    labels that are created or adjusted. Without ``follow`` changes are only
+    followed once ``follow`` is called, so the embeddings can be computed
+    in a worker thread.
+    """
+
+    def __init__(self, data: OrcaiData, follow: bool = True):
+        self.data = data
+        self.bands = band_energies(
+            _time_major(data.preprocessed_spectrogram(), len(data.times))
+        )
+        n_labels = len(data.predicted_labels)
+        if data.label_embeddings is None or len(data.label_embeddings) > n_labels:
+            data.label_embeddings = label_embeddings(data, bands=self.bands)
+        elif len(data.label_embeddings) < n_labels:
+            missing = np.arange(len(data.label_embeddings), n_labels)
+            data.label_embeddings = np.vstack(
+                [data.label_embeddings, label_embeddings(data, missing, self.bands)]
+            )
+        # labels changed since the embeddings were saved
+        journal = data.journal
+        changed = journal.records[: journal.cursor]
+        changed = changed["index"][
+            np.isin(
+                changed["action"], [ACTIONS.index("adjust"), ACTIONS.index("create")]
+            )
+        ]
+        changed = np.unique(changed[changed < n_labels])
+        if len(changed):
+            data.label_embeddings[changed] = label_embeddings(data, changed, self.bands)
+
+        features = data.label_embeddings
+        self.mean = features.mean(axis=0) if len(features) else 0
+        self.scale = features.std(axis=0) + 1e-6 if len(features) else 1
+        self.vectors = self._normalise(features)
+        if follow:
+            self.follow()
+
+    def follow(self, records: list[np.ndarray] = ()) -> None:
+        """Follow changes of the labels, after those of ``records``."""
+        for batch in records:
+            self.on_journal_change(batch)
+        self.data.journal.listeners.append(self.on_journal_change)
+
+    def _normalise(self, features: np.ndarray) -> np.ndarray:
+        vectors = (features - self.mean) / self.scale
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+    def similarity(self, index: int) -> np.ndarray:
+        """Cosine similarity of every label to label ``index``."""
+        return self.vectors @ self.vectors[index]
+
+    def similar(self, index: int) -> "SimilarityOrder":
+        """Navigation over all labels, most similar to label ``index`` first."""
+        return SimilarityOrder(self.similarity(index))
+
+    def update(self, indices) -> None:
+        """Recompute the embeddings of changed, created or removed labels."""
+        n_labels = len(self.data.predicted_labels)
+        features = self.data.label_embeddings[:n_labels]
+        if n_labels > len(features):
+            features = np.vstack(
+                [features, np.zeros((n_labels - len(features), features.shape[1]))]
+            ).astype(np.float32)
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        indices = indices[indices < n_labels]
+        if len(indices):
+            features[indices] = label_embeddings(self.data, indices, self.bands)
+        self.data.label_embeddings = features
+        vectors = self.vectors[:n_labels]
+        if n_labels > len(vectors):
+            vectors = np.vstack(
+                [vectors, np.zeros((n_labels - len(vectors), vectors.shape[1]))]
+            ).astype(np.float32)
+        vectors[indices] = self._normalise(features[indices])
+        self.vectors = vectors
+
+    def on_journal_change(self, records: np.ndarray) -> None:
+        moved = np.isin(
+            records["action"], [ACTIONS.index("adjust"), ACTIONS.index("create")]
+        )
+        if moved.any():
+            self.update(records["index"][moved])
+
+    def close(self) -> None:
+        """Stop following changes of the labels."""
+        if self.on_journal_change in self.data.journal.listeners:
+            self.data.journal.listeners.remove(self.on_journal_change)
+
+
+class LabelEmbeddingsBuilderSignals(QObject):
+    """Signals for the LabelEmbeddingsBuilder class."""
+
+    error = pyqtSignal(tuple)
+    result = pyqtSignal(object)
+
+
+class LabelEmbeddingsBuilder(QRunnable):
+    """Computes label embeddings in the background.
+
+    The embeddings do not follow label changes yet, those made meanwhile
+    are passed to ``follow`` in the GUI thread.
+    """
+
+    def __init__(self, data: OrcaiData):
+        super().__init__()
+        self.signals = LabelEmbeddingsBuilderSignals()
+        self.data = data
+
+    def run(self):
+        try:
+            embeddings = LabelEmbeddings(self.data, follow=False)
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        else:
+            self.signals.result.emit(embeddings)
+
+
+class SimilarityOrder:
+    """All labels ordered by decreasing similarity to a query label."""
+
+    def __init__(self, scores: np.ndarray):
+        self.scores = scores
+        self._order = np.argsort(-scores, kind="stable")
+        self._rank = np.empty_like(self._order)
+        self._rank[self._order] = np.arange(len(self._order))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def first(self) -> int | None:
+        return int(self._order[0]) if len(self._order) else None
+
+    def last(self) -> int | None:
+        return int(self._order[-1]) if len(self._order) else None
+
+    def next_after(self, index: int) -> int | None:
+        if index >= len(self._rank):
+            return None
+        rank = self._rank[index] + 1
+        return int(self._order[rank]) if rank < len(self._order) else None
+
+    def previous_before(self, index: int) -> int | None:
+        if index >= len(self._rank):
+            return None
+        rank = self._rank[index] - 1
+        return int(self._order[rank]) if rank >= 0 else None
+
+    def position(self, index: int) -> int | None:
+        return int(self._rank[index]) if index < len(self._rank) else None
+
+    def close(self) -> None:
+        pass
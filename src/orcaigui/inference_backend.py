@@ -0,0 +1,294 @@
+import hashlib
+import os
+import tempfile
+import threading
+from importlib.util import find_spec
+from pathlib import Path
+
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.scheduler import scheduler
+
+# inference backends: the Keras model of orcAI, or an export of it to a file
+# format and a post-training quantisation
+BACKENDS = {
+    "keras": (None, None),
+    "tflite": ("tflite", None),
+    "tflite-float16": ("tflite", "float16"),
+    "tflite-int8": ("tflite", "int8"),
+    "onnx": ("onnx", None),
+    "onnx-int8": ("onnx", "int8"),
+}
+DEFAULT_BACKEND = "keras"
+BATCH_SIZE = 32
+# modules the file formats need, one of each group, and the extra of
+# orcaigui installing them; TensorFlow comes with orcAI
+FORMAT_MODULES = {
+    "tflite": (("ai_edge_litert", "tensorflow"),),
+    "onnx": (("tf2onnx",), ("onnxruntime",)),
+}
+FORMAT_EXTRAS = {"tflite": "tflite", "onnx": "onnx"}
+
+
+def backend_available(backend: str) -> bool:
+    """Whether the modules to export and run a model for a backend are installed."""
+    file_format, _ = BACKENDS[backend]
+    if file_format is None:
+        return True
+    return all(
+        any(find_spec(module) is not None for module in group)
+        for group in FORMAT_MODULES[file_format]
+    )
+
+
+def available_backends() -> list[str]:
+    return [backend for backend in BACKENDS if backend_available(backend)]
+
+
+def backend_requirement(backend: str) -> str:
+    """How to install what a backend needs."""
+    return f"pip install orcaigui[{FORMAT_EXTRAS[BACKENDS[backend][0]]}]"
+
+
+def default_export_dir() -> Path:
+    cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache) / "orcaigui" / "exported_models"
+
+
+def model_digest(model_dir: Path) -> str:
+    """Short hash of the files of a model, to notice when it changes."""
+    entries = sorted(
+        (str(path.relative_to(model_dir)), path.stat().st_size, path.stat().st_mtime_ns)
+        for path in Path(model_dir).rglob("*")
+        if path.is_file()
+    )
+    return hashlib.sha1(repr(entries).encode()).hexdigest()[:12]
+
+
+def exported_path(
+    model_dir: Path, backend: str, export_dir: Path | None = None
+) -> Path:
+    """Where the export of a model to a backend is kept."""
+    file_format, _ = BACKENDS[backend]
+    model_dir = Path(model_dir)
+    return (
+        (export_dir or default_export_dir())
+        / f"{model_dir.name}-{model_digest(model_dir)}"
+        / f"{backend}.{file_format}"
+    )
+
+
+def export_model(model, shape: dict, backend: str, path: Path) -> None:
+    """Export a Keras model for a backend, quantising it if the backend does.
+
+    Quantisation is post-training: ``float16`` stores the weights at half
+    precision, ``int8`` quantises the weights to 8 bits and the activations
+    dynamically, so no calibration data is needed.
+    """
+    file_format, quantisation = BACKENDS[backend]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # a name of its own, as several processes may export at once
+    fd, part_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f"{path.name}.", suffix=".part"
+    )
+    os.close(fd)
+    part_path = Path(part_path)
+    try:
+        _export(model, shape, file_format, quantisation, part_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    # written completely or not at all
+    os.replace(part_path, path)
+
+
+def _export(
+    model, shape: dict, file_format: str, quantisation: str | None, part_path: Path
+) -> None:
+    import tensorflow as tf
+
+    if file_format == "tflite":
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantisation is not None:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantisation == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        part_path.write_bytes(converter.convert())
+    else:
+        import tf2onnx
+
+        input_signature = (
+            tf.TensorSpec((None, *shape["input_shape"]), tf.float32, name="input"),
+        )
+        tf2onnx.convert.from_keras(
+            model, input_signature=input_signature, output_path=str(part_path)
+        )
+        if quantisation == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            float_path = part_path.with_name(part_path.name + ".float")
+            os.replace(part_path, float_path)
+            try:
+                quantize_dynamic(float_path, part_path, weight_type=QuantType.QInt8)
+            finally:
+                float_path.unlink()
+
+
+class ExportedModel:
+    """An exported model with the ``predict`` of a Keras model.
+
+    Inputs are reshaped to the input shape of the model and run in batches
+    of ``batch_size``.
+    """
+
+    def __init__(self, path: Path, threads: int | None = None):
+        self.path = Path(path)
+        self.threads = threads or scheduler.plan.inference_threads
+
+    def predict(self, x, batch_size: int | None = None, verbose=0, **kwargs):
+        x = np.asarray(x, dtype=np.float32).reshape(-1, *self.input_shape)
+        batch_size = batch_size or BATCH_SIZE
+        return np.concatenate(
+            [
+                self.run(x[start : start + batch_size])
+                for start in range(0, len(x), batch_size)
+            ]
+        )
+
+    __call__ = predict
+
+
+class TFLiteModel(ExportedModel):
+    def __init__(self, path: Path, threads: int | None = None):
+        super().__init__(path, threads)
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(
+            model_path=str(self.path), num_threads=self.threads
+        )
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self.input["shape"][1:])
+        self.batch_size = None
+        # an interpreter runs one batch at a time
+        self._lock = threading.Lock()
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if len(batch) != self.batch_size:
+                self.interpreter.resize_tensor_input(
+                    self.input["index"], (len(batch), *self.input_shape)
+                )
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(batch)
+            self.interpreter.set_tensor(self.input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output["index"]).copy()
+
+
+class OnnxModel(ExportedModel):
+    def __init__(self, path: Path, threads: int | None = None):
+        super().__init__(path, threads)
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            str(self.path), options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(model_input.shape[1:])
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def load_exported(path: Path, backend: str, threads: int | None = None):
+    file_format, _ = BACKENDS[backend]
+    if file_format == "tflite":
+        return TFLiteModel(path, threads)
+    return OnnxModel(path, threads)
+
+
+def backend_model(
+    model,
+    model_dir: Path,
+    shape: dict,
+    backend: str,
+    export_dir: Path | None = None,
+    threads: int | None = None,
+):
+    """The model for a backend, exporting the Keras model the first time."""
+    if BACKENDS[backend][0] is None:
+        return model
+    path = exported_path(model_dir, backend, export_dir)
+    if not path.exists():
+        export_model(model, shape, backend, path)
+    return load_exported(path, backend, threads)
+
+
+def load_model_backend(
+    model_dir: Path, backend: str = DEFAULT_BACKEND, export_dir: Path | None = None
+) -> tuple:
+    """``load_orcai_model`` with the model replaced by one for ``backend``."""
+    from orcAI.io import load_orcai_model
+
+    model, orcai_parameter, shape = load_orcai_model(model_dir)
+    model = backend_model(model, model_dir, shape, backend, export_dir)
+    return model, orcai_parameter, shape
+
+
+def compare_predictions(
+    reference: np.ndarray, candidate: np.ndarray, threshold: float = 0.5
+) -> dict[str, float]:
+    """Errors of aggregated predictions against those of the reference model.
+
+    ``agreement`` is the fraction of prediction steps and calls on the same
+    side of ``threshold``, i.e. giving the same labels.
+    """
+    error = np.abs(candidate - reference)
+    return {
+        "max_error": float(error.max(initial=0)),
+        "mean_error": float(error.mean()) if error.size else 0.0,
+        "agreement": float(np.mean((candidate > threshold) == (reference > threshold)))
+        if error.size
+        else 1.0,
+    }
+
+
+class ModelExporterSignals(QObject):
+    """Signals for the ModelExporter class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    result = pyqtSignal(str, object)
+
+
+class ModelExporter(QRunnable):
+    """Exports a model for a backend, if not done before, and loads it."""
+
+    def __init__(self, model, model_dir: Path, shape: dict, backend: str):
+        super().__init__()
+        self.signals = ModelExporterSignals()
+        self.model = model
+        self.model_dir = model_dir
+        self.shape = shape
+        self.backend = backend
+
+    def run(self):
+        try:
+            if not exported_path(self.model_dir, self.backend).exists():
+                self.signals.progress.emit(
+                    f"Exporting {self.model_dir.name} for {self.backend}..."
+                )
+            model = backend_model(self.model, self.model_dir, self.shape, self.backend)
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        else:
+            self.signals.result.emit(self.backend, model)
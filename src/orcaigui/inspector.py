@@ -6,6 +6,9 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
+from orcaigui.instrumentation import recorder
+from orcaigui.orcaidata import ProjectInfo
+
 
 class infoWidget(QWidget):
     def __init__(self, label: str, value=None):
@@ -25,34 +28,89 @@ class infoWidget(QWidget):
 
 
 class InspectorWindow(QWidget):
-    def __init__(self, data=None):
+    def __init__(self, data=None, memory=None):
         super().__init__()
         self.data = data
+        self.memory = memory
 
         self.setWindowTitle("Inspector")
         layout = QVBoxLayout()
-        layout.addWidget(
-            infoWidget("Recording", self.data.recording_path if self.data else None)
-        )
-        layout.addWidget(
-            infoWidget("Channel", self.data.channel if self.data else None)
+        self.info_widgets = {
+            "recording": infoWidget("Recording"),
+            "channel": infoWidget("Channel"),
+            "model": infoWidget("Model"),
+            "duration": infoWidget("Duration"),
+            "labels": infoWidget("# Labels"),
+            "checked": infoWidget("Checked"),
+            "calls": infoWidget("Calls"),
+        }
+        for widget in self.info_widgets.values():
+            layout.addWidget(widget)
+        layout.addWidget(QLabel("<b>Pipeline stages</b>"))
+        self.timings_label = QLabel(alignment=Qt.AlignmentFlag.AlignLeft)
+        self.timings_label.setTextInteractionFlags(
+            Qt.TextInteractionFlag.TextSelectableByMouse
         )
-        layout.addWidget(
-            infoWidget("# Labels", self.data.n_labels() if self.data else None)
+        layout.addWidget(self.timings_label)
+        layout.addWidget(QLabel("<b>Memory</b>"))
+        self.memory_label = QLabel(alignment=Qt.AlignmentFlag.AlignLeft)
+        self.memory_label.setTextInteractionFlags(
+            Qt.TextInteractionFlag.TextSelectableByMouse
         )
+        layout.addWidget(self.memory_label)
         self.setLayout(layout)
+        self.update_data(self.data)
 
     def update_data(self, data):
         """Set the data to be displayed in the inspector."""
         self.data = data
-        if self.data:
-            self.layout().itemAt(0).widget().value.setText(
-                str(self.data.recording_path) if self.data.recording_path else ""
-            )
-            self.layout().itemAt(1).widget().value.setText(
-                str(self.data.channel) if self.data.channel else ""
+        self.show_info(self.data.info() if self.data else None)
+        self.show_timings()
+        self.show_memory()
+
+    def show_timings(self):
+        """Summarise the recorded pipeline stages."""
+        lines = []
+        for name, stage in recorder.summary().items():
+            line = (
+                f"{name}: {stage['count']}x, last {stage['last']:.2f} s, "
+                f"total {stage['wall']:.2f} s (CPU {stage['cpu']:.2f} s)"
             )
-            self.layout().itemAt(2).widget().value.setText(str(self.data.n_labels()))
-        else:
-            self.layout().itemAt(0).widget().value.setText("")
-            self.layout().itemAt(1).widget().value.setText("")
+            if stage["peak_rss"]:
+                line += f", peak RSS {stage['peak_rss'] / 2**20:.0f} MB"
+            lines.append(line)
+        self.timings_label.setText("\n".join(lines) or "No stages recorded")
+
+    def show_memory(self):
+        """Show the memory used by recordings and caches and the budget."""
+        if self.memory is None:
+            self.memory_label.setText("")
+            return
+        usage = self.memory.usage()
+        lines = [f"{name}: {n_bytes / 2**20:.0f} MB" for name, n_bytes in usage.items()]
+        lines.append(
+            f"Total {sum(usage.values()) / 2**20:.0f} MB"
+            f" of {self.memory.budget / 2**20:.0f} MB,"
+            f" {self.memory.spilled_bytes() / 2**20:.0f} MB memory-mapped"
+        )
+        self.memory_label.setText("\n".join(lines))
+
+    def show_info(self, info: ProjectInfo | None):
+        """Display a project summary, e.g. from ``probe_project``."""
+        if info is None:
+            for widget in self.info_widgets.values():
+                widget.value.setText("")
+            return
+        values = {
+            "recording": str(info.recording_path) if info.recording_path else "",
+            "channel": str(info.channel) if info.channel else "",
+            "model": info.model_name or "",
+            "duration": info.duration_string(),
+            "labels": str(info.n_labels()),
+            "checked": f"{info.n_checked} ({info.progress():.0%})",
+            "calls": ", ".join(
+                f"{call}: {count}" for call, count in sorted(info.label_counts.items())
+            ),
+        }
+        for key, value in values.items():
+            self.info_widgets[key].value.setText(value)
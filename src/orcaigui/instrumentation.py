@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+FORMATS = ("jsonl", "chrome")
+MAX_RECORDS = 10000
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of the process in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def describe(value) -> dict:
+    """Size of an array, DataFrame or other value for a stage record."""
+    if isinstance(value, np.ndarray):
+        return {
+            "shape": list(value.shape),
+            "dtype": str(value.dtype),
+            "bytes": value.nbytes,
+        }
+    if hasattr(value, "memory_usage") and hasattr(value, "shape"):
+        return {
+            "shape": list(value.shape),
+            "bytes": int(value.memory_usage(deep=True).sum()),
+        }
+    if hasattr(value, "__len__"):
+        return {"len": len(value)}
+    return {"value": repr(value)}
+
+
+@dataclass
+class StageRecord:
+    """Resources used by one run of a stage of the pipeline."""
+
+    name: str
+    start: float  # seconds since the epoch
+    wall: float  # seconds
+    cpu: float  # process CPU seconds, all threads
+    peak_rss: int | None  # bytes, at the end of the stage
+    pid: int
+    thread: str
+    sizes: dict = field(default_factory=dict)
+    info: dict = field(default_factory=dict)
+    error: str | None = None
+
+    def size(self, **values) -> None:
+        """Record the size of arrays or tables the stage produced."""
+        for name, value in values.items():
+            self.sizes[name] = describe(value)
+
+    def chrome_event(self) -> dict:
+        """The record as a complete event of the Chrome trace event format."""
+        return {
+            "name": self.name,
+            "cat": "orcaigui",
+            "ph": "X",
+            "ts": self.start * 1e6,
+            "dur": self.wall * 1e6,
+            "pid": self.pid,
+            "tid": self.thread,
+            "args": {
+                "cpu": self.cpu,
+                "peak_rss": self.peak_rss,
+                "sizes": self.sizes,
+                **self.info,
+                **({"error": self.error} if self.error else {}),
+            },
+        }
+
+
+class Recorder:
+    """Collects stage records and appends them to a file if one is set.
+
+    ``jsonl`` writes one record per line, ``chrome`` writes trace events
+    that can be opened in chrome://tracing or Perfetto. The trace is a JSON
+    array without closing bracket, which both accept, so it can be appended
+    to while the program runs.
+    """
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self.records: deque[StageRecord] = deque(maxlen=max_records)
+        self.path = None
+        self.format = "jsonl"
+        self._lock = threading.Lock()
+
+    def configure(self, path: Path | None, format: str | None = None) -> None:
+        """Write records to ``path``, in ``format`` or one from its suffix."""
+        if format is None and path is not None:
+            format = "chrome" if Path(path).suffix == ".json" else "jsonl"
+        if format is not None and format not in FORMATS:
+            raise ValueError(f"Unknown format {format}, expected one of {FORMATS}")
+        with self._lock:
+            self.path = Path(path) if path is not None else None
+            self.format = format or self.format
+            if (
+                self.path is not None
+                and self.format == "chrome"
+                and (not self.path.exists() or self.path.stat().st_size == 0)
+            ):
+                self.path.write_text("[\n")
+
+    @contextmanager
+    def stage(self, name: str, **info):
+        """Measure the stage run in the ``with`` block.
+
+        Yields the StageRecord, to add sizes with ``record.size``. An
+        exception is recorded with the stage and raised again.
+        """
+        record = StageRecord(
+            name=name,
+            start=time.time(),
+            wall=0.0,
+            cpu=0.0,
+            peak_rss=None,
+            pid=os.getpid(),
+            thread=threading.current_thread().name,
+            info=info,
+        )
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        except Exception as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.wall = time.perf_counter() - wall
+            record.cpu = time.process_time() - cpu
+            record.peak_rss = peak_rss()
+            self.add(record)
+
+    def add(self, record: StageRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+            if self.path is None:
+                return
+            try:
+                with open(self.path, "a") as f:
+                    if self.format == "chrome":
+                        f.write(json.dumps(record.chrome_event(), default=str) + ",\n")
+                    else:
+                        f.write(json.dumps(asdict(record), default=str) + "\n")
+            except OSError as e:
+                print(e)
+
+    def extend(self, records: list[StageRecord]) -> None:
+        """Add records made in another process."""
+        for record in records:
+            self.add(record)
+
+    def summary(self) -> dict[str, dict]:
+        """Count, total and last wall time, total CPU time and peak RSS by stage."""
+        with self._lock:
+            records = list(self.records)
+        summary = {}
+        for record in records:
+            stage = summary.setdefault(
+                record.name,
+                {"count": 0, "wall": 0.0, "cpu": 0.0, "last": 0.0, "peak_rss": 0},
+            )
+            stage["count"] += 1
+            stage["wall"] += record.wall
+            stage["cpu"] += record.cpu
+            stage["last"] = record.wall
+            stage["peak_rss"] = max(stage["peak_rss"], record.peak_rss or 0)
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+
+
+recorder = Recorder()
+stage = recorder.stage
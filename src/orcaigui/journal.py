@@ -0,0 +1,332 @@
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pandas as pd
+
+ACTIONS = ("mark", "adjust", "create", "relabel")
+LABEL_COLUMNS = (
+    "start",
+    "stop",
+    "label",
+    "label_checked",
+    "label_ok",
+    "label_source",
+)
+STRING_COLUMNS = ("label", "label_source")
+OLD, NEW = 0, 1
+
+# one fixed-size record per changed label, holding the old and new values of
+# every label column. String values are stored as codes into the vocabulary.
+JOURNAL_DTYPE = np.dtype(
+    [
+        ("action", "u1"),
+        ("batch", "u4"),
+        ("index", "i8"),
+        ("start", "f8", (2,)),
+        ("stop", "f8", (2,)),
+        ("label", "i4", (2,)),
+        ("label_checked", "?", (2,)),
+        ("label_ok", "?", (2,)),
+        ("label_source", "i4", (2,)),
+    ]
+)
+
+
+def journal_path(project_path: Path) -> Path:
+    """Path of the autosave journal stored alongside a project file."""
+    return project_path.with_name(project_path.name + ".journal")
+
+
+class CurationJournal:
+    """Append-only log of curation actions on the predicted labels.
+
+    Every change to ``data.predicted_labels`` is recorded as one record per
+    label holding the old and new values. Undo and redo replay records
+    instead of snapshotting the table. Records that belong to the same
+    operation share a batch id and are undone together.
+    """
+
+    def __init__(self, data, capacity: int = 1024):
+        self.data = data
+        self.records = np.zeros(capacity, dtype=JOURNAL_DTYPE)
+        self.vocabulary: list[str] = []
+        self.length = 0  # number of records in the log, including undone ones
+        self.cursor = 0  # number of records currently applied
+        self.saved_cursor = 0
+        self.revision = None
+        self.recovered = 0
+        self.listeners = []
+
+        self._codes: dict[str, int] = {}
+        self._vocabulary_array = np.empty(0, dtype=object)
+        self._next_batch = 0
+        self._stream_path = None
+        self._flushed = 0
+        self._flushed_cursor = 0
+        self._flushed_vocabulary = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def can_undo(self) -> bool:
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        return self.cursor < self.length
+
+    def is_dirty(self) -> bool:
+        """Whether the labels differ from the last saved project."""
+        return self.cursor != self.saved_cursor
+
+    def record(self, action: str, index: int, **changes) -> np.ndarray:
+        """Apply and record changes to a single label."""
+        return self.record_many(action, [index], **changes)
+
+    def record_many(self, action: str, indices, **changes) -> np.ndarray:
+        """Apply and record the same changes to several labels as one batch.
+
+        Values in ``changes`` are either scalars, applied to all labels, or
+        arrays with one value per label.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        labels = self.data.predicted_labels
+        records = np.zeros(len(indices), dtype=JOURNAL_DTYPE)
+        records["action"] = ACTIONS.index(action)
+        records["batch"] = self._new_batch()
+        records["index"] = indices
+        for column in LABEL_COLUMNS:
+            old = labels.loc[indices, column].to_numpy()
+            new = np.broadcast_to(changes.get(column, old), old.shape)
+            records[column][:, OLD] = self._encode(column, old)
+            records[column][:, NEW] = self._encode(column, new)
+        self._append(records)
+        self._apply(records, NEW)
+        self._notify(records)
+        return records
+
+    def create(self, label: dict) -> np.ndarray:
+        """Append and record a new label."""
+        return self.create_many(pd.DataFrame([label]))
+
+    def create_many(self, labels: pd.DataFrame) -> np.ndarray:
+        """Append and record new labels as one batch."""
+        records = np.zeros(len(labels), dtype=JOURNAL_DTYPE)
+        records["action"] = ACTIONS.index("create")
+        records["batch"] = self._new_batch()
+        records["index"] = len(self.data.predicted_labels) + np.arange(len(labels))
+        for column in LABEL_COLUMNS:
+            records[column][:, NEW] = self._encode(column, labels[column].to_numpy())
+        self._append(records)
+        self._apply(records, NEW)
+        self._notify(records)
+        return records
+
+    def undo(self) -> np.ndarray | None:
+        """Revert the last applied batch. Returns the reverted records."""
+        if not self.can_undo():
+            return None
+        batch = self.records["batch"][self.cursor - 1]
+        start = self.cursor - 1
+        while start > 0 and self.records["batch"][start - 1] == batch:
+            start -= 1
+        records = self.records[start : self.cursor]
+        self._apply(records[::-1], OLD)
+        self.cursor = start
+        self._notify(records)
+        return records
+
+    def redo(self) -> np.ndarray | None:
+        """Re-apply the next undone batch. Returns the re-applied records."""
+        if not self.can_redo():
+            return None
+        batch = self.records["batch"][self.cursor]
+        stop = self.cursor + 1
+        while stop < self.length and self.records["batch"][stop] == batch:
+            stop += 1
+        records = self.records[self.cursor : stop]
+        self._apply(records, NEW)
+        self.cursor = stop
+        self._notify(records)
+        return records
+
+    def needs_flush(self, path: Path) -> bool:
+        """Whether the autosave stream at ``path`` is behind the journal."""
+        if path != self._stream_path:
+            return self.length > 0
+        return self._flushed != self.length or self._flushed_cursor != self.cursor
+
+    def mark_saved(self, revision: str) -> None:
+        """Remember that the current state was saved as project ``revision``."""
+        self.saved_cursor = self.cursor
+        self.revision = revision
+
+    def flush(self, path: Path) -> None:
+        """Append records not yet written to the autosave stream at ``path``."""
+        if path != self._stream_path:
+            self._stream_path = path
+            self._flushed = 0
+            self._flushed_vocabulary = 0
+            mode = "w"
+        else:
+            mode = "a"
+        with h5py.File(path, mode) as f:
+            if "records" not in f:
+                f.create_dataset(
+                    "records",
+                    shape=(0,),
+                    maxshape=(None,),
+                    dtype=JOURNAL_DTYPE,
+                    chunks=(256,),
+                )
+                f.create_dataset(
+                    "vocabulary",
+                    shape=(0,),
+                    maxshape=(None,),
+                    dtype=h5py.string_dtype(),
+                    chunks=(64,),
+                )
+            records = f["records"]
+            records.resize((self.length,))
+            if self.length > self._flushed:
+                records[self._flushed : self.length] = self.records[
+                    self._flushed : self.length
+                ]
+            vocabulary = f["vocabulary"]
+            vocabulary.resize((len(self.vocabulary),))
+            if len(self.vocabulary) > self._flushed_vocabulary:
+                vocabulary[self._flushed_vocabulary :] = self.vocabulary[
+                    self._flushed_vocabulary :
+                ]
+            f.attrs["cursor"] = self.cursor
+            f.attrs["saved_cursor"] = self.saved_cursor
+            f.attrs["revision"] = self.revision or ""
+        self._flushed = self.length
+        self._flushed_cursor = self.cursor
+        self._flushed_vocabulary = len(self.vocabulary)
+
+    def recover(self, path: Path) -> int:
+        """Restore the journal from the autosave stream at ``path``.
+
+        The stream is only used if it was written against the currently
+        loaded project revision. Unsaved actions are replayed onto the
+        labels. Returns the number of replayed records.
+        """
+        if not path.exists():
+            return 0
+        with h5py.File(path, "r") as f:
+            if f.attrs.get("revision", "") != (self.revision or ""):
+                return 0
+            records = f["records"][:]
+            vocabulary = list(f["vocabulary"].asstr()[:])
+            cursor = int(f.attrs["cursor"])
+            saved_cursor = int(f.attrs["saved_cursor"])
+        if saved_cursor < 0:
+            return 0
+
+        self.records = np.zeros(max(len(records), 1024), dtype=JOURNAL_DTYPE)
+        self.records[: len(records)] = records
+        self.length = len(records)
+        self.vocabulary = vocabulary
+        self._codes = {value: code for code, value in enumerate(vocabulary)}
+        self._vocabulary_array = np.asarray(vocabulary, dtype=object)
+        self._next_batch = int(records["batch"].max()) + 1 if len(records) else 0
+        self._stream_path = path
+        self._flushed = self.length
+        self._flushed_cursor = cursor
+        self._flushed_vocabulary = len(vocabulary)
+
+        self.saved_cursor = saved_cursor
+        if cursor > saved_cursor:
+            replay = self.records[saved_cursor:cursor]
+            self._apply(replay, NEW)
+        else:
+            replay = self.records[cursor:saved_cursor]
+            self._apply(replay[::-1], OLD)
+        self.cursor = cursor
+        self.recovered = len(replay)
+        return self.recovered
+
+    def _new_batch(self) -> int:
+        batch = self._next_batch
+        self._next_batch += 1
+        return batch
+
+    def _append(self, records: np.ndarray) -> None:
+        # a new action discards the undone records. If the saved state was
+        # among them, it can no longer be reached by replaying the journal.
+        if self.saved_cursor > self.cursor:
+            self.saved_cursor = -1
+        self.length = self.cursor
+        self._flushed = min(self._flushed, self.cursor)
+        if self.length + len(records) > len(self.records):
+            capacity = max(2 * len(self.records), self.length + len(records))
+            grown = np.zeros(capacity, dtype=JOURNAL_DTYPE)
+            grown[: self.length] = self.records[: self.length]
+            self.records = grown
+        self.records[self.length : self.length + len(records)] = records
+        self.length += len(records)
+        self.cursor = self.length
+
+    def _code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.vocabulary)
+            self._codes[value] = code
+            self.vocabulary.append(value)
+        return code
+
+    def _encode(self, column: str, values) -> np.ndarray:
+        if column not in STRING_COLUMNS:
+            return values
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        return np.array([self._code(str(v)) for v in uniques], dtype=np.int32)[codes]
+
+    def _decode(self, column: str, values: np.ndarray) -> np.ndarray:
+        if column not in STRING_COLUMNS:
+            return values
+        if len(self._vocabulary_array) != len(self.vocabulary):
+            self._vocabulary_array = np.asarray(self.vocabulary, dtype=object)
+        return self._vocabulary_array[values]
+
+    def _apply(self, records: np.ndarray, side: int) -> None:
+        """Write the old or new values of ``records`` to the label table.
+
+        Records are applied batch by batch in the given order, each batch
+        with one vectorised assignment per column.
+        """
+        if len(records) == 0:
+            return
+        bounds = np.flatnonzero(np.diff(records["batch"].astype(np.int64))) + 1
+        for batch in np.split(records, bounds):
+            if batch["action"][0] == ACTIONS.index("create"):
+                self._apply_create(batch, side)
+            else:
+                self._apply_update(batch, side)
+
+    def _apply_update(self, records: np.ndarray, side: int) -> None:
+        labels = self.data.predicted_labels
+        for column in LABEL_COLUMNS:
+            values = self._decode(column, records[column][:, side])
+            if column not in STRING_COLUMNS:
+                values = values.astype(labels[column].dtype)
+            labels.loc[records["index"], column] = values
+
+    def _apply_create(self, records: np.ndarray, side: int) -> None:
+        labels = self.data.predicted_labels
+        for record in records:
+            if side == NEW:
+                labels.loc[record["index"]] = {
+                    column: self._decode(column, record[column][NEW : NEW + 1])
+                    .astype(
+                        object if column in STRING_COLUMNS else labels[column].dtype
+                    )
+                    .item()
+                    for column in LABEL_COLUMNS
+                }
+            else:
+                labels.drop(index=record["index"], inplace=True)
+
+    def _notify(self, records: np.ndarray) -> None:
+        for listener in self.listeners:
+            listener(records)
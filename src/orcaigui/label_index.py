@@ -0,0 +1,152 @@
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+import pandas as pd
+
+from orcaigui.orcaidata import OrcaiData
+
+STATUSES = ("unchecked", "correct", "wrong")
+
+
+def label_status(label_checked: np.ndarray, label_ok: np.ndarray) -> np.ndarray:
+    """Curation status of labels as indices into STATUSES."""
+    return np.where(label_checked, np.where(label_ok, 1, 2), 0).astype(np.int8)
+
+
+class LabelIndex:
+    """Sorted label indices per call type and curation status.
+
+    The index follows the curation journal and moves only the changed
+    labels between groups, so filtered navigation and the counts per group
+    stay current without rescanning the label table.
+    """
+
+    def __init__(self, data: OrcaiData):
+        self.data = data
+        labels = data.predicted_labels
+        self._calls = (
+            labels["label"].str.replace("*", "", regex=False).to_numpy(dtype=object)
+        )
+        self._statuses = label_status(
+            labels["label_checked"].to_numpy(dtype=bool),
+            labels["label_ok"].to_numpy(dtype=bool),
+        )
+        groups = pd.DataFrame({"call": self._calls, "status": self._statuses})
+        self._members: dict[tuple[str, int], list[int]] = {
+            (call, int(status)): indices.tolist()
+            for (call, status), indices in groups.groupby(
+                ["call", "status"]
+            ).indices.items()
+        }
+        data.journal.listeners.append(self.on_journal_change)
+
+    def calls(self) -> list[str]:
+        """Call types that have at least one label."""
+        return sorted({call for (call, _), members in self._members.items() if members})
+
+    def count(self, call: str | None = None, status: str | None = None) -> int:
+        """Number of labels matching a filter, None matching everything."""
+        return sum(len(members) for members in self._filtered_groups(call, status))
+
+    def filtered(self, call: str | None = None, status: str | None = None):
+        """Navigation over the labels matching a filter, in index order."""
+        return FilteredOrder(self, call, status)
+
+    def _filtered_groups(self, call: str | None, status: str | None):
+        status_code = STATUSES.index(status) if status is not None else None
+        return [
+            members
+            for (group_call, group_status), members in self._members.items()
+            if (call is None or group_call == call)
+            and (status_code is None or group_status == status_code)
+        ]
+
+    def update(self, indices) -> None:
+        """Move labels to the groups matching their current call and status."""
+        labels = self.data.predicted_labels
+        n_labels = len(labels)
+        if n_labels > len(self._calls):
+            grow = n_labels - len(self._calls)
+            self._calls = np.concatenate([self._calls, np.full(grow, None)])
+            self._statuses = np.concatenate(
+                [self._statuses, np.zeros(grow, dtype=np.int8)]
+            )
+
+        for index in np.unique(np.asarray(indices, dtype=np.int64)).tolist():
+            if self._calls[index] is not None:
+                members = self._members[
+                    (self._calls[index], int(self._statuses[index]))
+                ]
+                position = bisect_left(members, index)
+                if position < len(members) and members[position] == index:
+                    del members[position]
+            if index >= n_labels:
+                self._calls[index] = None
+                continue
+            call = labels.at[index, "label"].replace("*", "")
+            status = label_status(
+                labels.at[index, "label_checked"], labels.at[index, "label_ok"]
+            )
+            self._calls[index] = call
+            self._statuses[index] = status
+            insort(self._members.setdefault((call, int(status)), []), index)
+
+    def on_journal_change(self, records: np.ndarray) -> None:
+        self.update(records["index"])
+
+    def close(self) -> None:
+        """Stop following changes of the labels."""
+        if self.on_journal_change in self.data.journal.listeners:
+            self.data.journal.listeners.remove(self.on_journal_change)
+
+
+class FilteredOrder:
+    """Labels of a LabelIndex matching a call type and status, in index order.
+
+    Each step is a bisect in every matching group, O(log n).
+    """
+
+    def __init__(self, label_index: LabelIndex, call: str | None, status: str | None):
+        self.label_index = label_index
+        self.call = call
+        self.status = status
+
+    def _groups(self):
+        return self.label_index._filtered_groups(self.call, self.status)
+
+    def __len__(self) -> int:
+        return sum(len(members) for members in self._groups())
+
+    def first(self) -> int | None:
+        return min((m[0] for m in self._groups() if m), default=None)
+
+    def last(self) -> int | None:
+        return max((m[-1] for m in self._groups() if m), default=None)
+
+    def next_after(self, index: int) -> int | None:
+        candidates = []
+        for members in self._groups():
+            position = bisect_right(members, index)
+            if position < len(members):
+                candidates.append(members[position])
+        return min(candidates, default=None)
+
+    def previous_before(self, index: int) -> int | None:
+        candidates = []
+        for members in self._groups():
+            position = bisect_left(members, index)
+            if position > 0:
+                candidates.append(members[position - 1])
+        return max(candidates, default=None)
+
+    def position(self, index: int) -> int | None:
+        """Position of a label within the filter, None if it does not match."""
+        position, found = 0, False
+        for members in self._groups():
+            i = bisect_left(members, index)
+            position += i
+            found = found or (i < len(members) and members[i] == index)
+        return position if found else None
+
+    def close(self) -> None:
+        pass
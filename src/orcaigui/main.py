@@ -1,35 +1,86 @@
+import json
+import os
+import struct
 import sys
 from getpass import getuser
 from importlib.resources import files
 from pathlib import Path
 
+import numpy as np
 from orcAI.io import load_orcai_model
-from PyQt6.QtCore import QSettings, Qt, QThreadPool, pyqtSlot
+from PyQt6.QtCore import QSettings, Qt, QThreadPool, QTimer, pyqtSlot
 from PyQt6.QtGui import QAction, QActionGroup, QIcon, QKeySequence
 from PyQt6.QtWidgets import (
     QApplication,
     QFileDialog,
+    QInputDialog,
     QMainWindow,
+    QMessageBox,
     QSplitter,
     QVBoxLayout,
     QWidget,
 )
 
 from orcaigui.about import AboutWindow
-from orcaigui.audio_file_loader import AudioFileLoader, SpectrogramProcessor
+from orcaigui.audio_file_loader import (
+    AllChannelsProcessor,
+    AudioFileLoader,
+    DecodedAudioCache,
+    ProjectFileLoader,
+    ProjectMerger,
+    ProjectProber,
+    SpectrogramProcessor,
+    channel_count,
+    wav_layout,
+)
+from orcaigui.bulk_curation import accept_labels, reject_labels, select_labels
 from orcaigui.curate_widget import CurateWidget
+from orcaigui.diagnostics import DiagnosticsHud, diagnostics
 from orcaigui.dialogs import (
+    BulkAcceptDialog,
+    BulkRejectDialog,
     ChannelSelectDialog,
     ExportLabelsAsDialog,
-    SaveProjectAsDialog,
     LabelNameDialog,
+    MergeProjectsDialog,
+    ModelSelectDialog,
+    ProjectBrowserDialog,
+    RefineBandDialog,
+    SaveProjectAsDialog,
+)
+from orcaigui.inference_backend import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    ModelExporter,
+    backend_available,
+    backend_requirement,
 )
 from orcaigui.inspector import InspectorWindow
-from orcaigui.orcaidata import OrcaiData
+from orcaigui.instrumentation import recorder
+from orcaigui.journal import ACTIONS, journal_path
+from orcaigui.memory import MEMORY_BUDGET, MemoryBudget, SpillWriter, resident_bytes
+from orcaigui.models import DEFAULT_MODEL, ModelRunner, available_models
+from orcaigui.orcaidata import (
+    PP_SPECTROGRAM_STORAGE,
+    SPECTROGRAM_STORAGE,
+    OrcaiData,
+)
+from orcaigui.playlist import (
+    PREFETCH_DEPTH,
+    Playlist,
+    PlaylistEntryLoader,
+    default_project_path,
+    playlist_from_folder,
+)
+from orcaigui.refine import REFINE_BAND, refine_labels
+from orcaigui.scheduler import plan_threads, scheduler
 from orcaigui.spectrogram_widget import SpectrogramWidget
+from orcaigui.tail import POLL_INTERVAL, RecordingTail, TailProcessor
 
 COLORMAPS = ["inferno", "viridis", "plasma", "magma", "cividis", "Greys"]
 N_RECENT_FILES = 5
+AUTOSAVE_INTERVAL = 30  # seconds
+AUDIO_CACHE_SIZE = 2048  # megabytes
 
 
 class MainWindow(QMainWindow):
@@ -38,19 +89,66 @@ class MainWindow(QMainWindow):
         self.threadpool = QThreadPool()
         self.setWindowTitle("orcAI")
 
-        self.model_dir = files("orcAI.models").joinpath("orcai-v1")
+        settings = QSettings()
+        # before the model is loaded, TensorFlow's threads are fixed from then on
+        scheduler.configure(
+            self.threadpool,
+            plan_threads(settings.value("cpuThreads", defaultValue=0, type=int)),
+        )
+        self.model_dirs = settings.value("modelDirs", defaultValue=[], type=list)
+        self.models = available_models(self.model_dirs)
+        model_key = settings.value("model", defaultValue=DEFAULT_MODEL, type=str)
+        if model_key not in self.models:
+            model_key = DEFAULT_MODEL
+        self.model_dir = self.models[model_key]
         self.model, self.orcai_parameter, self.shape = load_orcai_model(self.model_dir)
         self.model_name = self.orcai_parameter["name"]
+        # the model as loaded, self.model may be an export of it
+        self.keras_model = self.model
+        self.inference_backend = DEFAULT_BACKEND
+        # models loaded for comparison and the runs in progress, by name
+        self.loaded_models = {model_key: (self.model, self.orcai_parameter, self.shape)}
+        self.model_runners = {}
 
         self.spectrogram_parameter = self.orcai_parameter["spectrogram"]
         self.data = None
         self.project_path = None
+        self.project_loader = None
+        self.recent_prober = None
+        self.recent_actions = {}
+        self.recording_path = None
+        # results of the channels of the current recording, with their project
+        self.channel_results: dict[int, tuple[OrcaiData, Path | None]] = {}
+        self.channel_processors: dict[tuple[Path, int], SpectrogramProcessor] = {}
+        self.requested_channel = None
+        self.n_channels = None
+        self.all_channels_processor = None
 
-        self.inspector_window = InspectorWindow(self.data)
-
-        settings = QSettings()
         self.colormap_name = settings.value("colormap", defaultValue="Greys", type=str)
         self.username = settings.value("username", defaultValue=getuser(), type=str)
+        self.spectrogram_storage = settings.value(
+            "spectrogramStorage", defaultValue="full", type=str
+        )
+        self.pp_spectrogram_storage = settings.value(
+            "ppSpectrogramStorage", defaultValue="full", type=str
+        )
+        self.autosave_interval = settings.value(
+            "autosaveInterval", defaultValue=AUTOSAVE_INTERVAL, type=int
+        )
+        timings_path = settings.value("instrumentationFile", defaultValue="", type=str)
+        if timings_path:
+            recorder.configure(Path(timings_path))
+        self.audio_cache = DecodedAudioCache(
+            settings.value("audioCacheSize", defaultValue=AUDIO_CACHE_SIZE, type=int)
+            * 2**20
+        )
+        self.memory = MemoryBudget(
+            settings.value("memoryBudget", defaultValue=MEMORY_BUDGET, type=int) * 2**20
+        )
+        self.memory.add_cache("decoded audio", self.audio_cache)
+        QApplication.instance().aboutToQuit.connect(self.memory.close)
+
+        self.inspector_window = InspectorWindow(self.data, memory=self.memory)
 
         # Menu
         self.create_menus()
@@ -73,9 +171,15 @@ class MainWindow(QMainWindow):
             spectrogram_parameter=self.spectrogram_parameter,
             calls=self.orcai_parameter["calls"],
             colormap_name=self.colormap_name,
+            threadpool=self.threadpool,
         )
 
         splitter.addWidget(self.spectrogram_widget)
+        self.diagnostics_hud = DiagnosticsHud(self.spectrogram_widget)
+        self.memory.add_cache("spectrogram tiles", self.spectrogram_widget.tile_cache)
+        self.set_diagnostics(
+            QSettings().value("diagnostics", defaultValue=False, type=bool)
+        )
 
         # Create bottom control widget
         self.curate_widget = CurateWidget(self)
@@ -84,6 +188,10 @@ class MainWindow(QMainWindow):
         self.curate_widget.label_updated.connect(
             self.spectrogram_widget.update_prediction_label
         )
+        self.curate_widget.upcoming.connect(self.spectrogram_widget.prefetch_labels)
+        self.curate_widget.similar_available.connect(
+            self.find_similar_action.setEnabled
+        )
 
         self.spectrogram_widget.clicked_label.connect(
             self.curate_widget.go_to_label_by_index
@@ -95,6 +203,22 @@ class MainWindow(QMainWindow):
         # Set initial splitter sizes (70% for plot, 30% for bottom)
         splitter.setSizes([750, 250])
 
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start(self.autosave_interval * 1000)
+
+        self.recording_tail = None
+        self.tail_processor = None
+        self.tail_timer = QTimer(self)
+        self.tail_timer.timeout.connect(self.poll_recording)
+
+        self.playlist = None
+        self.playlist_channel = 1
+
+        self.use_inference_backend(
+            settings.value("inferenceBackend", defaultValue=DEFAULT_BACKEND, type=str)
+        )
+
     def create_menus(self):
         self.menu = self.menuBar()
         # File menu
@@ -106,8 +230,59 @@ class MainWindow(QMainWindow):
         self.file_menu.addAction(self.open_action)
 
         self.recent_files_menu = self.file_menu.addMenu("Open recent")
+        self.recent_files_menu.setToolTipsVisible(True)
         self.update_open_recent_menu()
 
+        self.cancel_loading_action = QAction("Cancel Loading", self)
+        self.cancel_loading_action.setShortcut(QKeySequence("Esc"))
+        self.cancel_loading_action.setEnabled(False)
+        self.cancel_loading_action.triggered.connect(self.cancel_loading)
+        self.file_menu.addAction(self.cancel_loading_action)
+
+        self.browse_projects_action = QAction("Browse Projects...", self)
+        self.browse_projects_action.triggered.connect(self.show_project_browser)
+        self.file_menu.addAction(self.browse_projects_action)
+
+        self.playlist_menu = self.file_menu.addMenu("Playlist")
+        self.open_playlist_folder_action = QAction("Open Folder...", self)
+        self.open_playlist_folder_action.triggered.connect(self.open_playlist_folder)
+        self.playlist_menu.addAction(self.open_playlist_folder_action)
+        self.open_playlist_files_action = QAction("Open Files...", self)
+        self.open_playlist_files_action.triggered.connect(self.open_playlist_files)
+        self.playlist_menu.addAction(self.open_playlist_files_action)
+        self.playlist_menu.addSeparator()
+        self.next_recording_action = QAction("Next Recording", self)
+        self.next_recording_action.setShortcut(QKeySequence("Ctrl+PgDown"))
+        self.next_recording_action.triggered.connect(lambda: self.step_playlist(1))
+        self.playlist_menu.addAction(self.next_recording_action)
+        self.previous_recording_action = QAction("Previous Recording", self)
+        self.previous_recording_action.setShortcut(QKeySequence("Ctrl+PgUp"))
+        self.previous_recording_action.triggered.connect(lambda: self.step_playlist(-1))
+        self.playlist_menu.addAction(self.previous_recording_action)
+        self.playlist_menu.addSeparator()
+        self.prefetch_depth_action = QAction("Prefetch Depth...", self)
+        self.prefetch_depth_action.triggered.connect(self.set_prefetch_depth)
+        self.playlist_menu.addAction(self.prefetch_depth_action)
+
+        self.switch_channel_action = QAction("Switch Channel...", self)
+        self.switch_channel_action.triggered.connect(self.switch_channel)
+        self.file_menu.addAction(self.switch_channel_action)
+
+        self.process_all_channels_action = QAction("Process All Channels", self)
+        self.process_all_channels_action.triggered.connect(self.process_all_channels)
+        self.file_menu.addAction(self.process_all_channels_action)
+
+        self.channel_menu = self.file_menu.addMenu("Channel")
+        self.update_channel_menu()
+
+        self.follow_action = QAction("Follow Recording", self)
+        self.follow_action.setCheckable(True)
+        self.follow_action.setToolTip(
+            "Process audio appended to the recording while it is being recorded"
+        )
+        self.follow_action.triggered.connect(self.follow_recording)
+        self.file_menu.addAction(self.follow_action)
+
         self.file_menu.addSeparator()
 
         self.window_close_action = QAction("Close Window", self)
@@ -125,6 +300,26 @@ class MainWindow(QMainWindow):
         self.save_project_as_action.triggered.connect(self.save_project_as)
         self.file_menu.addAction(self.save_project_as_action)
 
+        self.storage_menu = self.file_menu.addMenu("Project Storage")
+        self.storage_menu.addSection("Spectrogram")
+        self.spectrogram_storage_group = QActionGroup(self)
+        for storage in SPECTROGRAM_STORAGE:
+            action = QAction(storage, self.spectrogram_storage_group, checkable=True)
+            action.triggered.connect(
+                lambda _, storage=storage: self.set_storage(spectrogram=storage)
+            )
+            action.setChecked(storage == self.spectrogram_storage)
+            self.storage_menu.addAction(action)
+        self.storage_menu.addSection("Preprocessed Spectrogram")
+        self.pp_spectrogram_storage_group = QActionGroup(self)
+        for storage in PP_SPECTROGRAM_STORAGE:
+            action = QAction(storage, self.pp_spectrogram_storage_group, checkable=True)
+            action.triggered.connect(
+                lambda _, storage=storage: self.set_storage(pp_spectrogram=storage)
+            )
+            action.setChecked(storage == self.pp_spectrogram_storage)
+            self.storage_menu.addAction(action)
+
         self.file_menu.addSeparator()
 
         self.export_labels_action = QAction("Export Labels...", self)
@@ -136,6 +331,59 @@ class MainWindow(QMainWindow):
         self.exit_action.triggered.connect(self.close)
         self.file_menu.addAction(self.exit_action)
 
+        # Edit menu
+        self.edit_menu = self.menu.addMenu("Edit")
+
+        self.undo_action = QAction("Undo", self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(self.undo)
+        self.edit_menu.addAction(self.undo_action)
+
+        self.redo_action = QAction("Redo", self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(self.redo)
+        self.edit_menu.addAction(self.redo_action)
+
+        # Curate menu
+        self.curate_menu = self.menu.addMenu("Curate")
+
+        self.accept_confident_action = QAction("Accept Confident Labels...", self)
+        self.accept_confident_action.triggered.connect(self.accept_confident_labels)
+        self.curate_menu.addAction(self.accept_confident_action)
+
+        self.reject_short_action = QAction("Reject Short Labels...", self)
+        self.reject_short_action.triggered.connect(self.reject_short_labels)
+        self.curate_menu.addAction(self.reject_short_action)
+
+        self.accept_visible_action = QAction("Accept Visible Labels", self)
+        self.accept_visible_action.setShortcut(QKeySequence("Ctrl+Shift+A"))
+        self.accept_visible_action.triggered.connect(self.accept_visible_labels)
+        self.curate_menu.addAction(self.accept_visible_action)
+
+        self.curate_menu.addSeparator()
+
+        self.find_similar_action = QAction("Find Similar Labels", self)
+        self.find_similar_action.setShortcut(QKeySequence.StandardKey.Find)
+        self.find_similar_action.triggered.connect(self.find_similar_labels)
+        # enabled once the label embeddings are computed
+        self.find_similar_action.setEnabled(False)
+        self.curate_menu.addAction(self.find_similar_action)
+
+        self.curate_menu.addSeparator()
+
+        self.refine_all_action = QAction("Refine Label Boundaries", self)
+        self.refine_all_action.triggered.connect(self.refine_all_labels)
+        self.curate_menu.addAction(self.refine_all_action)
+
+        self.refine_current_action = QAction("Refine Current Label", self)
+        self.refine_current_action.setShortcut(QKeySequence("Ctrl+R"))
+        self.refine_current_action.triggered.connect(self.refine_current_label)
+        self.curate_menu.addAction(self.refine_current_action)
+
+        self.refine_band_action = QAction("Refine Band...", self)
+        self.refine_band_action.triggered.connect(self.set_refine_bands)
+        self.curate_menu.addAction(self.refine_band_action)
+
         # View Menu
         self.spectrogram_menu = self.menu.addMenu("Spectrogram")
         self.colormap_menu = self.spectrogram_menu.addMenu("Colormap")
@@ -151,6 +399,9 @@ class MainWindow(QMainWindow):
             if colormap == self.colormap_name:
                 action.setChecked(True)
 
+        self.prediction_tracks_menu = self.spectrogram_menu.addMenu("Prediction Tracks")
+        self.prediction_tracks_menu.setEnabled(False)
+
         # Tools menu
         self.tools_menu = self.menu.addMenu("Tools")
         self.show_inspector_action = QAction("Show Inspector", self)
@@ -158,6 +409,49 @@ class MainWindow(QMainWindow):
         self.show_inspector_action.triggered.connect(self.toggle_inspector_window)
         self.tools_menu.addAction(self.show_inspector_action)
 
+        self.record_timings_action = QAction("Record Stage Timings...", self)
+        self.record_timings_action.setCheckable(True)
+        self.record_timings_action.setChecked(recorder.path is not None)
+        self.record_timings_action.triggered.connect(self.record_timings)
+        self.tools_menu.addAction(self.record_timings_action)
+
+        self.diagnostics_action = QAction("Diagnostics Mode", self)
+        self.diagnostics_action.setCheckable(True)
+        self.diagnostics_action.triggered.connect(self.set_diagnostics)
+        self.tools_menu.addAction(self.diagnostics_action)
+
+        self.memory_budget_action = QAction("Memory Budget...", self)
+        self.memory_budget_action.triggered.connect(self.set_memory_budget)
+        self.tools_menu.addAction(self.memory_budget_action)
+
+        self.cpu_threads_action = QAction("CPU Threads...", self)
+        self.cpu_threads_action.triggered.connect(self.set_cpu_threads)
+        self.tools_menu.addAction(self.cpu_threads_action)
+
+        self.inference_backend_menu = self.tools_menu.addMenu("Inference Backend")
+        self.inference_backend_menu.setToolTipsVisible(True)
+        self.inference_backend_group = QActionGroup(self)
+        self.inference_backend_actions = {}
+        for backend in BACKENDS:
+            action = QAction(backend, self.inference_backend_group, checkable=True)
+            action.triggered.connect(
+                lambda _, backend=backend: self.set_inference_backend(backend)
+            )
+            action.setChecked(backend == DEFAULT_BACKEND)
+            if not backend_available(backend):
+                action.setEnabled(False)
+                action.setToolTip(f"Not installed: {backend_requirement(backend)}")
+            self.inference_backend_menu.addAction(action)
+            self.inference_backend_actions[backend] = action
+
+        self.run_models_action = QAction("Run Models...", self)
+        self.run_models_action.triggered.connect(self.show_run_models_dialog)
+        self.tools_menu.addAction(self.run_models_action)
+
+        self.merge_projects_action = QAction("Merge Projects...", self)
+        self.merge_projects_action.triggered.connect(self.merge_projects)
+        self.tools_menu.addAction(self.merge_projects_action)
+
         # Help menu
         self.help_menu = self.menu.addMenu("Help")
         self.about_action = QAction("About orcAI", self)
@@ -171,6 +465,18 @@ class MainWindow(QMainWindow):
         settings.setValue("colormap", self.colormap_name)
         self.spectrogram_widget.set_colormap(colormap_name=self.colormap_name)
 
+    def set_storage(
+        self, spectrogram: str | None = None, pp_spectrogram: str | None = None
+    ):
+        """Set how spectrograms are stored in project files."""
+        settings = QSettings()
+        if spectrogram is not None:
+            self.spectrogram_storage = spectrogram
+            settings.setValue("spectrogramStorage", spectrogram)
+        if pp_spectrogram is not None:
+            self.pp_spectrogram_storage = pp_spectrogram
+            settings.setValue("ppSpectrogramStorage", pp_spectrogram)
+
     def show_about_window(self):
         """Show the about window."""
         self.about_window = AboutWindow()
@@ -195,23 +501,119 @@ class MainWindow(QMainWindow):
             self.status.showMessage(f"File {recording_path} does not exist.")
             self.remove_recent_file(recording_path)
             return
+        self.stop_project_loader()
         self.open_action.setEnabled(False)
         self.recent_files_menu.setEnabled(False)
+        self.remember_channel()
+        if recording_path.suffix == ".orcai" or recording_path != self.recording_path:
+            self.channel_results = {}
+            self.n_channels = None
         if recording_path.suffix == ".orcai":
-            results = OrcaiData.load_from_hdf5_file(recording_path)
-            self.project_path = recording_path
-            self.status.showMessage(f"Project loaded from {recording_path.name}")
-            self.spectrogram_processed(results)
+            self.data = None
+            self.project_path = None
+            loader = ProjectFileLoader(recording_path)
+            loader.signals.preview.connect(
+                lambda preview, loader=loader: self.project_preview_loaded(
+                    preview, loader
+                )
+            )
+            loader.signals.result.connect(
+                lambda data, path=recording_path, loader=loader: self.project_loaded(
+                    data, path, loader
+                )
+            )
+            loader.signals.error.connect(
+                lambda error, loader=loader: self.project_load_error(error, loader)
+            )
+            loader.signals.cancelled.connect(
+                lambda loader=loader: self.project_load_cancelled(loader)
+            )
+            loader.signals.progress.connect(self.update_progress)
+            self.project_loader = loader
+            self.cancel_loading_action.setEnabled(True)
+            scheduler.start(loader, "open")
         if recording_path.suffix == ".wav":
             self.project_path = None
-            file_loader = AudioFileLoader(
-                recording_path=recording_path,
-                sampling_rate=self.spectrogram_parameter["sampling_rate"],
+            self.load_audio(recording_path)
+
+    def load_audio(self, recording_path: Path):
+        """Decode a recording, or take it from the cache, and pick a channel."""
+        sampling_rate = self.spectrogram_parameter["sampling_rate"]
+        wav_file = self.audio_cache.get(recording_path, sampling_rate)
+        if wav_file is not None:
+            self.audio_file_loaded(
+                {
+                    "recording_path": recording_path,
+                    "wav_file": wav_file,
+                    "n_channels": channel_count(wav_file),
+                }
             )
-            file_loader.signals.result.connect(self.audio_file_loaded)
-            file_loader.signals.error.connect(self.audio_file_load_error)
-            file_loader.signals.progress.connect(self.update_progress)
-            self.threadpool.start(file_loader)
+            return
+        file_loader = AudioFileLoader(
+            recording_path=recording_path,
+            sampling_rate=sampling_rate,
+        )
+        file_loader.signals.result.connect(self.audio_file_loaded)
+        file_loader.signals.error.connect(self.audio_file_load_error)
+        file_loader.signals.progress.connect(self.update_progress)
+        scheduler.start(file_loader, "open")
+
+    def cancel_loading(self):
+        """Cancel loading a project."""
+        if self.project_loader is not None:
+            self.project_loader.cancel()
+
+    def stop_project_loader(self):
+        """Cancel a project still loading, its results are ignored."""
+        if self.project_loader is not None:
+            self.project_loader.cancel()
+            self.project_loader = None
+            self.cancel_loading_action.setEnabled(False)
+
+    def project_preview_loaded(self, preview, loader: ProjectFileLoader):
+        """Show labels and a spectrogram overview while the project loads."""
+        if loader is not self.project_loader:
+            return
+        self.curate_widget.update_data(None)
+        self.spectrogram_widget.update_data(preview, colormap_name=self.colormap_name)
+        self.setWindowTitle(
+            f"orcAI - {preview.recording_path.name}, Channel {preview.channel}"
+        )
+
+    def project_loaded(self, results, project_path: Path, loader: ProjectFileLoader):
+        if loader is not self.project_loader:
+            return
+        self.project_path = project_path
+        self.project_loader = None
+        self.cancel_loading_action.setEnabled(False)
+        self.spectrogram_processed(results)
+        if results.journal.recovered:
+            self.status.showMessage(
+                f"Project loaded from {self.project_path.name}, "
+                f"recovered {results.journal.recovered} unsaved changes"
+            )
+        else:
+            self.status.showMessage(f"Project loaded from {self.project_path.name}")
+
+    def project_load_error(self, error, loader: ProjectFileLoader):
+        """Handle errors during project loading"""
+        if loader is not self.project_loader:
+            return
+        _, error_value = error
+        self.status.showMessage(f"Error loading project: {error_value}")
+        self.project_loader = None
+        self.cancel_loading_action.setEnabled(False)
+        self.open_action.setEnabled(True)
+        self.recent_files_menu.setEnabled(True)
+
+    def project_load_cancelled(self, loader: ProjectFileLoader):
+        if loader is not self.project_loader:
+            return
+        self.status.showMessage("Loading cancelled")
+        self.project_loader = None
+        self.cancel_loading_action.setEnabled(False)
+        self.open_action.setEnabled(True)
+        self.recent_files_menu.setEnabled(True)
 
     @pyqtSlot(str)
     def update_progress(self, message):
@@ -230,7 +632,11 @@ class MainWindow(QMainWindow):
     def audio_file_loaded(self, results):
         wav_file = results["wav_file"]
         n_channels = results["n_channels"]
-        self.recording_path = results["recording_path"]
+        recording_path = results["recording_path"]
+        self.audio_cache.put(
+            recording_path, self.spectrogram_parameter["sampling_rate"], wav_file
+        )
+        self.n_channels = n_channels
 
         if n_channels > 1:
             channel_select_dialog = ChannelSelectDialog(n_channels)
@@ -238,26 +644,499 @@ class MainWindow(QMainWindow):
                 channel = channel_select_dialog.channel_select_box.currentIndex() + 1
             else:
                 self.status.showMessage("No channel selected. Operation cancelled.")
+                self.open_action.setEnabled(True)
+                self.recent_files_menu.setEnabled(True)
                 return
         else:
             channel = 1
 
+        self.show_channel(recording_path, wav_file, channel)
+
+    def show_channel(self, recording_path: Path, wav_file: np.ndarray, channel: int):
+        """Show a channel, processing it if it has not been processed yet."""
+        self.remember_channel()
+        self.recording_path = recording_path
+        self.requested_channel = channel
+        if channel in self.channel_results:
+            self.data = None
+            data, self.project_path = self.channel_results[channel]
+            self.spectrogram_processed(data)
+            return
+        if (recording_path, channel) in self.channel_processors or (
+            self.all_channels_processor is not None
+            and channel not in self.all_channels_processor.skip_channels
+        ):
+            self.status.showMessage(f"Channel {channel} is still being processed")
+            return
+
         spectrogram_processor = SpectrogramProcessor(
             wav_file=wav_file,
-            recording_path=self.recording_path,
+            recording_path=recording_path,
             channel=channel,
             orcai_parameter=self.orcai_parameter,
             model=self.model,
             shape=self.shape,
         )
-        spectrogram_processor.signals.result.connect(self.spectrogram_processed)
+        spectrogram_processor.signals.result.connect(self.channel_processed)
         spectrogram_processor.signals.progress.connect(self.update_progress)
-        spectrogram_processor.signals.error.connect(self.spectrogram_processing_error)
-        self.threadpool.start(spectrogram_processor)
+        spectrogram_processor.signals.error.connect(
+            lambda error, key=(recording_path, channel): (
+                self.spectrogram_processing_error(error, key)
+            )
+        )
+        self.channel_processors[(recording_path, channel)] = spectrogram_processor
+        scheduler.start(spectrogram_processor, "open")
+
+    def remember_channel(self):
+        """Keep the shown channel, with its curation, for switching back."""
+        if self.data is not None and self.data.recording_path == self.recording_path:
+            self.channel_results[self.data.channel] = (self.data, self.project_path)
+
+    @pyqtSlot(OrcaiData)
+    def channel_processed(self, results):
+        """Cache a processed channel and show it if it is the one requested."""
+        self.channel_processors.pop((results.recording_path, results.channel), None)
+        if results.recording_path != self.recording_path:
+            return
+        self.channel_results[results.channel] = (results, None)
+        if results.channel == self.requested_channel:
+            self.project_path = None
+            self.spectrogram_processed(results)
+        else:
+            self.status.showMessage(f"Channel {results.channel} processed")
+            self.update_channel_menu()
+            self.manage_memory()
+
+    def process_all_channels(self):
+        """Process all channels of the current recording in worker processes."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        if self.all_channels_processor is not None:
+            self.status.showMessage("Channels are already being processed")
+            return
+        recording_path = self.data.recording_path
+        if not recording_path.exists():
+            self.status.showMessage(f"Recording {recording_path} does not exist.")
+            return
+        self.remember_channel()
+        self.recording_path = recording_path
+        self.all_channels_processor = AllChannelsProcessor(
+            wav_file=self.audio_cache.get(
+                recording_path, self.spectrogram_parameter["sampling_rate"]
+            ),
+            recording_path=recording_path,
+            orcai_parameter=self.orcai_parameter,
+            model_dir=Path(str(self.model_dir)),
+            skip_channels=set(self.channel_results)
+            | {channel for path, channel in self.channel_processors},
+            backend=self.inference_backend,
+        )
+        signals = self.all_channels_processor.signals
+        signals.decoded.connect(self.all_channels_decoded)
+        signals.result.connect(self.channel_processed)
+        signals.progress.connect(self.update_progress)
+        signals.error.connect(self.spectrogram_processing_error)
+        signals.finished.connect(self.all_channels_processed)
+        self.process_all_channels_action.setEnabled(False)
+        scheduler.start(self.all_channels_processor, "channels")
+
+    @pyqtSlot(object)
+    def all_channels_decoded(self, wav_file):
+        recording_path = self.all_channels_processor.recording_path
+        self.audio_cache.put(
+            recording_path, self.spectrogram_parameter["sampling_rate"], wav_file
+        )
+        if recording_path == self.recording_path:
+            self.n_channels = channel_count(wav_file)
+            self.update_channel_menu()
+        self.manage_memory()
+
+    @pyqtSlot()
+    def all_channels_processed(self):
+        self.all_channels_processor = None
+        self.process_all_channels_action.setEnabled(True)
+        self.update_channel_menu()
+
+    def follow_recording(self, checked: bool):
+        """Start or stop processing audio appended to the current recording."""
+        if not checked:
+            self.tail_timer.stop()
+            # process the rest of the recording, which was held back
+            self.poll_recording()
+            return
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            self.follow_action.setChecked(False)
+            return
+        if (
+            self.data.recording_path.suffix.lower() != ".wav"
+            or not self.data.recording_path.exists()
+        ):
+            self.status.showMessage(
+                f"Can only follow WAV recordings, {self.data.recording_path} is not one"
+            )
+            self.follow_action.setChecked(False)
+            return
+        if (
+            self.data.spectrogram_scale is not None
+            or not self.spectrogram_widget.has_full_spectrogram()
+        ):
+            self.status.showMessage(
+                "Following needs the full spectrogram, open the recording itself"
+            )
+            self.follow_action.setChecked(False)
+            return
+        if self.data.pp_spectrogram is None and self.data.spectrogram_parameter is None:
+            self.status.showMessage(
+                "Following needs the preprocessed spectrogram, which this project "
+                "neither stores nor can regenerate, open the recording itself"
+            )
+            self.follow_action.setChecked(False)
+            return
+        if self.recording_tail is None or self.recording_tail.data is not self.data:
+            self.recording_tail = RecordingTail(
+                self.data, self.orcai_parameter, self.model, self.shape
+            )
+        interval = QSettings().value(
+            "followInterval", defaultValue=POLL_INTERVAL, type=int
+        )
+        self.tail_timer.start(interval * 1000)
+        self.poll_recording()
+
+    def stop_following(self):
+        """Stop following without processing the rest of the recording."""
+        self.tail_timer.stop()
+        self.follow_action.setChecked(False)
+        self.recording_tail = None
+
+    def poll_recording(self):
+        """Check the followed recording for new audio in the background."""
+        if self.recording_tail is None or self.tail_processor is not None:
+            return
+        self.tail_processor = TailProcessor(
+            self.recording_tail, final=not self.follow_action.isChecked()
+        )
+        self.tail_processor.signals.result.connect(self.recording_extended)
+        self.tail_processor.signals.progress.connect(self.update_progress)
+        self.tail_processor.signals.error.connect(self.follow_error)
+        self.tail_processor.signals.finished.connect(self.recording_polled)
+        scheduler.start(self.tail_processor, "follow")
+
+    @pyqtSlot(object)
+    def recording_extended(self, update):
+        """Append the newly processed part of the followed recording."""
+        if self.recording_tail is None or self.recording_tail.data is not self.data:
+            return
+        n_labels = len(self.data.predicted_labels)
+        self.recording_tail.extend(update)
+        self.spectrogram_widget.extend_plots(update.first_step, n_labels)
+        self.curate_widget.refresh()
+        self.status.showMessage(
+            f"Processed {len(update.times) * self.data.delta_t():.0f} s more of "
+            f"{self.data.recording_path.name}, "
+            f"{len(update.predicted_labels)} new labels"
+        )
+        self.manage_memory()
+
+    @pyqtSlot()
+    def recording_polled(self):
+        final = self.tail_processor.final
+        self.tail_processor = None
+        if final:
+            self.recording_tail = None
+        elif self.recording_tail is not None and not self.follow_action.isChecked():
+            # stopped following while this update ran
+            self.poll_recording()
+
+    @pyqtSlot(tuple)
+    def follow_error(self, error):
+        _, error_value = error
+        self.stop_following()
+        self.status.showMessage(f"Stopped following the recording: {error_value}")
+
+    def update_channel_menu(self):
+        """List the channels of the current recording for switching."""
+        self.channel_menu.clear()
+        if self.data is None:
+            self.channel_menu.setEnabled(False)
+            return
+        if self.n_channels is not None:
+            channels = range(1, self.n_channels + 1)
+        else:
+            channels = sorted(set(self.channel_results) | {self.data.channel})
+        group = QActionGroup(self.channel_menu)
+        for channel in channels:
+            text = f"Channel {channel}"
+            if channel not in self.channel_results and channel != self.data.channel:
+                text += " (not processed)"
+            action = QAction(text, group, checkable=True)
+            action.setChecked(channel == self.data.channel)
+            action.triggered.connect(
+                lambda _, channel=channel: self.select_channel(channel)
+            )
+            self.channel_menu.addAction(action)
+        self.channel_menu.setEnabled(True)
+
+    def select_channel(self, channel: int):
+        """Show a channel of the current recording, processing it if needed."""
+        if self.data is None or channel == self.data.channel:
+            return
+        wav_file = self.audio_cache.get(
+            self.data.recording_path, self.spectrogram_parameter["sampling_rate"]
+        )
+        if channel in self.channel_results or wav_file is not None:
+            self.show_channel(self.data.recording_path, wav_file, channel)
+        else:
+            self.switch_channel()
+
+    def switch_channel(self):
+        """Show another channel of the current recording."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        if not self.data.recording_path.exists():
+            self.status.showMessage(
+                f"Recording {self.data.recording_path} does not exist."
+            )
+            return
+        self.remember_channel()
+        self.recording_path = self.data.recording_path
+        self.open_action.setEnabled(False)
+        self.recent_files_menu.setEnabled(False)
+        self.load_audio(self.data.recording_path)
+
+    def open_playlist_folder(self):
+        """Curate the recordings and projects of a folder in sequence."""
+        settings = QSettings()
+        directory = QFileDialog.getExistingDirectory(
+            self,
+            "Open Folder as Playlist",
+            settings.value("playlistDirectory", defaultValue="", type=str),
+        )
+        if not directory:
+            return
+        settings.setValue("playlistDirectory", directory)
+        self.open_playlist(playlist_from_folder(Path(directory)))
+
+    def open_playlist_files(self):
+        """Curate the chosen recordings and projects in sequence."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self,
+            "Open Files as Playlist",
+            QSettings().value("playlistDirectory", defaultValue="", type=str),
+            "WAV Files or OrcAI Project Files (*.wav *.hdf5.orcai)",
+        )
+        if file_paths:
+            self.open_playlist([Path(file_path) for file_path in file_paths])
+
+    def open_playlist(self, paths: list[Path]):
+        if not paths:
+            self.status.showMessage("No recordings or projects for a playlist")
+            return
+        depth = QSettings().value(
+            "playlistPrefetchDepth", defaultValue=PREFETCH_DEPTH, type=int
+        )
+        self.playlist = Playlist(paths, depth=depth)
+        self.memory.add_cache("playlist", self.playlist)
+        self.show_playlist_entry(0)
+
+    def step_playlist(self, step: int):
+        if self.playlist is None:
+            self.status.showMessage("No playlist open")
+            return
+        index = self.playlist.index + step
+        if not 0 <= index < len(self.playlist):
+            self.status.showMessage("No more recordings in the playlist")
+            return
+        self.show_playlist_entry(index)
+
+    def show_playlist_entry(self, index: int):
+        """Show an entry of the playlist, at once if it is prepared."""
+        playlist = self.playlist
+        if not self.leave_playlist_entry():
+            return
+        data = playlist.take(index)
+        playlist.move_to(index)
+        path = playlist.paths[index]
+        if data is not None:
+            self.show_prepared_entry(index, data)
+        elif index in playlist.loading:
+            playlist.waiting = index
+            self.status.showMessage(
+                f"Playlist {index + 1}/{len(playlist)}: preparing {path.name}..."
+            )
+        else:
+            self.open_file(path)
+        self.prefetch_playlist()
+
+    def show_prepared_entry(self, index: int, data: OrcaiData):
+        path = self.playlist.paths[index]
+        self.stop_project_loader()
+        self.channel_results = {}
+        self.n_channels = None
+        self.project_path = path if path.suffix == ".orcai" else None
+        self.data = None
+        self.spectrogram_processed(data)
+        self.status.showMessage(
+            f"Playlist {index + 1}/{len(self.playlist)}: {path.name}"
+        )
+
+    def leave_playlist_entry(self) -> bool:
+        """Save the curation of the shown entry before moving on.
+
+        A recording is saved to the project named as the watch daemon would,
+        after asking whether to overwrite it if it exists. Returns whether
+        the entry may be left, i.e. it is unchanged or was saved.
+        """
+        playlist = self.playlist
+        playlist.waiting = None
+        if self.data is None or not 0 <= playlist.index < len(playlist):
+            return True
+        self.playlist_channel = self.data.channel
+        if not self.data.journal.is_dirty():
+            return True
+        if self.project_path is not None:
+            saved = self.save_project()
+        else:
+            project_path = self.default_project_path()
+            if project_path.exists():
+                answer = QMessageBox.question(
+                    self,
+                    "Save Project",
+                    f"{project_path.name} exists already. Overwrite it?",
+                )
+                if answer != QMessageBox.StandardButton.Yes:
+                    project_path = None
+            if project_path is None:
+                saved = self.save_project_as()
+                if not saved and self.project_path is None:
+                    self.status.showMessage(
+                        "Project not saved, staying on the playlist entry"
+                    )
+            else:
+                self.project_path = project_path
+                saved = self.save_project()
+                if not saved:
+                    self.project_path = None
+        if not saved:
+            return False
+        playlist.paths[playlist.index] = self.project_path
+        return True
+
+    def default_project_path(self) -> Path:
+        """Project of the shown channel, next to its recording."""
+        recording_path = self.data.recording_path
+        n_channels = self.n_channels
+        if n_channels is None:
+            try:
+                n_channels = wav_layout(recording_path).n_channels
+            except (OSError, ValueError, struct.error):
+                # a name with the channel cannot clash with another channel
+                n_channels = 0
+        return default_project_path(recording_path, self.data.channel, n_channels)
+
+    def prefetch_playlist(self):
+        """Prepare the next entry of the playlist if the memory budget allows."""
+        playlist = self.playlist
+        if playlist is None:
+            return
+        index = playlist.next_to_prepare()
+        if index is None:
+            return
+        estimate = playlist.entry_bytes()
+        if self.data is not None:
+            estimate = max(estimate, sum(resident_bytes(self.data).values()))
+        if self.memory.total() + estimate > self.memory.budget:
+            return
+        loader = PlaylistEntryLoader(
+            playlist.paths[index],
+            self.playlist_channel,
+            self.orcai_parameter,
+            self.model,
+            self.shape,
+        )
+        loader.signals.result.connect(
+            lambda data, playlist=playlist, index=index: self.playlist_entry_prepared(
+                playlist, index, data
+            )
+        )
+        loader.signals.error.connect(
+            lambda error, playlist=playlist, index=index: self.playlist_entry_error(
+                playlist, index, error
+            )
+        )
+        loader.signals.progress.connect(self.update_progress)
+        playlist.loading[index] = loader
+        scheduler.start(loader, "prefetch")
+
+    def playlist_entry_prepared(self, playlist: Playlist, index: int, data):
+        playlist.loading.pop(index, None)
+        if playlist is not self.playlist:
+            return
+        if index == playlist.waiting:
+            playlist.waiting = None
+            self.show_prepared_entry(index, data)
+        elif index in playlist.upcoming():
+            playlist.ready[index] = data
+            self.manage_memory()
+        self.prefetch_playlist()
+
+    def playlist_entry_error(self, playlist: Playlist, index: int, error):
+        _, error_value = error
+        playlist.loading.pop(index, None)
+        playlist.failed.add(index)
+        if playlist is not self.playlist:
+            return
+        self.status.showMessage(
+            f"Error preparing {playlist.paths[index].name}: {error_value}"
+        )
+        if index == playlist.waiting:
+            playlist.waiting = None
+            self.open_file(playlist.paths[index])
+        self.prefetch_playlist()
+
+    def set_prefetch_depth(self):
+        """Ask how many playlist entries to prepare ahead."""
+        depth, ok = QInputDialog.getInt(
+            self,
+            "Prefetch Depth",
+            "Recordings prepared ahead in a playlist:",
+            QSettings().value(
+                "playlistPrefetchDepth", defaultValue=PREFETCH_DEPTH, type=int
+            ),
+            0,
+            16,
+        )
+        if not ok:
+            return
+        QSettings().setValue("playlistPrefetchDepth", depth)
+        if self.playlist is not None:
+            self.playlist.depth = depth
+            self.playlist.move_to(self.playlist.index)
+            self.prefetch_playlist()
+
+    def show_project_browser(self):
+        """Show a browser listing the projects in a folder."""
+        settings = QSettings()
+        directory = settings.value("projectBrowserDirectory", defaultValue=None)
+        self.project_browser = ProjectBrowserDialog(directory=directory, parent=self)
+        self.project_browser.project_selected.connect(self.inspector_window.show_info)
+        self.project_browser.project_opened.connect(self.open_file)
+        self.project_browser.exec()
+        if self.project_browser.directory_label.text():
+            settings.setValue(
+                "projectBrowserDirectory", self.project_browser.directory_label.text()
+            )
 
     @pyqtSlot(dict)
     def spectrogram_processed(self, results):
+        if self.recording_tail is not None and self.recording_tail.data is not results:
+            self.stop_following()
         self.data = results
+        self.recording_path = self.data.recording_path
+        if self.journal_changed not in self.data.journal.listeners:
+            self.data.journal.listeners.append(self.journal_changed)
         self.curate_widget.update_data(self.data)
         self.spectrogram_widget.update_data(
             self.data,
@@ -274,15 +1153,19 @@ class MainWindow(QMainWindow):
         )
         self.open_action.setEnabled(True)
         self.recent_files_menu.setEnabled(True)
+        self.update_channel_menu()
+        self.update_prediction_tracks_menu()
+        self.manage_memory()
         if self.project_path is None:
             self.update_recent_files(self.data.recording_path)
         else:
             self.update_recent_files(self.project_path)
 
     @pyqtSlot(tuple)
-    def spectrogram_processing_error(self, error):
+    def spectrogram_processing_error(self, error, key: tuple | None = None):
         """Handle errors during spectrogram processing"""
         _, error_value = error
+        self.channel_processors.pop(key, None)
         self.status.showMessage(f"Error processing spectrogram: {error_value}")
         self.open_action.setEnabled(True)
         self.recent_files_menu.setEnabled(True)
@@ -290,15 +1173,35 @@ class MainWindow(QMainWindow):
     def update_open_recent_menu(self):
         """Update the recent files menu."""
 
+        if self.recent_prober is not None:
+            self.recent_prober.cancel()
+            self.recent_prober = None
         self.recent_files_menu.clear()
+        self.recent_actions = {}
         settings = QSettings()
         recent_files = settings.value("recentFiles", [], type=list)
         for file_path in recent_files:
             action = QAction(Path(file_path).name, self)
+            if file_path.endswith(".orcai"):
+                self.recent_actions[Path(file_path)] = action
             action.triggered.connect(
                 lambda _, path=Path(file_path): self.open_file(recording_path=path)
             )
             self.recent_files_menu.addAction(action)
+        if self.recent_actions:
+            # project summaries are read in the background, the files may
+            # be on a slow share
+            prober = ProjectProber(list(self.recent_actions))
+            prober.signals.result.connect(
+                lambda info, prober=prober: self.recent_project_probed(info, prober)
+            )
+            prober.signals.failed.connect(
+                lambda path, error, prober=prober: self.recent_project_failed(
+                    path, error, prober
+                )
+            )
+            self.recent_prober = prober
+            scheduler.start(prober, "open")
 
         self.recent_files_menu.addSeparator()
         action_clear_recents = QAction("Clear Menu", self)
@@ -310,6 +1213,23 @@ class MainWindow(QMainWindow):
             len(recent_files) > 0,
         )
 
+    def recent_project_probed(self, info, prober: ProjectProber):
+        """Show the summary of a recent project in the menu."""
+        if prober is not self.recent_prober:
+            return
+        action = self.recent_actions[info.path]
+        action.setText(f"{info.path.name} ({info.summary()})")
+        action.setToolTip(str(info.recording_path))
+
+    def recent_project_failed(self, path: Path, error: str, prober: ProjectProber):
+        """Mark a recent project that could not be read."""
+        if prober is not self.recent_prober:
+            return
+        action = self.recent_actions[path]
+        action.setText(f"{path.name} (could not be read)")
+        action.setToolTip(error)
+        self.status.showMessage(f"Could not read recent project {path.name}: {error}")
+
     def update_recent_files(self, file_path: Path = None, clear: bool = False):
         """update recent files"""
         settings = QSettings()
@@ -339,31 +1259,43 @@ class MainWindow(QMainWindow):
             settings.setValue("recentFiles", recent_files)
             self.update_open_recent_menu()
 
-    def save_project(self):
-        """Save the current project."""
+    def save_project(self) -> bool:
+        """Save the current project, returns whether it was saved."""
         if self.data is None:
             self.status.showMessage("No recording loaded")
-            return
+            return False
 
         if self.project_path is None:
-            self.save_project_as()
-            return
+            return self.save_project_as()
 
-        self.data.save_as_hdf5(self.project_path)
+        try:
+            self.data.save_as_hdf5(
+                self.project_path,
+                spectrogram_storage=self.spectrogram_storage,
+                pp_spectrogram_storage=self.pp_spectrogram_storage,
+            )
+            self.data.journal.flush(journal_path(self.project_path))
+        except OSError as e:
+            print(e)
+            self.status.showMessage(
+                f"Could not save project to {self.project_path.name}: {e}"
+            )
+            return False
         self.status.showMessage(f"Project saved to {self.project_path.name}")
         self.update_recent_files(self.project_path)
-        return
+        self.update_inspector()
+        return True
 
-    def save_project_as(self):
+    def save_project_as(self) -> bool:
         save_project_as_dialog = SaveProjectAsDialog(parent=self)
 
         if save_project_as_dialog.exec():
             selected_files = save_project_as_dialog.selectedFiles()
             if selected_files:
                 self.project_path = Path(selected_files[0])
-                self.save_project()
+                return self.save_project()
 
-        return
+        return False
 
     def export_labels(self):
         if self.data is None:
@@ -380,14 +1312,453 @@ class MainWindow(QMainWindow):
                 self.labels_path = Path(selected_files[0])
                 self.data.export_labels_as_tsv(self.labels_path)
 
+    def merge_projects(self):
+        """Merge the curated labels of several projects into a new project."""
+        merge_dialog = MergeProjectsDialog(parent=self)
+        if not merge_dialog.exec():
+            return
+        project_paths = merge_dialog.projects()
+        if len(project_paths) < 2:
+            self.status.showMessage("At least two projects are needed for a merge")
+            return
+        output_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Merged Project",
+            str(project_paths[0].with_name(f"merged_{project_paths[0].name}")),
+            "orcai project files (*.hdf5.orcai)",
+        )
+        if not output_path:
+            return
+        project_merger = ProjectMerger(
+            project_paths,
+            Path(output_path),
+            merge_dialog.rule_select_box.currentText(),
+        )
+        project_merger.signals.progress.connect(self.update_progress)
+        project_merger.signals.error.connect(self.project_merge_error)
+        project_merger.signals.result.connect(
+            lambda report, path=Path(output_path): self.projects_merged(report, path)
+        )
+        scheduler.start(project_merger, "merge")
+
+    def projects_merged(self, report, output_path: Path):
+        self.status.showMessage(f"Merged project saved to {output_path.name}")
+        answer = QMessageBox.question(
+            self,
+            "Projects Merged",
+            report.summary() + "\n\nOpen the merged project?",
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            self.open_file(output_path)
+
+    @pyqtSlot(tuple)
+    def project_merge_error(self, error):
+        _, error_value = error
+        self.status.showMessage(f"Error merging projects: {error_value}")
+
+    def set_diagnostics(self, enabled: bool):
+        """Measure event loop stalls, paints and slot times and show them."""
+        diagnostics.enable(enabled)
+        if not enabled:
+            diagnostics.clear()
+        self.diagnostics_hud.setVisible(enabled)
+        self.diagnostics_action.setChecked(enabled)
+        QSettings().setValue("diagnostics", enabled)
+
+    def record_timings(self, checked: bool):
+        """Start or stop writing pipeline stage timings to a file."""
+        settings = QSettings()
+        if not checked:
+            recorder.configure(None)
+            settings.remove("instrumentationFile")
+            self.status.showMessage("Stopped recording stage timings")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Record Stage Timings",
+            "orcaigui-timings.jsonl",
+            "JSON lines (*.jsonl);;Chrome trace (*.json)",
+        )
+        if not file_path:
+            self.record_timings_action.setChecked(False)
+            return
+        recorder.configure(Path(file_path))
+        settings.setValue("instrumentationFile", file_path)
+        self.status.showMessage(f"Recording stage timings to {Path(file_path).name}")
+
+    def manage_memory(self):
+        """Account for the open recordings and keep them within the budget."""
+        recordings = {
+            (data.recording_path, data.channel): data
+            for data, _ in self.channel_results.values()
+        }
+        current = None
+        if self.data is not None:
+            current = (self.data.recording_path, self.data.channel)
+            recordings[current] = self.data
+        self.memory.sync(recordings, current)
+        spills = []
+        actions = self.memory.enforce(current, spills)
+        if actions:
+            self.status.showMessage(f"Memory budget reached: {', '.join(actions)}")
+        if spills:
+            # written in the background, the arrays are swapped in when done
+            writer = SpillWriter(spills)
+            writer.signals.error.connect(self.spill_error)
+            writer.signals.finished.connect(
+                lambda spills=spills: self.spills_written(spills)
+            )
+            scheduler.start(writer, "spill")
+        self.update_inspector()
+
+    def spills_written(self, spills: list):
+        freed = self.memory.finish_spills(spills)
+        if freed:
+            self.status.showMessage(
+                f"Moved {freed / 2**20:.0f} MB to memory-mapped files"
+            )
+        self.update_inspector()
+
+    def spill_error(self, error):
+        _, error_value = error
+        self.status.showMessage(f"Error moving arrays to disk: {error_value}")
+
+    def set_memory_budget(self):
+        """Ask for the memory recordings and caches may use."""
+        budget, ok = QInputDialog.getInt(
+            self,
+            "Memory Budget",
+            "Memory for recordings and caches (MB):",
+            self.memory.budget // 2**20,
+            256,
+            2**20,
+            256,
+        )
+        if not ok:
+            return
+        self.memory.budget = budget * 2**20
+        QSettings().setValue("memoryBudget", budget)
+        self.manage_memory()
+
+    def set_cpu_threads(self):
+        """Ask how many CPUs processing may use, from the next start on."""
+        threads, ok = QInputDialog.getInt(
+            self,
+            "CPU Threads",
+            "CPUs used for processing (0 for all), after a restart:",
+            QSettings().value("cpuThreads", defaultValue=0, type=int),
+            0,
+            os.cpu_count() or 1,
+        )
+        if ok:
+            QSettings().setValue("cpuThreads", threads)
+
+    def set_inference_backend(self, backend: str):
+        QSettings().setValue("inferenceBackend", backend)
+        self.use_inference_backend(backend)
+
+    def use_inference_backend(self, backend: str):
+        """Run the model with a backend, exporting it in the background.
+
+        Processing continues with the current backend until the export is
+        loaded.
+        """
+        if backend not in BACKENDS or not backend_available(backend):
+            backend = DEFAULT_BACKEND
+        if BACKENDS[backend][0] is None:
+            self.inference_backend_ready(backend, self.keras_model)
+            return
+        exporter = ModelExporter(
+            self.keras_model, Path(str(self.model_dir)), self.shape, backend
+        )
+        exporter.signals.progress.connect(self.update_progress)
+        exporter.signals.result.connect(self.inference_backend_ready)
+        exporter.signals.error.connect(
+            lambda error, backend=backend: self.inference_backend_error(error, backend)
+        )
+        scheduler.start(exporter, "models")
+
+    @pyqtSlot(str, object)
+    def inference_backend_ready(self, backend: str, model):
+        self.model = model
+        self.inference_backend = backend
+        self.inference_backend_actions[backend].setChecked(True)
+        if backend != DEFAULT_BACKEND:
+            self.status.showMessage(f"Running {self.model_name} with {backend}")
+
+    def inference_backend_error(self, error, backend: str):
+        _, error_value = error
+        QSettings().setValue("inferenceBackend", self.inference_backend)
+        self.inference_backend_actions[self.inference_backend].setChecked(True)
+        self.status.showMessage(
+            f"Error exporting {self.model_name} for {backend}: {error_value}"
+        )
+
+    def update_inspector(self):
+        """Refresh the inspector if it is shown."""
+        if self.inspector_window.isVisible():
+            self.inspector_window.update_data(self.data)
+
+    def show_run_models_dialog(self):
+        """Choose models to run on the current recording for comparison."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+
+        def model_names():
+            return [
+                name for name, path in self.models.items() if path != self.model_dir
+            ]
+
+        def add_model_dir(directory):
+            self.model_dirs.append(directory)
+            QSettings().setValue("modelDirs", self.model_dirs)
+            self.models = available_models(self.model_dirs)
+            dialog.set_models(model_names())
+
+        dialog = ModelSelectDialog(model_names(), parent=self)
+        dialog.add_model_dir.connect(add_model_dir)
+        if dialog.exec():
+            self.run_models(dialog.selected_models())
+
+    def run_models(self, names: list[str]):
+        """Run models concurrently on the preprocessed spectrogram of the data.
+
+        All models read the same preprocessed spectrogram, the recording is
+        neither decoded nor transformed again. A spectrogram that was not
+        stored is regenerated once, by the first runner.
+        """
+        if self.data is None:
+            return
+        data = self.data
+        for name in names:
+            if name in self.model_runners:
+                continue
+            runner = ModelRunner(
+                name,
+                self.models[name],
+                data,
+                loaded=self.loaded_models.get(name),
+            )
+            runner.signals.loaded.connect(self.model_loaded)
+            runner.signals.result.connect(
+                lambda name, predictions, data=data: self.model_run_finished(
+                    data, name, predictions
+                )
+            )
+            runner.signals.progress.connect(self.update_progress)
+            runner.signals.error.connect(
+                lambda error, name=name: self.model_run_error(error, name)
+            )
+            self.model_runners[name] = runner
+            scheduler.start(runner, "models")
+
+    @pyqtSlot(str, tuple)
+    def model_loaded(self, name, loaded):
+        self.loaded_models[name] = loaded
+
+    def model_run_finished(self, data: OrcaiData, name: str, predictions):
+        self.model_runners.pop(name, None)
+        data.model_predictions[name] = predictions
+        if data is self.data:
+            self.update_prediction_tracks_menu()
+        self.manage_memory()
+
+    def model_run_error(self, error, name: str):
+        _, error_value = error
+        self.model_runners.pop(name, None)
+        self.status.showMessage(f"Error running model {name}: {error_value}")
+
+    def update_prediction_tracks_menu(self):
+        """List the models with predictions for the data to show or overlay."""
+        self.prediction_tracks_menu.clear()
+        names = self.spectrogram_widget.prediction_track_names()
+        self.prediction_tracks_menu.setEnabled(len(names) > 1)
+        shown = self.spectrogram_widget.prediction_tracks or names[:1]
+        for name in names:
+            action = QAction(name, self.prediction_tracks_menu, checkable=True)
+            action.setChecked(name in shown)
+            action.toggled.connect(self.prediction_tracks_changed)
+            self.prediction_tracks_menu.addAction(action)
+
+    def prediction_tracks_changed(self):
+        names = [
+            action.text()
+            for action in self.prediction_tracks_menu.actions()
+            if action.isChecked()
+        ]
+        self.spectrogram_widget.set_prediction_tracks(names)
+
+    def journal_changed(self, records):
+        self.update_inspector()
+
     def toggle_inspector_window(self):
         if self.inspector_window.isVisible():
             self.inspector_window.hide()
             self.show_inspector_action.setText("Show Inspector")
             return
+        self.inspector_window.update_data(self.data)
         self.inspector_window.show()
         self.show_inspector_action.setText("Hide Inspector")
 
+    def autosave(self):
+        """Append unsaved curation actions to the project's journal."""
+        if self.data is None or self.project_path is None:
+            return
+        if not self.data.journal.needs_flush(journal_path(self.project_path)):
+            return
+        try:
+            self.data.journal.flush(journal_path(self.project_path))
+        except OSError as e:
+            print(e)
+            self.status.showMessage(f"Autosave failed: {e}")
+
+    def undo(self):
+        """Undo the last curation action."""
+        if self.data is None or not self.data.journal.can_undo():
+            self.status.showMessage("Nothing to undo")
+            return
+        records = self.data.journal.undo()
+        self.labels_changed(records)
+        self.status.showMessage(f"Undid {ACTIONS[records['action'][0]]}")
+
+    def redo(self):
+        """Redo the last undone curation action."""
+        if self.data is None or not self.data.journal.can_redo():
+            self.status.showMessage("Nothing to redo")
+            return
+        records = self.data.journal.redo()
+        self.labels_changed(records)
+        self.status.showMessage(f"Redid {ACTIONS[records['action'][0]]}")
+
+    def labels_changed(self, records):
+        """Update the widgets after labels were changed by the journal."""
+        creates = records["action"] == ACTIONS.index("create")
+        if creates.any():
+            self.spectrogram_widget.update_label_count()
+        if not creates.all():
+            self.spectrogram_widget.update_prediction_labels(
+                records["index"][~creates], update_extent=True
+            )
+        self.curate_widget.refresh()
+
+    def accept_confident_labels(self):
+        """Accept all unchecked labels of a call above a confidence."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        dialog = BulkAcceptDialog(self.orcai_parameter["calls"], parent=self)
+        if not dialog.exec():
+            return
+        indices = select_labels(
+            self.data,
+            self.orcai_parameter["calls"],
+            call=dialog.call_select_box.currentText(),
+            min_confidence=dialog.confidence_input.value(),
+        )
+        self.bulk_mark(indices, accept=True)
+
+    def reject_short_labels(self):
+        """Reject all unchecked labels shorter than a duration."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        dialog = BulkRejectDialog(parent=self)
+        if not dialog.exec():
+            return
+        indices = select_labels(
+            self.data,
+            self.orcai_parameter["calls"],
+            max_duration=dialog.duration_input.value(),
+        )
+        self.bulk_mark(indices, accept=False)
+
+    def accept_visible_labels(self):
+        """Accept all unchecked labels in the visible region."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        indices = select_labels(
+            self.data,
+            self.orcai_parameter["calls"],
+            region=self.spectrogram_widget.navigation_region.getRegion(),
+        )
+        self.bulk_mark(indices, accept=True)
+
+    def find_similar_labels(self):
+        """Step through the labels most similar to the current one."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        self.curate_widget.find_similar()
+
+    def refine_all_labels(self):
+        """Snap the boundaries of all unchecked labels to the call energy."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        checked = self.data.predicted_labels["label_checked"].to_numpy(dtype=bool)
+        records = refine_labels(
+            self.data, np.flatnonzero(~checked), **self.refine_bands()
+        )
+        if records is None:
+            self.status.showMessage("No label boundaries changed")
+            return
+        self.labels_changed(records)
+        self.status.showMessage(f"Refined boundaries of {len(records)} labels")
+
+    def refine_bands(self) -> dict:
+        """Frequency bands to refine labels in, for all calls and per call."""
+        bands = {
+            call: tuple(band)
+            for call, band in json.loads(
+                QSettings().value("refineBands", defaultValue="{}", type=str)
+            ).items()
+        }
+        return {
+            "band": bands.pop(RefineBandDialog.ALL_CALLS, REFINE_BAND),
+            "bands": bands,
+        }
+
+    def set_refine_bands(self):
+        """Ask for the frequency band of each call to refine labels in."""
+        bands = self.refine_bands()
+        dialog = RefineBandDialog(
+            self.orcai_parameter["calls"],
+            {RefineBandDialog.ALL_CALLS: bands["band"], **bands["bands"]},
+            parent=self,
+        )
+        if dialog.exec():
+            QSettings().setValue("refineBands", json.dumps(dialog.bands))
+
+    def refine_current_label(self):
+        """Snap the boundaries of the current label to the call energy."""
+        if self.data is None:
+            self.status.showMessage("No recording loaded")
+            return
+        index = self.curate_widget.current_label
+        records = refine_labels(self.data, [index], **self.refine_bands())
+        if records is None:
+            self.status.showMessage("Label boundaries unchanged")
+            return
+        self.labels_changed(records)
+        self.spectrogram_widget.focus_on_label(index)
+        self.status.showMessage("Refined boundaries of the current label")
+
+    def bulk_mark(self, indices, accept: bool):
+        """Mark labels as correct or incorrect as one undoable action."""
+        if len(indices) == 0:
+            self.status.showMessage("No matching labels")
+            return
+        if accept:
+            records = accept_labels(self.data, indices, self.username)
+        else:
+            records = reject_labels(self.data, indices, self.username)
+        self.labels_changed(records)
+        self.status.showMessage(
+            f"{'Accepted' if accept else 'Rejected'} {len(indices)} labels"
+        )
+
     def create_new_label(self, x_pos: int):
         """Create a new label at the specified x position."""
         if self.data is None:
@@ -412,7 +1783,7 @@ class MainWindow(QMainWindow):
             extent=extent,
             label_name=label_name,
         )
-        self.spectrogram_widget.update_plots()
+        self.spectrogram_widget.update_label_count()
 
 
 def predict_gui():
@@ -0,0 +1,274 @@
+import shutil
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.orcaidata import OrcaiData
+
+MEMORY_BUDGET = 4096  # megabytes
+# arrays that can be moved to memory-mapped files, the ones needed least first
+SPILLABLE = ("pp_spectrogram", "label_embeddings", "aggregated_predictions")
+SPILLABLE_SHOWN = ("spectrogram",)
+
+
+def is_mapped(array: np.ndarray | None) -> bool:
+    """Whether an array is backed by a memory-mapped file."""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def resident_bytes(data: OrcaiData) -> dict[str, int]:
+    """Bytes of ``data.memory_usage`` that are held in RAM."""
+    usage = data.memory_usage()
+    for name in (*SPILLABLE, *SPILLABLE_SHOWN):
+        if is_mapped(getattr(data, name)):
+            usage[name] = 0
+    return usage
+
+
+def spill_array(array: np.ndarray, path: Path) -> np.memmap:
+    """Copy an array to ``path`` and map it copy-on-write.
+
+    Changes to the mapped array stay in memory, the file is not written.
+    """
+    mapped = np.lib.format.open_memmap(
+        path, mode="w+", dtype=array.dtype, shape=array.shape
+    )
+    mapped[...] = array
+    mapped.flush()
+    del mapped
+    return np.load(path, mmap_mode="c")
+
+
+@dataclass
+class Spill:
+    """An array of a recording to move to a memory-mapped file."""
+
+    key: tuple
+    data: OrcaiData
+    name: str
+    array: np.ndarray
+    path: Path
+    mapped: np.memmap | None = None
+
+
+class SpillWriterSignals(QObject):
+    """Signals for the SpillWriter class."""
+
+    error = pyqtSignal(tuple)
+    finished = pyqtSignal()
+
+
+class SpillWriter(QRunnable):
+    """Writes the arrays chosen by ``MemoryBudget.enforce`` to their files."""
+
+    def __init__(self, spills: list[Spill]):
+        super().__init__()
+        self.signals = SpillWriterSignals()
+        self.spills = spills
+
+    def run(self):
+        try:
+            for spill in self.spills:
+                spill.mapped = spill_array(spill.array, spill.path)
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        finally:
+            self.signals.finished.emit()
+
+
+class MemoryBudget:
+    """Accounts for the memory of open recordings and caches.
+
+    Recordings are tracked by key, least recently used first. Caches are
+    objects with ``nbytes()`` and ``evict()``, which drops their oldest
+    entry and returns whether there was one. ``enforce`` brings the total
+    under ``budget`` bytes by spilling arrays of recordings to memory-mapped
+    files in a temporary directory, and by evicting cache entries. The
+    recording passed as ``current`` is spilled last, and its spectrogram
+    only if nothing else is left.
+
+    Spilling writes the arrays to disk, which takes a while for large ones.
+    With a ``spills`` list, ``enforce`` only chooses the arrays; a
+    ``SpillWriter`` writes them in the background and ``finish_spills``
+    swaps in the mapped arrays. Until then they count as spilled.
+    """
+
+    def __init__(self, budget: int, directory: Path | None = None):
+        self.budget = budget
+        self._directory = directory
+        self._owns_directory = directory is None
+        self.recordings: OrderedDict[tuple, OrcaiData] = OrderedDict()
+        self.caches: dict[str, object] = {}
+        self.spilled: dict[tuple, list[Path]] = {}
+        # bytes of the arrays being written, by recording and array name
+        self.pending: dict[tuple[tuple, str], int] = {}
+        self._n_files = 0
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="orcaigui-"))
+        return self._directory
+
+    def track(self, key: tuple, data: OrcaiData) -> None:
+        """Track a recording, or mark it as most recently used."""
+        if self.recordings.get(key) is not data:
+            self.untrack(key)
+        self.recordings[key] = data
+        self.recordings.move_to_end(key)
+
+    def untrack(self, key: tuple) -> None:
+        self.recordings.pop(key, None)
+        for path in self.spilled.pop(key, []):
+            try:
+                path.unlink()
+            except OSError:
+                # still mapped on Windows, removed with the directory
+                pass
+
+    def sync(self, recordings: dict[tuple, OrcaiData], current=None) -> None:
+        """Track exactly ``recordings``, with ``current`` most recently used."""
+        for key in [key for key in self.recordings if key not in recordings]:
+            self.untrack(key)
+        for key, data in recordings.items():
+            if self.recordings.get(key) is not data:
+                self.track(key, data)
+        if current in self.recordings:
+            self.recordings.move_to_end(current)
+
+    def add_cache(self, name: str, cache) -> None:
+        self.caches[name] = cache
+
+    def usage(self) -> dict[str, int]:
+        """Bytes held in RAM by each recording and cache."""
+        usage = {
+            f"{data.recording_path.name}, channel {data.channel}": sum(
+                resident_bytes(data).values()
+            )
+            for data in self.recordings.values()
+        }
+        for name, cache in self.caches.items():
+            usage[name] = cache.nbytes()
+        return usage
+
+    def total(self) -> int:
+        return sum(self.usage().values())
+
+    def spilled_bytes(self) -> int:
+        """Bytes of the arrays moved to memory-mapped files."""
+        return sum(
+            path.stat().st_size
+            for paths in self.spilled.values()
+            for path in paths
+            if path.exists()
+        )
+
+    def spill(
+        self, key: tuple, names: tuple[str, ...], spills: list[Spill] | None = None
+    ) -> int:
+        """Move arrays of a recording to memory-mapped files, returns bytes freed.
+
+        With ``spills`` the arrays are appended to it instead of written.
+        """
+        data = self.recordings[key]
+        freed = 0
+        for name in names:
+            array = getattr(data, name)
+            if (
+                array is None
+                or array.size == 0
+                or is_mapped(array)
+                or (key, name) in self.pending
+            ):
+                continue
+            self._n_files += 1
+            path = self.directory / f"{self._n_files}_{name}.npy"
+            if spills is None:
+                setattr(data, name, spill_array(array, path))
+                self.spilled.setdefault(key, []).append(path)
+            else:
+                spills.append(Spill(key, data, name, array, path))
+                self.pending[(key, name)] = array.nbytes
+            freed += array.nbytes
+        return freed
+
+    def finish_spills(self, spills: list[Spill]) -> int:
+        """Swap in the arrays written by a SpillWriter, returns bytes freed.
+
+        Arrays of recordings no longer tracked, or replaced meanwhile, stay
+        as they are and their files are removed.
+        """
+        freed = 0
+        for spill in spills:
+            self.pending.pop((spill.key, spill.name), None)
+            if (
+                spill.mapped is not None
+                and self.recordings.get(spill.key) is spill.data
+                and getattr(spill.data, spill.name) is spill.array
+            ):
+                setattr(spill.data, spill.name, spill.mapped)
+                self.spilled.setdefault(spill.key, []).append(spill.path)
+                freed += spill.array.nbytes
+            else:
+                spill.mapped = None
+                spill.path.unlink(missing_ok=True)
+            # the writer keeps the list, not the arrays
+            spill.array = spill.mapped = None
+        return freed
+
+    def enforce(
+        self, current: tuple | None = None, spills: list[Spill] | None = None
+    ) -> list[str]:
+        """Free memory until the total is within the budget.
+
+        Returns a description of what was spilled or evicted. With
+        ``spills``, the arrays to spill are appended to it, see the class.
+        """
+        actions = []
+        total = self.total() - sum(self.pending.values())
+        others = [key for key in self.recordings if key != current]
+        steps = [
+            *((key, (*SPILLABLE, *SPILLABLE_SHOWN)) for key in others),
+            *((name, None) for name in self.caches),
+        ]
+        if current in self.recordings:
+            steps += [(current, SPILLABLE), (current, SPILLABLE_SHOWN)]
+        for target, names in steps:
+            if total <= self.budget:
+                break
+            if names is None:
+                cache = self.caches[target]
+                n_evicted = 0
+                while total > self.budget and cache.evict():
+                    n_evicted += 1
+                    total = self.total() - sum(self.pending.values())
+                if n_evicted:
+                    actions.append(f"evicted {n_evicted} from {target}")
+                continue
+            freed = self.spill(target, names, spills)
+            if freed:
+                data = self.recordings[target]
+                actions.append(
+                    f"{'spilling' if spills is not None else 'spilled'} "
+                    f"{freed / 2**20:.0f} MB of "
+                    f"{data.recording_path.name}, channel {data.channel}"
+                )
+                total -= freed
+        return actions
+
+    def close(self) -> None:
+        """Forget all recordings and remove the spilled files."""
+        for key in list(self.recordings):
+            self.untrack(key)
+        if self._owns_directory and self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
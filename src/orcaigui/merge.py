@@ -0,0 +1,264 @@
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from uuid import uuid4
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from orcaigui.orcaidata import read_labels, write_labels
+
+RULES = ("majority", "any", "all")
+ABSTAIN, ACCEPT, REJECT = 0, 1, 2
+
+
+@dataclass
+class MergeReport:
+    """Agreement between the curators of merged projects."""
+
+    projects: list[Path]
+    n_labels: int
+    n_checked: int
+    n_conflicts: int
+    agreement: pd.DataFrame  # fraction of shared decisions two projects agree on
+    kappa: pd.DataFrame  # Cohen's kappa of two projects' decisions
+
+    def summary(self) -> str:
+        names = [path.name for path in self.projects]
+        lines = [
+            f"Merged {len(self.projects)} projects into {self.n_labels} labels",
+            f"{self.n_checked} labels checked by at least one curator, "
+            f"{self.n_conflicts} with conflicting decisions",
+            "",
+            "Pairwise agreement (Cohen's kappa):",
+        ]
+        for i, a in enumerate(names):
+            for j in range(i + 1, len(names)):
+                agreement = self.agreement.iat[i, j]
+                if np.isnan(agreement):
+                    lines.append(f"  {a} / {names[j]}: no shared decisions")
+                else:
+                    lines.append(
+                        f"  {a} / {names[j]}: {agreement:.1%} "
+                        f"({self.kappa.iat[i, j]:.2f})"
+                    )
+        return "\n".join(lines)
+
+
+def read_project_labels(project_path: Path) -> tuple[pd.DataFrame, str, int]:
+    """Labels, recording name and channel of a project, without its arrays."""
+    with h5py.File(project_path, "r") as f:
+        return (
+            read_labels(f["predicted_labels"]),
+            Path(f.attrs["recording_path"]).name,
+            int(f.attrs["channel"]),
+        )
+
+
+def align_labels(tables: list[pd.DataFrame]) -> pd.DataFrame:
+    """Group labels of the same call that overlap across projects.
+
+    All labels are pooled and sorted by call and start. A sweep over the
+    sorted labels starts a new group whenever the call changes or a label
+    starts after every previous label of its group has stopped.
+
+    Returns
+    -------
+    pd.DataFrame
+        The pooled labels with columns ``project``, ``call``, ``vote`` and
+        ``group``, sorted by group.
+    """
+    pooled = pd.concat(
+        [table.assign(project=i) for i, table in enumerate(tables)],
+        ignore_index=True,
+    )
+    pooled["call"] = pooled["label"].astype(str).str.replace("*", "", regex=False)
+    checked = pooled["label_checked"].to_numpy(dtype=bool)
+    ok = pooled["label_ok"].to_numpy(dtype=bool)
+    pooled["vote"] = np.where(checked, np.where(ok, ACCEPT, REJECT), ABSTAIN)
+
+    call_codes, _ = pd.factorize(pooled["call"], sort=True)
+    starts = pooled["start"].to_numpy(dtype=np.float64)
+    stops = pooled["stop"].to_numpy(dtype=np.float64)
+    # shift every call to its own range of the time axis, so one running
+    # maximum over all labels never crosses from one call to the next
+    span = max(stops.max(initial=0), starts.max(initial=0)) + 1
+    starts = starts + call_codes * span
+    stops = stops + call_codes * span
+    order = np.lexsort((stops, starts))
+    reach = np.maximum.accumulate(stops[order])
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = starts[order][1:] >= reach[:-1]
+    pooled = pooled.iloc[order].reset_index(drop=True)
+    pooled["group"] = np.cumsum(new_group) - 1
+    return pooled
+
+
+def _votes(pooled: pd.DataFrame, n_projects: int) -> np.ndarray:
+    """Decision of each project on each group, (n_groups, n_projects).
+
+    A project that accepted any of its labels in a group accepts it,
+    otherwise one that rejected any rejects it.
+    """
+    n_groups = int(pooled["group"].max()) + 1 if len(pooled) else 0
+    votes = np.full((n_groups, n_projects), ABSTAIN, dtype=np.int8)
+    group = pooled["group"].to_numpy()
+    project = pooled["project"].to_numpy()
+    vote = pooled["vote"].to_numpy()
+    rejected = vote == REJECT
+    votes[group[rejected], project[rejected]] = REJECT
+    accepted = vote == ACCEPT
+    votes[group[accepted], project[accepted]] = ACCEPT
+    return votes
+
+
+def resolve(
+    pooled: pd.DataFrame, votes: np.ndarray, rule: str = "majority"
+) -> pd.DataFrame:
+    """One label per group, with its status decided by ``rule``.
+
+    ``majority`` accepts labels with more accepts than rejects, ``any``
+    accepts labels at least one curator accepted and ``all`` only labels no
+    curator rejected. Boundaries are the median over the labels of curators
+    who checked them, or over all labels of the group if nobody did.
+    """
+    if rule not in RULES:
+        raise ValueError(f"Unknown merge rule {rule}, expected one of {RULES}")
+    accepts = np.count_nonzero(votes == ACCEPT, axis=1)
+    rejects = np.count_nonzero(votes == REJECT, axis=1)
+    checked = accepts + rejects > 0
+    if rule == "majority":
+        label_ok = accepts > rejects
+    elif rule == "any":
+        label_ok = accepts > 0
+    else:
+        label_ok = (accepts > 0) & (rejects == 0)
+
+    voted = pooled[pooled["vote"] != ABSTAIN]
+    pooled_by_group = pooled.groupby("group")
+    voted_by_group = voted.groupby("group")
+    start = pooled_by_group["start"].median()
+    stop = pooled_by_group["stop"].median()
+    start.update(voted_by_group["start"].median())
+    stop.update(voted_by_group["stop"].median())
+    sources = voted.assign(
+        user=voted["label_source"].astype(str).str.removeprefix("manual:")
+    )
+    sources = sources.groupby("group")["user"].agg(
+        lambda users: "merge:" + ",".join(sorted(set(users)))
+    )
+    call = pooled_by_group["call"].first()
+    label = pooled_by_group["label"].first()
+    label.update(voted_by_group["label"].first())
+
+    merged = pd.DataFrame(
+        {
+            "start": np.round(start.to_numpy()).astype(pooled["start"].dtype),
+            "stop": np.round(stop.to_numpy()).astype(pooled["stop"].dtype),
+            "label": np.where(checked & label_ok, call, label),
+            "label_checked": checked,
+            "label_ok": np.where(
+                checked, label_ok, pooled_by_group["label_ok"].first()
+            ),
+            "label_source": sources.reindex(call.index)
+            .fillna(pooled_by_group["label_source"].first())
+            .to_numpy(),
+        }
+    )
+    return merged.sort_values("start", kind="stable").reset_index(drop=True)
+
+
+def agreement_statistics(votes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pairwise agreement and Cohen's kappa on groups both projects decided."""
+    n_projects = votes.shape[1]
+    agreement = np.full((n_projects, n_projects), np.nan)
+    kappa = np.full((n_projects, n_projects), np.nan)
+    for i in range(n_projects):
+        for j in range(n_projects):
+            shared = (votes[:, i] != ABSTAIN) & (votes[:, j] != ABSTAIN)
+            if not shared.any():
+                continue
+            a = votes[shared, i] == ACCEPT
+            b = votes[shared, j] == ACCEPT
+            observed = np.mean(a == b)
+            expected = a.mean() * b.mean() + (1 - a.mean()) * (1 - b.mean())
+            agreement[i, j] = observed
+            kappa[i, j] = (
+                (observed - expected) / (1 - expected) if expected < 1 else 1.0
+            )
+    return agreement, kappa
+
+
+def merge_projects(
+    project_paths: list[Path],
+    output_path: Path | None = None,
+    rule: str = "majority",
+) -> tuple[pd.DataFrame, MergeReport]:
+    """Merge the curated labels of several projects of the same recording.
+
+    Only the label groups of the projects are read. If ``output_path`` is
+    given, the first project is copied there with its labels replaced by the
+    merged ones.
+
+    Parameters
+    ----------
+    project_paths : list[Path]
+        Project files to merge, at least two.
+    output_path : Path | None
+        Where to write the merged project.
+    rule : str
+        One of RULES, how to decide labels curators disagree on.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, MergeReport]
+        Merged labels and agreement statistics.
+    """
+    project_paths = [Path(path) for path in project_paths]
+    if len(project_paths) < 2:
+        raise ValueError("At least two projects are needed for a merge")
+    tables, recordings = [], set()
+    for path in project_paths:
+        labels, recording, channel = read_project_labels(path)
+        tables.append(labels)
+        recordings.add((recording, channel))
+    if len(recordings) > 1:
+        raise ValueError(
+            "Projects belong to different recordings or channels: "
+            + ", ".join(f"{name} channel {channel}" for name, channel in recordings)
+        )
+
+    pooled = align_labels(tables)
+    votes = _votes(pooled, len(tables))
+    merged = resolve(pooled, votes, rule=rule)
+    agreement, kappa = agreement_statistics(votes)
+    accepts = np.any(votes == ACCEPT, axis=1)
+    rejects = np.any(votes == REJECT, axis=1)
+    names = [path.name for path in project_paths]
+    report = MergeReport(
+        projects=project_paths,
+        n_labels=len(merged),
+        n_checked=int(np.count_nonzero(accepts | rejects)),
+        n_conflicts=int(np.count_nonzero(accepts & rejects)),
+        agreement=pd.DataFrame(agreement, index=names, columns=names),
+        kappa=pd.DataFrame(kappa, index=names, columns=names),
+    )
+
+    if output_path is not None:
+        write_merged_project(project_paths[0], output_path, merged)
+    return merged, report
+
+
+def write_merged_project(
+    base_path: Path, output_path: Path, labels: pd.DataFrame
+) -> None:
+    """Copy a project and replace its labels."""
+    if Path(output_path).resolve() != Path(base_path).resolve():
+        shutil.copyfile(base_path, output_path)
+    with h5py.File(output_path, "r+") as f:
+        del f["predicted_labels"]
+        write_labels(f.create_group("predicted_labels"), labels)
+        if "label_embeddings" in f:
+            del f["label_embeddings"]
+        f.attrs["revision"] = uuid4().hex
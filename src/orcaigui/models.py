@@ -0,0 +1,125 @@
+from importlib.resources import files
+from pathlib import Path
+
+import numpy as np
+from orcAI.io import load_orcai_model
+from orcAI.predict import compute_aggregated_predictions
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.instrumentation import stage
+from orcaigui.orcaidata import ModelPredictions, OrcaiData
+from orcaigui.scheduler import scheduler
+
+DEFAULT_MODEL = "orcai-v1"
+
+
+def available_models(model_dirs: list[str] | None = None) -> dict[str, Path]:
+    """Models shipped with orcAI and in the given directories, by name.
+
+    A model directory is either a model itself or contains models as
+    subdirectories.
+    """
+    models = {}
+    builtin = files("orcAI.models")
+    for path in builtin.iterdir():
+        if path.is_dir() and not path.name.startswith("_"):
+            models[path.name] = Path(str(path))
+    for model_dir in model_dirs or []:
+        model_dir = Path(model_dir)
+        if not model_dir.is_dir():
+            continue
+        subdirs = [path for path in model_dir.iterdir() if path.is_dir()]
+        if any(path.is_file() for path in model_dir.iterdir()) or not subdirs:
+            models[model_dir.name] = model_dir
+        else:
+            for path in subdirs:
+                models[path.name] = path
+    return models
+
+
+class ModelRunnerSignals(QObject):
+    """Signals for the ModelRunner class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    loaded = pyqtSignal(str, tuple)
+    result = pyqtSignal(str, ModelPredictions)
+
+
+class ModelRunner(QRunnable):
+    """Runs one model on the preprocessed spectrogram of the data.
+
+    Several runners share the preprocessed spectrogram of ``data``, it is
+    only read. If it was not stored, the first runner to need it
+    regenerates it and the others wait for it. The model is loaded from
+    ``model_dir`` unless ``loaded`` holds the result of an earlier
+    ``load_orcai_model``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model_dir: Path,
+        data: OrcaiData,
+        loaded: tuple | None = None,
+    ):
+        super().__init__()
+        self.signals = ModelRunnerSignals()
+        self.name = name
+        self.model_dir = model_dir
+        self.data = data
+        self.recording_path = data.recording_path
+        self.spectrogram_parameter = data.spectrogram_parameter
+        self.loaded = loaded
+
+    def run(self):
+        try:
+            if self.loaded is None:
+                self.signals.progress.emit(f"Loading model {self.name}...")
+                self.loaded = load_orcai_model(self.model_dir)
+                self.signals.loaded.emit(self.name, self.loaded)
+            model, orcai_parameter, shape = self.loaded
+            if (
+                self.spectrogram_parameter is not None
+                and orcai_parameter["spectrogram"] != self.spectrogram_parameter
+            ):
+                raise ValueError(
+                    f"Model {self.name} expects different spectrogram parameters"
+                )
+            if self.data.pp_spectrogram is None:
+                self.signals.progress.emit(
+                    f"Regenerating the preprocessed spectrogram of "
+                    f"{self.recording_path.name}..."
+                )
+            pp_spectrogram = self.data.preprocessed_spectrogram()
+            self.signals.progress.emit(f"Computing predictions of {self.name}...")
+            with (
+                scheduler.slot("inference"),
+                stage(
+                    "inference", model=self.name, recording=self.recording_path.name
+                ) as record,
+            ):
+                aggregated_predictions, _ = compute_aggregated_predictions(
+                    recording_path=self.recording_path,
+                    spectrogram=pp_spectrogram,
+                    model=model,
+                    orcai_parameter=orcai_parameter,
+                    shape=shape,
+                )
+                record.size(aggregated_predictions=aggregated_predictions)
+            prediction_times = np.arange(0, len(aggregated_predictions)) * (
+                2 ** len(orcai_parameter["model"]["filters"])
+            )
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        else:
+            self.signals.progress.emit(f"Computed predictions of {self.name}")
+            self.signals.result.emit(
+                self.name,
+                ModelPredictions(
+                    calls=list(orcai_parameter["calls"]),
+                    aggregated_predictions=aggregated_predictions,
+                    prediction_times=prediction_times,
+                ),
+            )
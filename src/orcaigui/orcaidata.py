@@ -1,10 +1,201 @@
-from dataclasses import dataclass
+import json
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
+from uuid import uuid4
 
 import h5py
 import numpy as np
 import pandas as pd
 from orcAI.io import save_predictions
+from orcAI.spectrogram import preprocess_spectrogram
+
+from orcaigui.extensions import timedelta
+from orcaigui.instrumentation import stage
+from orcaigui.journal import CurationJournal, journal_path
+from orcaigui.scheduler import scheduler
+
+PROJECT_ARRAYS = (
+    "frequencies",
+    "times",
+    "prediction_times",
+    "aggregated_predictions",
+    "spectrogram",
+    "pp_spectrogram",
+)
+SPECTROGRAM_STORAGE = ("full", "uint16", "uint8")
+PP_SPECTROGRAM_STORAGE = ("full", "float16", "regenerate")
+
+
+@dataclass
+class ProjectInfo:
+    """Summary of a project, cheap to obtain without loading its arrays."""
+
+    path: Path | None
+    recording_path: Path
+    channel: int
+    model_name: str | None
+    duration: float | None
+    label_counts: dict[str, int]
+    n_checked: int
+
+    def n_labels(self) -> int:
+        return sum(self.label_counts.values())
+
+    def progress(self) -> float:
+        """Fraction of labels that have been checked by a curator."""
+        n_labels = self.n_labels()
+        return self.n_checked / n_labels if n_labels else 0.0
+
+    def duration_string(self) -> str:
+        if self.duration is None:
+            return ""
+        return timedelta(seconds=float(self.duration)).to_string(ms_f=None)
+
+    def summary(self) -> str:
+        """One-line description, e.g. for menus and tooltips."""
+        return (
+            f"Channel {self.channel}, {self.duration_string()}, "
+            f"{self.n_labels()} labels, {self.progress():.0%} checked"
+        )
+
+
+@dataclass
+class ModelPredictions:
+    """Predictions of an additional model for comparison with the main one."""
+
+    calls: list[str]
+    aggregated_predictions: np.ndarray
+    prediction_times: np.ndarray
+
+
+def read_model_predictions(f: h5py.File) -> dict[str, ModelPredictions]:
+    """Predictions of additional models stored in a project."""
+    if "model_predictions" not in f:
+        return {}
+    return {
+        name: ModelPredictions(
+            calls=json.loads(group.attrs["calls"]),
+            aggregated_predictions=group["aggregated_predictions"][:],
+            prediction_times=group["prediction_times"][:],
+        )
+        for name, group in f["model_predictions"].items()
+    }
+
+
+def quantise(
+    array: np.ndarray, dtype: str, chunk_rows: int = 65536
+) -> tuple[np.ndarray, float, float]:
+    """Quantise an array to an unsigned integer type.
+
+    Returns the quantised array and ``scale`` and ``offset`` such that
+    ``array ≈ quantised * scale + offset``. Non-finite values are clipped to
+    the finite range. Rows are processed in chunks to bound temporaries.
+    """
+    offset, top = np.inf, -np.inf
+    for start in range(0, len(array), chunk_rows):
+        chunk = array[start : start + chunk_rows]
+        chunk = chunk[np.isfinite(chunk)]
+        if chunk.size:
+            offset = min(offset, float(chunk.min()))
+            top = max(top, float(chunk.max()))
+    if offset > top:
+        offset = top = 0.0
+    levels = np.iinfo(dtype).max
+    scale = (top - offset) / levels if top > offset else 1.0
+    quantised = np.empty(array.shape, dtype=dtype)
+    for start in range(0, len(array), chunk_rows):
+        chunk = np.nan_to_num(
+            array[start : start + chunk_rows], nan=offset, posinf=top, neginf=offset
+        )
+        quantised[start : start + chunk_rows] = np.clip(
+            np.rint((chunk - offset) / scale), 0, levels
+        )
+    return quantised, scale, offset
+
+
+def dequantise(quantised: np.ndarray, scale: float, offset: float) -> np.ndarray:
+    """Inverse of ``quantise``, as float32."""
+    return quantised.astype(np.float32) * np.float32(scale) + np.float32(offset)
+
+
+def write_labels(group: h5py.Group, labels: pd.DataFrame) -> None:
+    """Write a label table to an HDF5 group, one dataset per column.
+
+    String columns are dictionary encoded: the dataset holds integer codes
+    into a vocabulary dataset stored under ``vocabularies``.
+    """
+    group.attrs["columns"] = list(labels.columns)
+    for name, series in labels.items():
+        if pd.api.types.is_string_dtype(series) or series.dtype == object:
+            codes, vocabulary = pd.factorize(series)
+            dataset = group.create_dataset(name, data=codes.astype(np.int32))
+            dataset.attrs["encoding"] = "dictionary"
+            group.require_group("vocabularies").create_dataset(
+                name,
+                data=np.asarray(vocabulary, dtype=object),
+                dtype=h5py.string_dtype(),
+            )
+        else:
+            group.create_dataset(name, data=series.to_numpy())
+
+
+def read_label_column(group: h5py.Group, name: str) -> np.ndarray:
+    """Read one label column written by ``write_labels``."""
+    dataset = group[name]
+    if dataset.attrs.get("encoding", None) == "dictionary":
+        vocabulary = group["vocabularies"][name].asstr()[:]
+        return vocabulary[dataset[:]]
+    if h5py.check_string_dtype(dataset.dtype) is not None:
+        # projects written before dictionary encoding
+        return dataset.asstr()[:]
+    return dataset[:]
+
+
+def read_labels(group: h5py.Group) -> pd.DataFrame:
+    """Read a label table written by ``write_labels``."""
+    columns = group.attrs.get("columns", None)
+    if columns is None:
+        columns = [
+            name for name, item in group.items() if isinstance(item, h5py.Dataset)
+        ]
+    return pd.DataFrame({name: read_label_column(group, name) for name in columns})
+
+
+def _count_labels(
+    codes: np.ndarray, vocabulary: np.ndarray, label_checked: np.ndarray
+) -> tuple[dict[str, int], int]:
+    label_counts = {}
+    for label, count in zip(vocabulary, np.bincount(codes, minlength=len(vocabulary))):
+        call = str(label).replace("*", "")
+        label_counts[call] = label_counts.get(call, 0) + int(count)
+    return label_counts, int(np.count_nonzero(label_checked))
+
+
+def probe_project(file_path: Path) -> ProjectInfo:
+    """Read the summary of a project file without loading the large datasets."""
+    with h5py.File(file_path, "r") as f:
+        model_name = f.attrs.get("model_name", None)
+        times = f["times"]
+        duration = times[-1] - times[0] if len(times) > 0 else None
+        labels = f["predicted_labels"]
+        if labels["label"].attrs.get("encoding", None) == "dictionary":
+            codes = labels["label"][:]
+            vocabulary = labels["vocabularies"]["label"].asstr()[:]
+        else:
+            codes, vocabulary = pd.factorize(read_label_column(labels, "label"))
+        label_counts, n_checked = _count_labels(
+            codes, vocabulary, read_label_column(labels, "label_checked")
+        )
+        return ProjectInfo(
+            path=file_path,
+            recording_path=Path(f.attrs["recording_path"]),
+            channel=int(f.attrs["channel"]),
+            model_name=str(model_name) if model_name is not None else None,
+            duration=duration,
+            label_counts=label_counts,
+            n_checked=n_checked,
+        )
 
 
 @dataclass
@@ -18,6 +209,22 @@ class OrcaiData:
     aggregated_predictions: np.ndarray
     prediction_times: np.ndarray
     predicted_labels: pd.DataFrame
+    model_name: str | None = None
+    spectrogram_parameter: dict | None = None
+    spectrogram_scale: float | None = None
+    spectrogram_offset: float | None = None
+    label_embeddings: np.ndarray | None = None
+    # predictions of other models on the same preprocessed spectrogram
+    model_predictions: dict[str, ModelPredictions] = field(default_factory=dict)
+    journal: CurationJournal = field(init=False, repr=False, compare=False)
+    # held while the preprocessed spectrogram is regenerated, so workers
+    # needing it at the same time regenerate it once
+    _preprocess_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.journal = CurationJournal(self)
 
     def n_labels(self) -> int | None:
         if self.predicted_labels is None:
@@ -36,6 +243,70 @@ class OrcaiData:
             return None
         return self.times[-1] - self.times[0]
 
+    def spectrogram_values(self) -> np.ndarray:
+        """Spectrogram as floats, dequantised if it is held quantised."""
+        if self.spectrogram_scale is None:
+            return self.spectrogram
+        return dequantise(
+            self.spectrogram, self.spectrogram_scale, self.spectrogram_offset
+        )
+
+    def preprocessed_spectrogram(self) -> np.ndarray:
+        """Preprocessed spectrogram, regenerated if it was not stored.
+
+        Regenerating it takes long for long recordings; call this in a
+        worker, not on the GUI thread.
+        """
+        with self._preprocess_lock:
+            if self.pp_spectrogram is None:
+                self.pp_spectrogram = preprocess_spectrogram(
+                    self.spectrogram_values(),
+                    self.frequencies,
+                    self.spectrogram_parameter,
+                )
+            return self.pp_spectrogram
+
+    def memory_usage(self) -> dict[str, int]:
+        """Bytes held by each of the arrays."""
+        arrays = {
+            "spectrogram": self.spectrogram,
+            "frequencies": self.frequencies,
+            "times": self.times,
+            "pp_spectrogram": self.pp_spectrogram,
+            "aggregated_predictions": self.aggregated_predictions,
+            "prediction_times": self.prediction_times,
+            "label_embeddings": self.label_embeddings,
+        }
+        usage = {
+            name: array.nbytes if array is not None else 0
+            for name, array in arrays.items()
+        }
+        usage["model_predictions"] = sum(
+            predictions.aggregated_predictions.nbytes
+            + predictions.prediction_times.nbytes
+            for predictions in self.model_predictions.values()
+        )
+        usage["predicted_labels"] = int(
+            self.predicted_labels.memory_usage(deep=True).sum()
+        )
+        return usage
+
+    def info(self, path: Path | None = None) -> ProjectInfo:
+        """Summarise the loaded data the same way as ``probe_project``."""
+        label_counts, n_checked = _count_labels(
+            *pd.factorize(self.predicted_labels["label"]),
+            self.predicted_labels["label_checked"],
+        )
+        return ProjectInfo(
+            path=path,
+            recording_path=self.recording_path,
+            channel=self.channel,
+            model_name=self.model_name,
+            duration=self.duration(),
+            label_counts=label_counts,
+            n_checked=n_checked,
+        )
+
     def export_labels_as_tsv(self, file_path: Path) -> None:
         """export labels to a TSV file compatible with Audacity."""
         save_predictions(
@@ -54,51 +325,136 @@ class OrcaiData:
             ],
         )
 
-    def save_as_hdf5(self, file_path: Path) -> None:
-        """Save OrcaiData to an HDF5 file."""
-        with h5py.File(file_path, "w") as f:
-            f.create_dataset("spectrogram", data=self.spectrogram)
+    def save_as_hdf5(
+        self,
+        file_path: Path,
+        spectrogram_storage: str = "full",
+        pp_spectrogram_storage: str = "full",
+    ) -> None:
+        """Save OrcaiData to an HDF5 file.
+
+        Parameters
+        ----------
+        file_path : Path
+            Path of the project file.
+        spectrogram_storage : str
+            One of SPECTROGRAM_STORAGE. ``uint16`` and ``uint8`` quantise the
+            spectrogram with a scale and offset stored as attributes. A
+            spectrogram that is already held quantised is stored as is.
+        pp_spectrogram_storage : str
+            One of PP_SPECTROGRAM_STORAGE. ``float16`` stores the preprocessed
+            spectrogram at half precision, ``regenerate`` omits it; it is then
+            recomputed from the spectrogram when needed. Regenerating needs
+            the spectrogram parameters, and from a ``uint8`` spectrogram it
+            would feed the model and the label embeddings noticeably coarser
+            input, so in those cases it is stored at half precision instead.
+        """
+        stored_uint8 = (
+            self.spectrogram.dtype == np.uint8
+            if self.spectrogram_scale is not None
+            else spectrogram_storage == "uint8"
+        )
+        if pp_spectrogram_storage == "regenerate" and (
+            self.spectrogram_parameter is None or stored_uint8
+        ):
+            pp_spectrogram_storage = "float16"
+        with (
+            scheduler.slot("save"),
+            stage("save", project=Path(file_path).name),
+            h5py.File(file_path, "w") as f,
+        ):
+            if self.spectrogram_scale is not None:
+                spectrogram = f.create_dataset("spectrogram", data=self.spectrogram)
+                spectrogram.attrs["scale"] = self.spectrogram_scale
+                spectrogram.attrs["offset"] = self.spectrogram_offset
+            elif spectrogram_storage in ("uint16", "uint8"):
+                quantised, scale, offset = quantise(
+                    self.spectrogram, spectrogram_storage
+                )
+                spectrogram = f.create_dataset("spectrogram", data=quantised)
+                spectrogram.attrs["scale"] = scale
+                spectrogram.attrs["offset"] = offset
+            else:
+                f.create_dataset("spectrogram", data=self.spectrogram)
             f.create_dataset("frequencies", data=self.frequencies)
             f.create_dataset("times", data=self.times)
-            f.create_dataset("pp_spectrogram", data=self.pp_spectrogram)
+            if pp_spectrogram_storage == "float16":
+                f.create_dataset(
+                    "pp_spectrogram",
+                    data=self.preprocessed_spectrogram().astype(np.float16),
+                )
+            elif pp_spectrogram_storage != "regenerate":
+                f.create_dataset("pp_spectrogram", data=self.preprocessed_spectrogram())
             f.create_dataset("aggregated_predictions", data=self.aggregated_predictions)
             f.create_dataset("prediction_times", data=self.prediction_times)
-            f.create_group("predicted_labels")
-            for series_name, series in self.predicted_labels.items():
-                f["predicted_labels"].create_dataset(
-                    series_name, data=series.to_numpy()
-                )
+            write_labels(f.create_group("predicted_labels"), self.predicted_labels)
+            if self.label_embeddings is not None and len(self.label_embeddings) == len(
+                self.predicted_labels
+            ):
+                f.create_dataset("label_embeddings", data=self.label_embeddings)
+            if self.model_predictions:
+                models = f.create_group("model_predictions")
+                for name, predictions in self.model_predictions.items():
+                    group = models.create_group(name)
+                    group.create_dataset(
+                        "aggregated_predictions",
+                        data=predictions.aggregated_predictions,
+                    )
+                    group.create_dataset(
+                        "prediction_times", data=predictions.prediction_times
+                    )
+                    group.attrs["calls"] = json.dumps(predictions.calls)
             f.attrs["recording_path"] = str(self.recording_path)
             f.attrs["channel"] = self.channel
+            if self.model_name is not None:
+                f.attrs["model_name"] = self.model_name
+            if self.spectrogram_parameter is not None:
+                f.attrs["spectrogram_parameter"] = json.dumps(
+                    self.spectrogram_parameter
+                )
+            revision = uuid4().hex
+            f.attrs["revision"] = revision
+        self.journal.mark_saved(revision)
 
     @classmethod
     def load_from_hdf5_file(cls, file_path: Path) -> "OrcaiData":
         """Load OrcaiData from an HDF5 file."""
         with h5py.File(file_path, "r") as f:
-            recording_path = Path(f.attrs["recording_path"])
-            channel = f.attrs["channel"]
-            spectrogram = f["spectrogram"][:]
-            frequencies = f["frequencies"][:]
-            times = f["times"][:]
-            pp_spectrogram = f["pp_spectrogram"][:]
-            aggregated_predictions = f["aggregated_predictions"][:]
-            prediction_times = f["prediction_times"][:]
-            predicted_labels = pd.DataFrame(
-                {name: f["predicted_labels"][name][:] for name in f["predicted_labels"]}
-            )
-            predicted_labels["label"] = predicted_labels["label"].astype("str")
-            predicted_labels["label_source"] = predicted_labels["label_source"].astype(
-                "str"
-            )
+            return cls.from_hdf5(f, file_path)
+
+    @classmethod
+    def from_hdf5(
+        cls, f: h5py.File, file_path: Path, arrays: dict | None = None
+    ) -> "OrcaiData":
+        """Create OrcaiData from an open project file.
+
+        Datasets the caller has already read can be passed in ``arrays``;
+        all others are read here. Unsaved changes in the autosave journal
+        next to ``file_path`` are replayed onto the labels.
+        """
+        arrays = dict(arrays or {})
+        for name in PROJECT_ARRAYS:
+            if name not in arrays:
+                arrays[name] = f[name][:] if name in f else None
+        spectrogram_parameter = f.attrs.get("spectrogram_parameter", None)
+        model_name = f.attrs.get("model_name", None)
 
-        return cls(
-            recording_path,
-            channel,
-            spectrogram,
-            frequencies,
-            times,
-            pp_spectrogram,
-            aggregated_predictions,
-            prediction_times,
-            predicted_labels,
+        data = cls(
+            recording_path=Path(f.attrs["recording_path"]),
+            channel=int(f.attrs["channel"]),
+            predicted_labels=read_labels(f["predicted_labels"]),
+            model_name=str(model_name) if model_name is not None else None,
+            spectrogram_parameter=json.loads(spectrogram_parameter)
+            if spectrogram_parameter is not None
+            else None,
+            spectrogram_scale=f["spectrogram"].attrs.get("scale", None),
+            spectrogram_offset=f["spectrogram"].attrs.get("offset", None),
+            label_embeddings=f["label_embeddings"][:]
+            if "label_embeddings" in f
+            else None,
+            model_predictions=read_model_predictions(f),
+            **arrays,
         )
+        data.journal.revision = f.attrs.get("revision", None)
+        data.journal.recover(journal_path(file_path))
+        return data
@@ -0,0 +1,161 @@
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.audio_file_loader import channel_count, compute_channel, load_recording
+from orcaigui.instrumentation import stage
+from orcaigui.memory import resident_bytes
+from orcaigui.orcaidata import OrcaiData
+
+PREFETCH_DEPTH = 2  # recordings prepared ahead of the one being curated
+
+
+def default_project_path(
+    recording_path: Path, channel: int = 1, n_channels: int = 1
+) -> Path:
+    """Project of a channel of a recording, named as the watch daemon names it."""
+    if n_channels == 1:
+        return recording_path.with_suffix(".hdf5.orcai")
+    return recording_path.with_name(f"{recording_path.stem}_ch{channel}.hdf5.orcai")
+
+
+def playlist_from_folder(directory: Path) -> list[Path]:
+    """Recordings and projects in a folder, sorted by name.
+
+    A recording with a project of the same name is replaced by its project,
+    so curation continues where it was left.
+    """
+    projects = sorted(Path(directory).glob("*.hdf5.orcai"))
+    recordings = [
+        path
+        for path in sorted(Path(directory).glob("*"))
+        if path.suffix.lower() == ".wav"
+        and default_project_path(path) not in projects
+        and path.with_name(f"{path.stem}_ch1.hdf5.orcai") not in projects
+    ]
+    return sorted(projects + recordings, key=lambda path: path.name)
+
+
+class PlaylistEntryLoaderSignals(QObject):
+    """Signals for the PlaylistEntryLoader class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    result = pyqtSignal(OrcaiData)
+
+
+class PlaylistEntryLoader(QRunnable):
+    """Loads a project or processes a channel of a recording of a playlist.
+
+    The channel is the one curated last, or the first if the recording has
+    fewer channels.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        channel: int,
+        orcai_parameter: dict,
+        model,
+        shape: dict,
+    ):
+        super().__init__()
+        self.signals = PlaylistEntryLoaderSignals()
+        self.path = path
+        self.channel = channel
+        self.orcai_parameter = orcai_parameter
+        self.model = model
+        self.shape = shape
+
+    def run(self):
+        try:
+            self.signals.progress.emit(f"Preparing {self.path.name}...")
+            if self.path.suffix == ".orcai":
+                with stage("load", project=self.path.name, prefetch=True):
+                    data = OrcaiData.load_from_hdf5_file(self.path)
+            else:
+                with stage("decode", recording=self.path.name, prefetch=True) as record:
+                    wav_file = load_recording(
+                        self.path, self.orcai_parameter["spectrogram"]["sampling_rate"]
+                    )
+                    record.size(audio=wav_file)
+                channel = self.channel if self.channel <= channel_count(wav_file) else 1
+                data = OrcaiData(
+                    **compute_channel(
+                        wav_file,
+                        self.path,
+                        channel,
+                        self.orcai_parameter,
+                        self.model,
+                        self.shape,
+                    )
+                )
+                del wav_file
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        else:
+            self.signals.progress.emit(f"Prepared {self.path.name}")
+            self.signals.result.emit(data)
+
+
+class Playlist:
+    """Recordings curated in sequence, with the next ones prepared ahead.
+
+    Up to ``depth`` entries after the current one are prepared, one at a
+    time. The playlist is a cache of the memory budget: ``evict`` drops the
+    prepared entry furthest ahead and stops preparing more until the
+    playlist moves on.
+    """
+
+    def __init__(self, paths: list[Path], depth: int = PREFETCH_DEPTH):
+        self.paths = list(paths)
+        self.depth = depth
+        self.index = -1
+        self.ready: dict[int, OrcaiData] = {}
+        self.loading: dict[int, PlaylistEntryLoader] = {}
+        self.failed: set[int] = set()
+        self.waiting = None  # entry to show as soon as it is prepared
+        self.evicted = False
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def upcoming(self) -> range:
+        return range(self.index + 1, min(len(self.paths), self.index + 1 + self.depth))
+
+    def move_to(self, index: int) -> None:
+        """Make an entry the current one and forget entries no longer ahead."""
+        self.index = index
+        self.evicted = False
+        for key in [key for key in self.ready if key not in self.upcoming()]:
+            del self.ready[key]
+
+    def take(self, index: int) -> OrcaiData | None:
+        return self.ready.pop(index, None)
+
+    def next_to_prepare(self) -> int | None:
+        """The next entry to prepare, if none is being prepared."""
+        if self.loading or self.evicted:
+            return None
+        for index in self.upcoming():
+            if index not in self.ready and index not in self.failed:
+                return index
+        return None
+
+    def entry_bytes(self) -> int:
+        """Bytes of the largest prepared entry, to estimate the next one."""
+        return max(
+            (sum(resident_bytes(data).values()) for data in self.ready.values()),
+            default=0,
+        )
+
+    def nbytes(self) -> int:
+        return sum(sum(resident_bytes(data).values()) for data in self.ready.values())
+
+    def evict(self) -> bool:
+        if not self.ready:
+            return False
+        del self.ready[max(self.ready)]
+        self.evicted = True
+        return True
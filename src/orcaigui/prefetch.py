@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+
+OVERVIEW_COLUMNS = 4000
+TILE_COLUMNS = 2000
+PREFETCH_LABELS = 8
+
+
+def pool_columns(spectrogram: np.ndarray, columns: int) -> np.ndarray:
+    """Reduce a (frequency, time) spectrogram to at most ``columns`` time steps.
+
+    Neighbouring time steps are combined by their maximum so short calls
+    stay visible.
+    """
+    n_frames = spectrogram.shape[1]
+    step = -(-n_frames // columns)
+    if step <= 1:
+        return spectrogram
+    bounds = np.arange(0, n_frames, step)
+    return np.maximum.reduceat(spectrogram, bounds, axis=1)
+
+
+def extend_overview(
+    overview: np.ndarray, step: int, spectrogram: np.ndarray, first: int
+) -> tuple[np.ndarray, int]:
+    """Add the time steps of ``spectrogram`` from ``first`` on to an overview.
+
+    ``overview`` pools ``step`` time steps per column, as ``pool_columns``.
+    Only the new time steps and the last, partial column are pooled; when
+    the overview gets twice as wide as ``OVERVIEW_COLUMNS``, neighbouring
+    columns are combined and the step doubles.
+    """
+    start = first // step * step
+    new = spectrogram[:, start:]
+    if step > 1:
+        new = np.maximum.reduceat(new, np.arange(0, new.shape[1], step), axis=1)
+    overview = np.concatenate([overview[:, : start // step], new], axis=1)
+    while overview.shape[1] > 2 * OVERVIEW_COLUMNS:
+        overview = np.maximum.reduceat(
+            overview, np.arange(0, overview.shape[1], 2), axis=1
+        )
+        step *= 2
+    return overview, step
+
+
+def tile_range(region: tuple[float, float], n_frames: int) -> tuple[int, int]:
+    """Time steps covered by a tile showing ``region``."""
+    start = int(np.clip(np.floor(region[0]), 0, n_frames))
+    stop = int(np.clip(np.ceil(region[1]), start, n_frames))
+    return start, stop
+
+
+def render_tile(
+    spectrogram: np.ndarray,
+    start: int,
+    stop: int,
+    lut: np.ndarray,
+    levels: tuple[float, float],
+    columns: int = TILE_COLUMNS,
+) -> np.ndarray:
+    """Colour a part of the spectrogram for display.
+
+    Returns an RGB(A) uint8 image indexed as (time, frequency), ready to be
+    shown by an ImageItem without further processing.
+    """
+    tile = pool_columns(spectrogram[:, start:stop], columns)
+    low, high = levels
+    scale = (len(lut) - 1) / (high - low) if high > low else 0.0
+    codes = np.clip((tile.T.astype(np.float32) - low) * scale, 0, len(lut) - 1)
+    return np.ascontiguousarray(lut[codes.astype(np.intp)])
+
+
+class TileCache:
+    """Least recently used cache of rendered tiles, keyed by their range."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._tiles: OrderedDict[tuple[int, int], np.ndarray] = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._tiles
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, key: tuple[int, int]) -> np.ndarray | None:
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key: tuple[int, int], tile: np.ndarray) -> None:
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.capacity:
+            self._tiles.popitem(last=False)
+
+    def nbytes(self) -> int:
+        return sum(tile.nbytes for tile in self._tiles.values())
+
+    def evict(self) -> bool:
+        """Drop the least recently used tile, if there is one."""
+        if not self._tiles:
+            return False
+        self._tiles.popitem(last=False)
+        return True
+
+    def discard_from(self, first: int) -> None:
+        """Drop the tiles that show time steps from ``first`` on."""
+        for key in [key for key in self._tiles if key[1] > first]:
+            del self._tiles[key]
+
+    def clear(self) -> None:
+        self._tiles.clear()
+
+
+class TilePrefetcherSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(tuple)
+
+
+class TilePrefetcher(QRunnable):
+    """Renders spectrogram tiles for upcoming labels in the background."""
+
+    def __init__(
+        self,
+        spectrogram: np.ndarray,
+        ranges: list[tuple[int, int]],
+        lut: np.ndarray,
+        levels: tuple[float, float],
+    ):
+        super().__init__()
+        self.signals = TilePrefetcherSignals()
+        self.spectrogram = spectrogram
+        self.ranges = ranges
+        self.lut = lut
+        self.levels = levels
+        self._cancelled = False
+
+    def cancel(self):
+        """Skip the tiles not rendered yet."""
+        self._cancelled = True
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            for start, stop in self.ranges:
+                if self._cancelled:
+                    return
+                tile = render_tile(self.spectrogram, start, stop, self.lut, self.levels)
+                self.signals.result.emit(((start, stop), tile))
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
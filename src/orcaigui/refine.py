@@ -0,0 +1,201 @@
+import numpy as np
+
+from orcaigui.orcaidata import OrcaiData
+
+THRESHOLD_FRACTION = 0.3
+# how far the peak of a label must rise above the energy around it, in
+# spreads of that energy, for its boundaries to be refined
+MIN_CONTRAST = 4.0
+SEARCH_STEPS = 16
+CHUNK_COLUMNS = 65536
+# frequency range in Hz of the energy boundaries snap to: orca calls and
+# their first harmonics, above flow noise and vessel noise
+REFINE_BAND = (1000.0, 16000.0)
+
+
+def band_energy(
+    data: OrcaiData,
+    first: int,
+    last: int,
+    band: tuple[float, float] | None = None,
+) -> np.ndarray:
+    """Mean spectrogram value in a frequency band for time steps ``first:last``.
+
+    Quantised spectrograms are averaged before dequantising, so no float
+    copy of the spectrogram is made. A band without frequencies of the
+    spectrogram is ignored.
+    """
+    rows = slice(None)
+    if band is not None:
+        in_band = (data.frequencies >= band[0]) & (data.frequencies <= band[1])
+        if in_band.any():
+            rows = in_band
+    energy = np.empty(last - first, dtype=np.float32)
+    for start in range(first, last, CHUNK_COLUMNS):
+        stop = min(start + CHUNK_COLUMNS, last)
+        energy[start - first : stop - first] = data.spectrogram[rows, start:stop].mean(
+            axis=0, dtype=np.float64
+        )
+    if data.spectrogram_scale is not None:
+        energy = energy * data.spectrogram_scale + data.spectrogram_offset
+    return energy
+
+
+def search_steps(data: OrcaiData) -> int:
+    """Search distance around label boundaries, the resolution of the labels."""
+    if len(data.prediction_times) > 1:
+        return max(1, int(round(data.prediction_times[1] - data.prediction_times[0])))
+    return SEARCH_STEPS
+
+
+def refine_boundaries(
+    data: OrcaiData,
+    indices: np.ndarray,
+    band: tuple[float, float] | None = None,
+    fraction: float = THRESHOLD_FRACTION,
+    search: int | None = None,
+    min_contrast: float = MIN_CONTRAST,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Snap label boundaries to onsets and offsets of the band energy.
+
+    For every label a threshold ``floor + fraction * (peak - floor)`` is
+    set from the lowest energy around the label and the highest energy
+    within it. The start moves to the first time step within ``search``
+    steps of it that reaches the threshold, the stop to one past the last
+    such step around the stop. Boundaries without such a step are kept.
+
+    Labels on noise or on a flat spectrogram would reach the threshold
+    almost everywhere, so a label is only refined if its peak is more than
+    ``min_contrast`` spreads above the median energy just outside it; the
+    spread is the median absolute deviation, scaled to a standard deviation.
+
+    Parameters
+    ----------
+    data : OrcaiData
+        Data with spectrogram and predicted labels.
+    indices : np.ndarray
+        Labels to refine.
+    band : tuple[float, float] | None
+        Frequency range in Hz to compute the energy in, all if None.
+    fraction : float
+        Position of the threshold between floor and peak.
+    search : int | None
+        Search distance in time steps, from ``search_steps`` if None.
+    min_contrast : float
+        Height of the peak above the surrounding energy, in its spreads,
+        below which boundaries are kept.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Refined starts and stops.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = data.predicted_labels
+    starts = labels["start"].to_numpy()[indices].astype(np.int64)
+    stops = labels["stop"].to_numpy()[indices].astype(np.int64)
+    if len(indices) == 0:
+        return starts, stops
+    if search is None:
+        search = search_steps(data)
+
+    n_frames = data.spectrogram.shape[1]
+    first = max(0, int(starts.min()) - search)
+    last = min(n_frames, int(stops.max()) + search + 1)
+    energy = band_energy(data, first, last, band)
+    # positions relative to the energy array, which gets one padding value
+    # so reduceat can use the end of the array as a boundary
+    local_starts = np.clip(starts - first, 0, len(energy) - 1)
+    local_stops = np.clip(stops - first, local_starts + 1, len(energy))
+    padded = np.append(energy, energy[-1])
+
+    outer = np.column_stack(
+        [
+            np.maximum(local_starts - search, 0),
+            np.minimum(local_stops + search, len(energy)),
+        ]
+    ).ravel()
+    floor = np.minimum.reduceat(padded, outer)[::2]
+    inner = np.column_stack([local_starts, local_stops]).ravel()
+    peak = np.maximum.reduceat(padded, inner)[::2]
+    threshold = floor + fraction * (peak - floor)
+
+    # energy in the ``search`` steps before and after each label
+    flank_offsets = np.arange(1, search + 1)
+    flanks = np.clip(
+        np.concatenate(
+            [
+                local_starts[:, None] - flank_offsets,
+                local_stops[:, None] - 1 + flank_offsets,
+            ],
+            axis=1,
+        ),
+        0,
+        len(energy) - 1,
+    )
+    surrounding = energy[flanks]
+    background = np.median(surrounding, axis=1)
+    spread = 1.4826 * np.median(np.abs(surrounding - background[:, None]), axis=1)
+    distinct = peak - background > min_contrast * spread
+
+    offsets = np.arange(-search, search + 1)
+    start_window = np.clip(local_starts[:, None] + offsets, 0, len(energy) - 1)
+    stop_window = np.clip(local_stops[:, None] - 1 + offsets, 0, len(energy) - 1)
+    start_above = energy[start_window] >= threshold[:, None]
+    stop_above = energy[stop_window] >= threshold[:, None]
+
+    new_starts = np.where(
+        start_above.any(axis=1),
+        start_window[np.arange(len(indices)), start_above.argmax(axis=1)],
+        local_starts,
+    )
+    last_above = stop_above.shape[1] - 1 - stop_above[:, ::-1].argmax(axis=1)
+    new_stops = np.where(
+        stop_above.any(axis=1),
+        stop_window[np.arange(len(indices)), last_above] + 1,
+        local_stops,
+    )
+    valid = distinct & (new_stops > new_starts)
+    return (
+        np.where(valid, new_starts + first, starts),
+        np.where(valid, new_stops + first, stops),
+    )
+
+
+def refine_labels(
+    data: OrcaiData,
+    indices: np.ndarray,
+    band: tuple[float, float] | None = None,
+    fraction: float = THRESHOLD_FRACTION,
+    search: int | None = None,
+    bands: dict[str, tuple[float, float]] | None = None,
+    min_contrast: float = MIN_CONTRAST,
+) -> np.ndarray | None:
+    """Refine label boundaries as one undoable adjustment.
+
+    Labels of the calls in ``bands`` use the frequency band given there,
+    the others ``band``. Returns the journal records, or None if no
+    boundary moved.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = data.predicted_labels
+    label_bands = [band] * len(indices)
+    if bands:
+        calls = labels["label"].iloc[indices].str.rstrip("*")
+        label_bands = [bands.get(call, band) for call in calls]
+    starts = np.empty(len(indices), dtype=np.int64)
+    stops = np.empty(len(indices), dtype=np.int64)
+    # labels with the same band share one pass over the spectrogram
+    for label_band in set(label_bands):
+        group = np.array([b == label_band for b in label_bands], dtype=bool)
+        starts[group], stops[group] = refine_boundaries(
+            data, indices[group], label_band, fraction, search, min_contrast
+        )
+    moved = (starts != labels["start"].to_numpy()[indices]) | (
+        stops != labels["stop"].to_numpy()[indices]
+    )
+    if not moved.any():
+        return None
+    return data.journal.record_many(
+        "adjust", indices[moved], start=starts[moved], stop=stops[moved]
+    )
@@ -0,0 +1,199 @@
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+from orcaigui.orcaidata import OrcaiData
+
+STATISTICS = ("mean", "max")
+
+
+def _prediction_rows(
+    data: OrcaiData, indices: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """First and one-past-last prediction row spanned by each label."""
+    labels = data.predicted_labels
+    n_rows = len(data.aggregated_predictions)
+    step = (
+        data.prediction_times[1] - data.prediction_times[0]
+        if len(data.prediction_times) > 1
+        else 1
+    )
+    starts = labels["start"].to_numpy()[indices]
+    stops = labels["stop"].to_numpy()[indices]
+    first = np.clip(starts // step, 0, max(n_rows - 1, 0)).astype(np.int64)
+    last = np.clip(np.ceil(stops / step), first + 1, n_rows).astype(np.int64)
+    return first, last
+
+
+def label_scores(
+    data: OrcaiData,
+    calls: list[str],
+    indices: np.ndarray | None = None,
+    statistic: str = "mean",
+    cumulative: np.ndarray | None = None,
+) -> np.ndarray:
+    """Model confidence for each label, from the predictions over its span.
+
+    Parameters
+    ----------
+    data : OrcaiData
+        Data with aggregated predictions and predicted labels.
+    calls : list[str]
+        Call names in the order of the prediction columns.
+    indices : np.ndarray | None
+        Labels to score, all labels if None.
+    statistic : str
+        ``mean`` or ``max`` of the prediction of the label's call.
+    cumulative : np.ndarray | None
+        Cumulative sum of the predictions along time with a leading row of
+        zeros, to avoid recomputing it for every call.
+
+    Returns
+    -------
+    np.ndarray
+        Confidence per label. NaN for labels of calls the model does not
+        predict.
+    """
+    labels = data.predicted_labels
+    if indices is None:
+        indices = np.arange(len(labels))
+    predictions = data.aggregated_predictions
+    scores = np.full(len(indices), np.nan)
+    if len(indices) == 0 or len(predictions) == 0:
+        return scores
+
+    call_columns = {call: i for i, call in enumerate(calls[: predictions.shape[1]])}
+    names = labels["label"].iloc[indices].to_numpy()
+    uniques, codes = np.unique(names.astype(str), return_inverse=True)
+    columns = np.array(
+        [call_columns.get(name.replace("*", ""), -1) for name in uniques],
+        dtype=np.int64,
+    )[codes]
+    known = columns >= 0
+
+    first, last = _prediction_rows(data, indices)
+    first, last, columns = first[known], last[known], columns[known]
+    if statistic == "max":
+        bounds = np.column_stack([first, last]).ravel()
+        padded = np.vstack([predictions, predictions[-1:]])
+        maxima = np.maximum.reduceat(padded, bounds, axis=0)[::2]
+        scores[known] = maxima[np.arange(len(columns)), columns]
+    else:
+        if cumulative is None:
+            cumulative = cumulative_predictions(predictions)
+        sums = cumulative[last, columns] - cumulative[first, columns]
+        scores[known] = sums / (last - first)
+    return scores
+
+
+def cumulative_predictions(predictions: np.ndarray) -> np.ndarray:
+    """Cumulative sum along time with a leading row of zeros."""
+    cumulative = np.zeros((len(predictions) + 1, predictions.shape[1]))
+    np.cumsum(predictions, axis=0, out=cumulative[1:])
+    return cumulative
+
+
+class ReviewQueue:
+    """Unchecked labels ordered by how uncertain the model is about them.
+
+    The priority of a label is the distance of its confidence to the
+    detection threshold; labels closest to the threshold come first. The
+    order is kept sorted and updated per label when the journal reports
+    changes, so navigation is O(log n).
+    """
+
+    def __init__(
+        self,
+        data: OrcaiData,
+        calls: list[str],
+        threshold: float = 0.5,
+        statistic: str = "mean",
+    ):
+        self.data = data
+        self.calls = calls
+        self.threshold = threshold
+        self.statistic = statistic
+        self._cumulative = cumulative_predictions(data.aggregated_predictions)
+        self.scores = label_scores(
+            data, calls, statistic=statistic, cumulative=self._cumulative
+        )
+        self.priority = self._priority(self.scores)
+        checked = data.predicted_labels["label_checked"].to_numpy(dtype=bool)
+        unchecked = np.flatnonzero(~checked)
+        order = np.lexsort((unchecked, self.priority[unchecked]))
+        self._order = list(
+            zip(self.priority[unchecked][order].tolist(), unchecked[order].tolist())
+        )
+        data.journal.listeners.append(self.on_journal_change)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _priority(self, scores: np.ndarray) -> np.ndarray:
+        # labels without a score go last
+        return np.nan_to_num(np.abs(scores - self.threshold), nan=np.inf)
+
+    def _key(self, index: int) -> tuple[float, int]:
+        return (float(self.priority[index]), index)
+
+    def first(self) -> int | None:
+        return self._order[0][1] if self._order else None
+
+    def last(self) -> int | None:
+        return self._order[-1][1] if self._order else None
+
+    def next_after(self, index: int) -> int | None:
+        """Next label in priority order, also if ``index`` is no longer queued."""
+        position = bisect_right(self._order, self._key(index))
+        return self._order[position][1] if position < len(self._order) else None
+
+    def previous_before(self, index: int) -> int | None:
+        position = bisect_left(self._order, self._key(index))
+        return self._order[position - 1][1] if position > 0 else None
+
+    def position(self, index: int) -> int | None:
+        """Position of a label in the queue, None if it is not queued."""
+        key = self._key(index)
+        position = bisect_left(self._order, key)
+        if position < len(self._order) and self._order[position] == key:
+            return position
+        return None
+
+    def update(self, indices) -> None:
+        """Re-score labels and move them to their new place in the queue."""
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        n_labels = len(self.data.predicted_labels)
+        if n_labels > len(self.scores):
+            grow = n_labels - len(self.scores)
+            self.scores = np.concatenate([self.scores, np.full(grow, np.nan)])
+            self.priority = np.concatenate([self.priority, np.full(grow, np.inf)])
+
+        for index in indices.tolist():
+            position = self.position(index)
+            if position is not None:
+                del self._order[position]
+
+        existing = indices[indices < n_labels]
+        self.scores[existing] = label_scores(
+            self.data,
+            self.calls,
+            indices=existing,
+            statistic=self.statistic,
+            cumulative=self._cumulative,
+        )
+        self.priority[existing] = self._priority(self.scores[existing])
+        checked = (
+            self.data.predicted_labels["label_checked"]
+            .iloc[existing]
+            .to_numpy(dtype=bool)
+        )
+        for index in existing[~checked].tolist():
+            insort(self._order, self._key(index))
+
+    def on_journal_change(self, records: np.ndarray) -> None:
+        self.update(records["index"])
+
+    def close(self) -> None:
+        """Stop following changes of the labels."""
+        if self.on_journal_change in self.data.journal.listeners:
+            self.data.journal.listeners.remove(self.on_journal_change)
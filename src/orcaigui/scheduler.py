@@ -0,0 +1,209 @@
+import heapq
+import itertools
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from PyQt6.QtCore import QRunnable, QThreadPool
+
+# thread pool jobs and their priority, interactive work first
+JOBS = {
+    "render": 10,  # spectrogram tiles shown or about to be shown
+    "open": 5,  # recordings, projects and channels the curator asked for
+    "merge": 0,
+    "spill": 0,  # arrays moved to disk to stay within the memory budget
+    "channels": 0,  # all channels, in worker processes
+    "follow": -1,
+    "models": -2,
+    "embeddings": -3,  # label embeddings for similarity search
+    "prefetch": -5,  # playlist entries prepared ahead
+}
+# jobs that may only take part of the thread pool, so interactive work finds
+# a free thread
+BACKGROUND = ("follow", "models", "embeddings", "prefetch")
+# stages of the processing pipeline that are limited in how many run at once
+STAGES = ("decode", "stft", "inference", "save")
+NUMERIC_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+@dataclass
+class ThreadPlan:
+    """How the CPUs of a process are shared between the kinds of work.
+
+    ``slots`` is the number of sections of each pipeline stage that may run
+    at the same time. Inference runs one at a time on all but one CPU,
+    left for the GUI; the numeric libraries used by decoding and the STFT
+    get half of the CPUs.
+    """
+
+    n_cpus: int
+    pool_threads: int
+    background_jobs: int
+    slots: dict[str, int]
+    inference_threads: int
+    inter_op_threads: int
+    numeric_threads: int
+
+
+def plan_threads(n_cpus: int | None = None, processes: int = 1) -> ThreadPlan:
+    """Share ``n_cpus``, all by default, among ``processes`` processes."""
+    n_cpus = max(1, (n_cpus or os.cpu_count() or 1) // processes)
+    return ThreadPlan(
+        n_cpus=n_cpus,
+        pool_threads=max(2, n_cpus),
+        background_jobs=max(1, n_cpus // 2),
+        slots={
+            "decode": max(1, n_cpus // 4),
+            "stft": max(1, n_cpus // 4),
+            "inference": 1,
+            "save": 1,
+        },
+        inference_threads=max(1, n_cpus - 1),
+        inter_op_threads=min(2, n_cpus),
+        numeric_threads=max(1, n_cpus // 2),
+    )
+
+
+def configure_tensorflow(plan: ThreadPlan) -> bool:
+    """Set the TensorFlow thread pools, before the first model is loaded.
+
+    Returns whether TensorFlow is installed and was not running yet.
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return False
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(plan.inference_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(plan.inter_op_threads)
+    except RuntimeError as e:
+        # the TensorFlow runtime is initialised already
+        print(e)
+        return False
+    return True
+
+
+def _limit_variable(name: str, threads: int) -> int:
+    """Set a thread count variable to at most ``threads``, returns its value."""
+    current = os.environ.get(name, "")
+    if current.isdigit() and 0 < int(current) < threads:
+        threads = int(current)
+    os.environ[name] = str(threads)
+    return threads
+
+
+def configure_numeric_threads(plan: ThreadPlan) -> None:
+    """Limit the BLAS and OpenMP threads of this process and of child processes.
+
+    A lower limit set in the environment, by the user or a parent process,
+    is kept.
+    """
+    numeric_threads = min(
+        _limit_variable(name, plan.numeric_threads) for name in NUMERIC_THREAD_VARIABLES
+    )
+    _limit_variable("TF_NUM_INTRAOP_THREADS", plan.inference_threads)
+    _limit_variable("TF_NUM_INTEROP_THREADS", plan.inter_op_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=numeric_threads)
+
+
+class Scheduler:
+    """Shares the CPUs between thread pool jobs and pipeline stages.
+
+    ``start`` runs a job on the thread pool with the priority of its kind.
+    Background jobs wait while ``background_jobs`` of them are running.
+    ``slot`` limits how many sections of a pipeline stage run at once, in
+    whichever job or thread they are.
+    """
+
+    def __init__(self, plan: ThreadPlan | None = None):
+        self.plan = plan or plan_threads()
+        self.threadpool = None
+        self._slots = {
+            stage: threading.BoundedSemaphore(self.plan.slots[stage])
+            for stage in STAGES
+        }
+        self._lock = threading.Lock()
+        self._n_background = 0
+        self._waiting = []
+        self._order = itertools.count()
+
+    def configure(
+        self, threadpool: QThreadPool | None = None, plan: ThreadPlan | None = None
+    ) -> None:
+        """Apply a plan to a thread pool, TensorFlow and the numeric libraries."""
+        if plan is not None:
+            self.plan = plan
+            self._slots = {
+                stage: threading.BoundedSemaphore(plan.slots[stage]) for stage in STAGES
+            }
+        if threadpool is not None:
+            threadpool.setMaxThreadCount(self.plan.pool_threads)
+            self.threadpool = threadpool
+        configure_numeric_threads(self.plan)
+        configure_tensorflow(self.plan)
+
+    @contextmanager
+    def slot(self, stage: str):
+        """Run the ``with`` block once a slot of the stage is free."""
+        with self._slots[stage]:
+            yield
+
+    def start(
+        self, runnable: QRunnable, job: str, threadpool: QThreadPool | None = None
+    ) -> None:
+        """Run a job on the thread pool, or queue it if it is background work."""
+        threadpool = threadpool or self.threadpool or QThreadPool.globalInstance()
+        priority = JOBS[job]
+        if job not in BACKGROUND:
+            threadpool.start(runnable, priority)
+            return
+        with self._lock:
+            if self._n_background >= self.plan.background_jobs:
+                heapq.heappush(
+                    self._waiting,
+                    (-priority, next(self._order), runnable, threadpool),
+                )
+                return
+            self._n_background += 1
+        self._start_background(runnable, priority, threadpool)
+
+    def _start_background(
+        self, runnable: QRunnable, priority: int, threadpool: QThreadPool
+    ) -> None:
+        def run():
+            try:
+                runnable.run()
+            finally:
+                self._background_done()
+
+        threadpool.start(run, priority)
+
+    def _background_done(self) -> None:
+        with self._lock:
+            if not self._waiting:
+                self._n_background -= 1
+                return
+            priority, _, runnable, threadpool = heapq.heappop(self._waiting)
+        self._start_background(runnable, -priority, threadpool)
+
+    def n_waiting(self) -> int:
+        with self._lock:
+            return len(self._waiting)
+
+
+scheduler = Scheduler()
+
+
+def configure_worker(n_processes: int) -> None:
+    """Give a worker process its share of the CPUs, before it loads a model."""
+    scheduler.configure(plan=plan_threads(processes=n_processes))
@@ -1,5 +1,8 @@
+from itertools import cycle
+
+import numpy as np
 import pandas as pd
-from PyQt6.QtCore import pyqtSignal, pyqtSlot
+from PyQt6.QtCore import Qt, QThreadPool, pyqtSignal, pyqtSlot
 from pyqtgraph import (
     AxisItem,
     BarGraphItem,
@@ -15,12 +18,33 @@ from pyqtgraph import (
     mkPen,
 )
 
+from orcaigui.diagnostics import timed_slot
 from orcaigui.extensions import timedelta
+from orcaigui.instrumentation import stage
 from orcaigui.orcaidata import OrcaiData
+from orcaigui.prefetch import (
+    OVERVIEW_COLUMNS,
+    TileCache,
+    TilePrefetcher,
+    extend_overview,
+    pool_columns,
+    render_tile,
+    tile_range,
+)
+from orcaigui.scheduler import scheduler
 
 CORRECT_PEN_COLOR = (0, 255, 0, int(0.7 * 255))
 WRONG_PEN_COLOR = (200, 200, 200, int(0.5 * 255))
 WRONG_BRUSH_COLOR = (100, 100, 100, int(0.5 * 255))
+LABEL_BLOCK = 256  # labels per graphics item
+MAX_LABEL_TEXTS = 200  # label names are only shown when fewer labels are visible
+# line styles of the prediction tracks of different models
+TRACK_STYLES = (
+    Qt.PenStyle.SolidLine,
+    Qt.PenStyle.DashLine,
+    Qt.PenStyle.DotLine,
+    Qt.PenStyle.DashDotLine,
+)
 
 
 def _get_call_color(call: str, calls: list[str], alpha: float = 1):
@@ -65,51 +89,77 @@ class LabelTextItem(TextItem):
             self.setPos((label.start + label.stop) / 2, 0.5)
 
 
-class LabelItem(BarGraphItem):
-    def __init__(self, label, calls):
+def _label_style(label, calls: list[str]):
+    """Brush and pen of a label bar, depending on its curation status."""
+    if label.label_checked and not label.label_ok:
+        return mkBrush(WRONG_BRUSH_COLOR), mkPen(WRONG_PEN_COLOR)
+    brush = mkBrush(_get_call_color(label.label, calls=calls, alpha=0.3))
+    if label.label_checked:
+        return brush, mkPen(CORRECT_PEN_COLOR, width=2)
+    return brush, mkPen(_get_call_color(label.label, calls=calls, alpha=0.7))
+
+
+class LabelBlockItem(BarGraphItem):
+    """Bars of a block of consecutive labels, drawn as a single item.
+
+    Drawing labels in blocks keeps the number of graphics items small, so
+    repainting and moving the view do not visit one item per label.
+    """
+
+    def __init__(self, labels: pd.DataFrame, calls: list[str]):
         self.calls = calls
-        if not label.label_checked:
-            brush = mkBrush(
-                _get_call_color(label.label, calls=self.calls, alpha=0.3),
-            )
-            pen = mkPen(_get_call_color(label.label, calls=self.calls, alpha=0.7))
-        else:
-            if label.label_ok:
-                brush = mkBrush(
-                    _get_call_color(label.label, calls=self.calls, alpha=0.3),
-                )
-                pen = mkPen(CORRECT_PEN_COLOR, width=2)
-            else:
-                brush = mkBrush(WRONG_BRUSH_COLOR)
-                pen = mkPen(WRONG_PEN_COLOR)
+        self.first = labels.index[0]
+        styles = [_label_style(label, calls) for label in labels.itertuples()]
         super().__init__(
-            x0=label.start, x1=label.stop, y0=0.25, y1=0.75, brush=brush, pen=pen
+            x0=labels["start"].to_numpy(dtype=float),
+            x1=labels["stop"].to_numpy(dtype=float),
+            y0=0.25,
+            y1=0.75,
+            brushes=[brush for brush, _ in styles],
+            pens=[pen for _, pen in styles],
         )
-        self.setObjectName(str(label.Index))
 
-    def update_item(self, label, update_extent: bool = False):
-        if not label.label_checked:
-            self.setOpts(
-                brush=mkBrush(
-                    _get_call_color(label.label, self.calls, alpha=0.3),
-                ),
-                pen=mkPen(_get_call_color(label.label, self.calls, alpha=0.7)),
-            )
-        else:
-            if label.label_ok:
-                self.setOpts(
-                    brush=mkBrush(
-                        _get_call_color(label.label, self.calls, alpha=0.3),
-                    ),
-                    pen=mkPen(CORRECT_PEN_COLOR, width=2),
-                )
-            else:
-                self.setOpts(
-                    brush=mkBrush(WRONG_BRUSH_COLOR),
-                    pen=mkPen(WRONG_PEN_COLOR),
-                )
+    def set_label(self, label, update_extent: bool = False):
+        """Change the bar of a label without redrawing the block."""
+        i = label.Index - self.first
+        self.opts["brushes"][i], self.opts["pens"][i] = _label_style(label, self.calls)
         if update_extent:
-            self.setOpts(x0=label.start, x1=label.stop)
+            self.opts["x0"][i] = label.start
+            self.opts["x1"][i] = label.stop
+
+    def redraw(self):
+        self.setOpts(
+            x0=self.opts["x0"],
+            x1=self.opts["x1"],
+            brushes=self.opts["brushes"],
+            pens=self.opts["pens"],
+        )
+
+    def update_item(self, label, update_extent: bool = False):
+        self.set_label(label, update_extent=update_extent)
+        self.redraw()
+
+    def __len__(self) -> int:
+        return len(self.opts["x0"])
+
+    def extend(self, labels: pd.DataFrame):
+        """Add bars for labels following the last one of the block."""
+        styles = [_label_style(label, self.calls) for label in labels.itertuples()]
+        self.setOpts(
+            x0=np.append(self.opts["x0"], labels["start"].to_numpy(dtype=float)),
+            x1=np.append(self.opts["x1"], labels["stop"].to_numpy(dtype=float)),
+            brushes=[*self.opts["brushes"], *(brush for brush, _ in styles)],
+            pens=[*self.opts["pens"], *(pen for _, pen in styles)],
+        )
+
+    def truncate(self, n_labels: int):
+        """Keep the bars of the first ``n_labels`` labels of the block."""
+        self.setOpts(
+            x0=self.opts["x0"][:n_labels],
+            x1=self.opts["x1"][:n_labels],
+            brushes=self.opts["brushes"][:n_labels],
+            pens=self.opts["pens"][:n_labels],
+        )
 
 
 class DurationAxisItem(AxisItem):
@@ -214,11 +264,23 @@ class SpectrogramWidget(GraphicsLayoutWidget):
         max_x_range=1500,
         colormap_name="Greys",
         expand_focus_region=0.1,  # expand the focus region by 10% -> length(longest label) * (1 + expand_focus_region)
+        threadpool: QThreadPool | None = None,
         parent=None,
     ):
         super().__init__(parent)
 
         self.data = None
+        self.label_items = {}
+        self.label_texts = {}
+        self.threadpool = threadpool or QThreadPool.globalInstance()
+        self.tile_cache = TileCache()
+        self.prefetcher = None
+        # changes with the data and colours tiles are rendered from, so tiles
+        # of an earlier prefetch are not cached
+        self.tile_generation = 0
+        self.spectrogram_levels = (0.0, 1.0)
+        self.prediction_curves = []
+        self.prediction_tracks = None  # models whose predictions are shown
         self.calls = calls
         self.max_x_range = max_x_range
         self.colormap_name = colormap_name
@@ -275,6 +337,13 @@ class SpectrogramWidget(GraphicsLayoutWidget):
         self.prediction_legend_box.setMaximumHeight(10)
 
         self.addItem(self.navigation_plot, row=3, col=0)
+        self.prediction_plot.scene().sigMouseClicked.connect(
+            self.mouse_clicked_prediction_plot
+        )
+
+    @timed_slot("paint")
+    def paintEvent(self, event):
+        super().paintEvent(event)
 
     def update_data(
         self,
@@ -298,6 +367,12 @@ class SpectrogramWidget(GraphicsLayoutWidget):
             else self.max_x_range,
         ]
         self.colormap_name = colormap_name
+        self.spectrogram_levels = (
+            float(np.nanmin(self.data.spectrogram)),
+            float(np.nanmax(self.data.spectrogram)),
+        )
+        self.stop_prefetcher()
+        self.tile_cache.clear()
         self.update_plots()
 
     def update_plots(self):
@@ -305,24 +380,49 @@ class SpectrogramWidget(GraphicsLayoutWidget):
         if self.data is None:
             self.status.showMessage("No data available")
             return
-
+        with stage("render", labels=len(self.data.predicted_labels)):
+            self.draw_plots()
+
+    def draw_plots(self):
+        # a low-resolution overview of the whole recording, with a tile at
+        # full resolution on top of it for the visible region
+        self.n_frames = len(self.data.times)
+        self.overview_step = max(
+            1, -(-self.data.spectrogram.shape[1] // OVERVIEW_COLUMNS)
+        )
+        self.overview = pool_columns(self.data.spectrogram, OVERVIEW_COLUMNS)
         self.spectrogram_image = ImageItem()
-        self.spectrogram_image.setImage(self.data.spectrogram.T)
-        lut = colormap.get(self.colormap_name, source="matplotlib").getLookupTable()
-        self.spectrogram_image.setLookupTable(lut)
+        self.spectrogram_image.setImage(self.overview.T, levels=self.spectrogram_levels)
+        self.spectrogram_image.setRect(
+            0, 0, len(self.data.times), self.data.spectrogram.shape[0]
+        )
+        self.lut = colormap.get(
+            self.colormap_name, source="matplotlib"
+        ).getLookupTable()
+        self.spectrogram_image.setLookupTable(self.lut)
+        self.detail_image = ImageItem()
 
         self.spectrogram_plot.clear()
         self.spectrogram_plot.addItem(self.spectrogram_image)
+        self.spectrogram_plot.addItem(self.detail_image)
 
+        # ranges are set explicitly, auto-ranging would visit every label item
+        # whenever the view moves
         self.spectrogram_plot.setLimits(xMin=0, xMax=self.plot_x_max)
-        self.spectrogram_plot.setRange(xRange=self.plot_x_range)
+        self.spectrogram_plot.setRange(
+            xRange=self.plot_x_range, yRange=(0, self.data.spectrogram.shape[0])
+        )
+        self.spectrogram_plot.disableAutoRange()
 
         self.prediction_plot.clear()
+        self.prediction_plot.setClipToView(True)
+        self.prediction_plot.setDownsampling(auto=True, mode="peak")
         self.navigation_plot.clear()
         self.prediction_legend.clear()
 
         self.navigation_plot.setLimits(xMin=0, xMax=self.plot_x_max)
-        self.navigation_plot.setRange(xRange=[0, self.plot_x_max])
+        self.navigation_plot.setRange(xRange=[0, self.plot_x_max], yRange=(0.25, 0.75))
+        self.navigation_plot.disableAutoRange()
         self.navigation_region = LinearRegionItem(
             values=self.plot_x_range,
             bounds=[0, self.plot_x_max],
@@ -334,35 +434,177 @@ class SpectrogramWidget(GraphicsLayoutWidget):
             self.navigation_region,
         )
 
-        for i, call in enumerate(self.calls):
-            self.prediction_plot.plot(
-                x=self.data.prediction_times,
-                y=self.data.aggregated_predictions[:, i],
-                pen=mkPen(_get_call_color(call, self.calls)),
-                name=self.calls[i],
-            )
-            self.prediction_legend.addItem(self.prediction_plot.items[-1], call)
+        self.prediction_curves = []
+        self.update_prediction_curves()
 
-        for label in self.data.predicted_labels.itertuples():
-            prediction_bgitem = LabelItem(label, calls=self.calls)
-            # Can't use same item (and .copy() doesn't work)
-            navigation_bgitem = LabelItem(label, calls=self.calls)
-
-            call_label = LabelTextItem(label, calls=self.calls)
-            self.prediction_plot.addItem(prediction_bgitem)
-            self.navigation_plot.addItem(navigation_bgitem)
-            self.prediction_plot.addItem(call_label)
-            call_label.setPos(
-                (label.start + label.stop) / 2,
-                0.5,
-            )
+        # graphics items of each label, to update them without scanning the plots
+        self.label_items = {}
+        self.label_texts = {}  # created when a label is first shown
+        self.shown_texts = set()
+        self.add_label_items(0)
         self.prediction_plot.setLimits(xMin=0, xMax=self.plot_x_max)
-        self.prediction_plot.setRange(xRange=self.plot_x_range)
+        self.prediction_plot.setRange(xRange=self.plot_x_range, yRange=(0, 1))
+        self.prediction_plot.disableAutoRange()
         self.prediction_plot.showGrid(x=True, y=True)
-        self.prediction_plot.scene().sigMouseClicked.connect(
-            self.mouse_clicked_prediction_plot
+        self.show_label_texts(self.plot_x_range)
+        self.show_detail(self.plot_x_range)
+
+    def add_label_items(self, first_label: int):
+        """Draw the labels from ``first_label`` on, in blocks."""
+        labels = self.data.predicted_labels
+        for first in range(first_label, len(labels), LABEL_BLOCK):
+            block = labels.iloc[first : first + LABEL_BLOCK]
+            prediction_block = LabelBlockItem(block, calls=self.calls)
+            # Can't use same item (and .copy() doesn't work)
+            navigation_block = LabelBlockItem(block, calls=self.calls)
+            self.prediction_plot.addItem(prediction_block)
+            self.navigation_plot.addItem(navigation_block)
+            for index in block.index:
+                self.label_items[index] = (prediction_block, navigation_block)
+
+    def update_label_count(self):
+        """Draw the labels appended to the table or drop those removed from it.
+
+        Creating a label, or undoing that, only changes the end of the
+        table, so only the last block of labels is redrawn.
+        """
+        n_drawn = len(self.label_items)
+        n_labels = len(self.data.predicted_labels)
+        if n_labels > n_drawn:
+            self.append_label_items(n_drawn)
+        elif n_labels < n_drawn:
+            self.remove_label_items(n_labels)
+        self.show_label_texts(self.navigation_region.getRegion())
+
+    def append_label_items(self, first_label: int):
+        """Draw the labels from ``first_label`` on, filling up the last block."""
+        labels = self.data.predicted_labels.iloc[first_label:]
+        self.max_label_duration = max(
+            self.max_label_duration, (labels["stop"] - labels["start"]).max()
+        )
+        if first_label > 0:
+            blocks = self.label_items[first_label - 1]
+            labels = labels.iloc[: LABEL_BLOCK - len(blocks[0])]
+            if not labels.empty:
+                for block in blocks:
+                    block.extend(labels)
+                for index in labels.index:
+                    self.label_items[index] = blocks
+                first_label += len(labels)
+        self.add_label_items(first_label)
+
+    def remove_label_items(self, first_label: int):
+        """Remove the graphics of the labels from ``first_label`` on."""
+        blocks = {}
+        for index in range(first_label, len(self.label_items)):
+            prediction_block, navigation_block = self.label_items.pop(index)
+            blocks[id(prediction_block)] = (prediction_block, navigation_block)
+            if index in self.shown_texts:
+                self.prediction_plot.removeItem(self.label_texts[index])
+                self.shown_texts.discard(index)
+            self.label_texts.pop(index, None)
+        for prediction_block, navigation_block in blocks.values():
+            if first_label > prediction_block.first:
+                prediction_block.truncate(first_label - prediction_block.first)
+                navigation_block.truncate(first_label - navigation_block.first)
+            else:
+                self.prediction_plot.removeItem(prediction_block)
+                self.navigation_plot.removeItem(navigation_block)
+
+    def extend_plots(self, first_frame: int, n_labels: int):
+        """Draw time steps and labels appended to the data.
+
+        Time steps from ``first_frame`` on and labels from ``n_labels`` on
+        are new or changed. Unlike ``update_plots``, the work depends on the
+        appended data only, apart from the prediction curves. If the view
+        shows the old end of the recording, it moves along to the new end.
+        """
+        new_labels = self.data.predicted_labels.iloc[n_labels:]
+        if not new_labels.empty:
+            self.max_label_duration = max(
+                self.max_label_duration,
+                (new_labels["stop"] - new_labels["start"]).max(),
+            )
+        self.overview, self.overview_step = extend_overview(
+            self.overview, self.overview_step, self.data.spectrogram, first_frame
+        )
+        self.stop_prefetcher()
+        self.tile_cache.discard_from(first_frame)
+        self.spectrogram_image.setImage(
+            self.overview.T, levels=self.spectrogram_levels, autoLevels=False
+        )
+        self.spectrogram_image.setRect(
+            0, 0, len(self.data.times), self.data.spectrogram.shape[0]
         )
 
+        region = self.navigation_region.getRegion()
+        self.plot_x_max = len(self.data.times) * 1.05
+        for plot in (self.spectrogram_plot, self.prediction_plot, self.navigation_plot):
+            plot.setLimits(xMax=self.plot_x_max)
+        self.navigation_plot.setRange(xRange=[0, self.plot_x_max])
+        self.navigation_region.setBounds([0, self.plot_x_max])
+        self.update_prediction_curves()
+        self.add_label_items(n_labels)
+        if region[1] >= self.n_frames:
+            shift = len(self.data.times) - self.n_frames
+            self.navigation_region.setRegion((region[0] + shift, region[1] + shift))
+        else:
+            self.show_label_texts(region)
+            self.show_detail(region)
+        self.n_frames = len(self.data.times)
+
+    def main_track_name(self) -> str:
+        return self.data.model_name or "predictions"
+
+    def prediction_track_names(self) -> list[str]:
+        """Models with predictions for the data, the main model first."""
+        if self.data is None:
+            return []
+        return [self.main_track_name(), *self.data.model_predictions]
+
+    def set_prediction_tracks(self, names: list[str]):
+        """Show the predictions of the given models, overlaid."""
+        self.prediction_tracks = list(names)
+        if self.data is not None:
+            self.update_prediction_curves()
+
+    def update_prediction_curves(self):
+        """Draw the prediction curves of the selected models."""
+        for curve in self.prediction_curves:
+            self.prediction_plot.removeItem(curve)
+        self.prediction_curves = []
+        self.prediction_legend.clear()
+
+        tracks = [
+            (
+                self.main_track_name(),
+                self.calls,
+                self.data.prediction_times,
+                self.data.aggregated_predictions,
+            )
+        ]
+        tracks += [
+            (name, p.calls, p.prediction_times, p.aggregated_predictions)
+            for name, p in self.data.model_predictions.items()
+        ]
+        shown = [
+            track
+            for track in tracks
+            if track[0] in (self.prediction_tracks or [self.main_track_name()])
+        ] or tracks[:1]
+        for style, (name, calls, times, predictions) in zip(cycle(TRACK_STYLES), shown):
+            for i, call in enumerate(calls[: predictions.shape[1]]):
+                palette = self.calls if call in self.calls else calls
+                curve = self.prediction_plot.plot(
+                    x=times,
+                    y=predictions[:, i],
+                    pen=mkPen(_get_call_color(call, palette), style=style),
+                )
+                self.prediction_curves.append(curve)
+                self.prediction_legend.addItem(
+                    curve, call if len(shown) == 1 else f"{call} ({name})"
+                )
+
     def mouse_clicked_prediction_plot(self, ev):
         if not ev.double():
             return
@@ -377,44 +619,146 @@ class SpectrogramWidget(GraphicsLayoutWidget):
             return
 
         # Check if a label was clicked
-        near_bg_items = [
-            x
-            for x in self.prediction_plot.scene().itemsNearEvent(ev)
-            if isinstance(x, BarGraphItem)
-        ]
-        if len(near_bg_items) > 0:
-            label_index = int(near_bg_items[0].objectName())
-            self.clicked_label.emit(label_index)
+        labels = self.data.predicted_labels
+        clicked = np.flatnonzero(
+            (labels["start"].to_numpy() <= pos.x())
+            & (labels["stop"].to_numpy() >= pos.x())
+        )
+        if 0.25 <= pos.y() <= 0.75 and len(clicked) > 0:
+            self.clicked_label.emit(int(clicked[0]))
             return
         else:
             start = int(pos.x())
             self.new_label.emit(start)
 
     @pyqtSlot(int, bool)
+    @timed_slot()
     def update_prediction_label(
         self,
         label_index: int,
         update_extent: bool = False,
     ):
-        label = self.data.predicted_labels.iloc[label_index]
-
-        prediction_plot_items = [
-            x for x in self.prediction_plot.items if x.objectName() == str(label_index)
-        ]
-        navigation_plot_items = [
-            x for x in self.navigation_plot.items if x.objectName() == str(label_index)
-        ]
-
-        for item in prediction_plot_items:
-            item.update_item(label, update_extent=update_extent)
-
-        for item in navigation_plot_items:
-            item.update_item(label, update_extent=update_extent)
+        self.update_prediction_labels([label_index], update_extent=update_extent)
+
+    def update_prediction_labels(self, label_indices, update_extent: bool = False):
+        """Update the graphics of several labels in one pass."""
+        labels = self.data.predicted_labels.iloc[label_indices]
+        blocks = {}
+        for label in labels.itertuples():
+            if label.Index not in self.label_items:
+                continue
+            for block in self.label_items[label.Index]:
+                block.set_label(label, update_extent=update_extent)
+                blocks[id(block)] = block
+            if label.Index in self.label_texts:
+                self.label_texts[label.Index].update_item(
+                    label, update_extent=update_extent
+                )
+        for block in blocks.values():
+            block.redraw()
 
+    @timed_slot("pan")
     def update_plot_region(self, region):
         region = self.navigation_region.getRegion()
         self.spectrogram_plot.setRange(xRange=region, disableAutoRange=True)
         self.prediction_plot.setRange(xRange=region, disableAutoRange=True)
+        self.show_label_texts(region)
+        self.show_detail(region)
+
+    def show_label_texts(self, region):
+        """Show the names of the labels in a region.
+
+        Only the names of visible labels are part of the plot, so moving the
+        view does not update thousands of text items.
+        """
+        labels = self.data.predicted_labels
+        visible = np.flatnonzero(
+            (labels["stop"].to_numpy() >= region[0])
+            & (labels["start"].to_numpy() <= region[1])
+        )
+        shown = set(visible.tolist()) if len(visible) <= MAX_LABEL_TEXTS else set()
+        for index in self.shown_texts - shown:
+            self.prediction_plot.removeItem(self.label_texts[index])
+        for index in shown - self.shown_texts:
+            if index not in self.label_texts:
+                label = next(labels.iloc[[index]].itertuples())
+                call_label = LabelTextItem(label, calls=self.calls)
+                call_label.setPos((label.start + label.stop) / 2, 0.5)
+                self.label_texts[index] = call_label
+            self.prediction_plot.addItem(self.label_texts[index])
+        self.shown_texts = shown
+
+    def has_full_spectrogram(self) -> bool:
+        """Whether the spectrogram is loaded at full resolution."""
+        return self.data.spectrogram.shape[1] == len(self.data.times)
+
+    def show_detail(self, region):
+        """Show the spectrogram of a region at full resolution."""
+        if self.data is None or not self.has_full_spectrogram():
+            return
+        key = tile_range(region, len(self.data.times))
+        if key[1] <= key[0]:
+            self.detail_image.clear()
+            return
+        tile = self.tile_cache.get(key)
+        if tile is None:
+            tile = render_tile(
+                self.data.spectrogram, *key, self.lut, self.spectrogram_levels
+            )
+            self.tile_cache.put(key, tile)
+        self.detail_image.setImage(tile, autoLevels=False)
+        self.detail_image.setRect(
+            key[0], 0, key[1] - key[0], self.data.spectrogram.shape[0]
+        )
+
+    def focus_region(self, label_index: int) -> tuple[float, float]:
+        """Region shown when focusing on a label."""
+        label = self.data.predicted_labels.iloc[label_index]
+        start, stop = label.start, label.stop
+        duration = stop - start
+        extra = (
+            (self.max_label_duration * (1 + self.expand_focus_region)) - duration
+        ) / 2
+        return (start - extra, stop + extra)
+
+    @pyqtSlot(list)
+    def prefetch_labels(self, label_indices: list[int]):
+        """Render the tiles of labels likely to be focused next in the background."""
+        if self.data is None or not self.has_full_spectrogram():
+            return
+        n_frames = len(self.data.times)
+        ranges = []
+        for label_index in label_indices:
+            key = tile_range(self.focus_region(label_index), n_frames)
+            if key[1] > key[0] and key not in self.tile_cache and key not in ranges:
+                ranges.append(key)
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        if not ranges:
+            self.prefetcher = None
+            return
+        self.prefetcher = TilePrefetcher(
+            self.data.spectrogram, ranges, self.lut, self.spectrogram_levels
+        )
+        self.prefetcher.signals.result.connect(
+            lambda result, generation=self.tile_generation: self.tile_prefetched(
+                result, generation
+            )
+        )
+        scheduler.start(self.prefetcher, "render", self.threadpool)
+
+    def stop_prefetcher(self):
+        """Cancel a prefetch and ignore the tiles it still delivers."""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+        self.tile_generation += 1
+
+    def tile_prefetched(self, result, generation: int):
+        if generation != self.tile_generation:
+            return
+        key, tile = result
+        self.tile_cache.put(key, tile)
 
     def set_colormap(self, colormap_name):
         """Set the colormap for the spectrogram."""
@@ -423,22 +767,24 @@ class SpectrogramWidget(GraphicsLayoutWidget):
         if self.data.spectrogram is None:
             return
         self.colormap_name = colormap_name
-        lut = colormap.get(self.colormap_name, source="matplotlib").getLookupTable()
+        self.lut = colormap.get(
+            self.colormap_name, source="matplotlib"
+        ).getLookupTable()
 
-        self.spectrogram_image.setLookupTable(lut)
+        self.spectrogram_image.setLookupTable(self.lut)
+        self.stop_prefetcher()
+        self.tile_cache.clear()
+        self.show_detail(self.navigation_region.getRegion())
 
     @pyqtSlot(int)
+    @timed_slot()
     def focus_on_label(self, label_index):
         """Focus on a specific label in the spectrogram."""
 
         label = self.data.predicted_labels.iloc[label_index]
         start, stop = label.start, label.stop
-        duration = stop - start
-        extra = (
-            (self.max_label_duration * (1 + self.expand_focus_region)) - duration
-        ) / 2
 
-        self.navigation_region.setRegion([start - extra, stop + extra])
+        self.navigation_region.setRegion(self.focus_region(label_index))
 
         # add roi region to spectrogram plot
         if hasattr(self, "label_adjust_region"):
@@ -454,9 +800,14 @@ class SpectrogramWidget(GraphicsLayoutWidget):
         self.spectrogram_plot.addItem(self.label_adjust_region)
 
     @pyqtSlot()
+    @timed_slot()
     def adjust_label(self):
         region = self.label_adjust_region.getRegion()
-        self.data.predicted_labels.loc[self.current_label, "start"] = int(region[0])
-        self.data.predicted_labels.loc[self.current_label, "stop"] = int(region[1])
+        self.data.journal.record(
+            "adjust",
+            self.current_label,
+            start=int(region[0]),
+            stop=int(region[1]),
+        )
         self.update_prediction_label(self.current_label, update_extent=True)
         return
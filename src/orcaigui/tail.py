@@ -0,0 +1,291 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from librosa import resample
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from orcaigui.audio_file_loader import (
+    WavLayout,
+    compute_channel,
+    read_frames,
+    wav_layout,
+)
+from orcaigui.instrumentation import stage
+from orcaigui.orcaidata import OrcaiData
+from orcaigui.scheduler import scheduler
+
+POLL_INTERVAL = 10  # seconds between checks of a followed recording
+# arrays of OrcaiData that grow with the recording: their time axis, and
+# whether it counts prediction steps rather than time steps
+GROWING = {
+    "spectrogram": (1, False),
+    "times": (0, False),
+    "pp_spectrogram": (0, False),
+    "aggregated_predictions": (0, True),
+    "prediction_times": (0, True),
+}
+
+
+class GrowingArray:
+    """An array extended along one axis, with spare capacity.
+
+    The capacity doubles when it runs out, so appending costs time
+    proportional to the appended values, amortised.
+    """
+
+    def __init__(self, array: np.ndarray, axis: int = 0):
+        self.axis = axis
+        self.length = array.shape[axis]
+        shape = list(array.shape)
+        shape[axis] = max(2 * self.length, 1024)
+        self.buffer = np.empty(shape, dtype=array.dtype)
+        self._part(self.buffer, 0, self.length)[...] = array
+        self.view = self._part(self.buffer, 0, self.length)
+
+    def _part(self, array: np.ndarray, start: int, stop: int) -> np.ndarray:
+        return array[(slice(None),) * self.axis + (slice(start, stop),)]
+
+    def truncate(self, length: int) -> np.ndarray:
+        """Drop the values from ``length`` on."""
+        self.length = min(length, self.length)
+        self.view = self._part(self.buffer, 0, self.length)
+        return self.view
+
+    def extend(self, values: np.ndarray) -> np.ndarray:
+        """Append ``values`` and return a view of the whole array."""
+        length = self.length + values.shape[self.axis]
+        if length > self.buffer.shape[self.axis]:
+            shape = list(self.buffer.shape)
+            shape[self.axis] = 2 * length
+            buffer = np.empty(shape, dtype=self.buffer.dtype)
+            self._part(buffer, 0, self.length)[...] = self.view
+            self.buffer = buffer
+        self._part(self.buffer, self.length, length)[...] = values
+        self.length = length
+        self.view = self._part(self.buffer, 0, self.length)
+        return self.view
+
+
+@dataclass
+class TailUpdate:
+    """Time steps, predictions and labels appended to a recording.
+
+    The arrays replace the ones of the recording from ``first_step`` and
+    ``first_row`` on.
+    """
+
+    first_step: int
+    first_row: int
+    spectrogram: np.ndarray
+    times: np.ndarray
+    pp_spectrogram: np.ndarray
+    aggregated_predictions: np.ndarray
+    prediction_times: np.ndarray
+    predicted_labels: pd.DataFrame
+
+
+class RecordingTail:
+    """Processes the samples appended to a WAV file that is being recorded.
+
+    Each update decodes the new frames plus enough earlier audio to cover
+    one model window, and runs them through ``compute_channel``. Time steps
+    within one model window of either end of that chunk see incomplete
+    model windows, so only the steps in between are kept. The last window
+    is processed again with the next update, or with the final update when
+    the recording is done. Labels are kept once they end in the kept steps;
+    a label that runs past them is found again by the next update.
+
+    The last model window of ``data`` was processed without the audio that
+    follows it, so the first update processes it again. Labels found there
+    are only added if they do not overlap one of the same call.
+
+    ``update`` runs in a worker thread and only reads the recording.
+    ``extend`` appends its result to ``data`` in the GUI thread. A
+    preprocessed spectrogram that was not stored stays so; it is regenerated
+    from the whole spectrogram when needed.
+    """
+
+    def __init__(self, data: OrcaiData, orcai_parameter: dict, model, shape: dict):
+        self.data = data
+        self.recording_path = data.recording_path
+        self.channel = data.channel
+        self.orcai_parameter = orcai_parameter
+        self.model = model
+        self.shape = shape
+        self.sampling_rate = orcai_parameter["spectrogram"]["sampling_rate"]
+        self.hop = orcai_parameter["spectrogram"]["n_overlap"]
+        self.delta_t = data.delta_t() or self.hop / self.sampling_rate
+        self.pool = 2 ** len(orcai_parameter["model"]["filters"])
+        # one model window in time steps, whole prediction steps
+        self.context = -(-int(shape["input_shape"][0]) // self.pool) * self.pool
+        n_steps = len(data.times)
+        self.n_steps = max(0, n_steps - self.context) // self.pool * self.pool
+        self.n_predictions = min(
+            len(data.aggregated_predictions), self.n_steps // self.pool
+        )
+        self.n_labelled = self.n_steps
+        self.label_boundary = self.n_steps
+        # labels in the time steps processed again, not to be added twice
+        labels = data.predicted_labels
+        self.known_labels = labels.loc[
+            labels["stop"] > self.n_steps, ["start", "stop", "label"]
+        ].copy()
+        self.buffers: dict[str, GrowingArray] = {}
+
+    def available_steps(self, layout: WavLayout) -> int:
+        samples = layout.n_frames * self.sampling_rate / layout.sampling_rate
+        return int(samples) // self.hop
+
+    def update(self, final: bool = False) -> TailUpdate | None:
+        """Process the new part of the recording, if there is enough of it.
+
+        Without ``final``, two model windows of new audio are needed, so at
+        least as many time steps are kept as are processed again later.
+        """
+        layout = wav_layout(self.recording_path)
+        if not final and (
+            self.available_steps(layout) - self.n_steps < 2 * self.context
+        ):
+            return None
+        start = min(self.n_steps, self.label_boundary, self.n_predictions * self.pool)
+        # a whole number of model windows from the beginning of the recording,
+        # so the model sees the same windows as when processing all of it
+        start = max(0, start - self.context) // self.context * self.context
+        first_frame = round(
+            start * self.hop * layout.sampling_rate / self.sampling_rate
+        )
+        with (
+            scheduler.slot("decode"),
+            stage("decode", recording=self.recording_path.name, tail=True) as record,
+        ):
+            audio = read_frames(
+                self.recording_path, layout, first_frame, layout.n_frames
+            )
+            if layout.sampling_rate != self.sampling_rate:
+                audio = resample(
+                    audio, orig_sr=layout.sampling_rate, target_sr=self.sampling_rate
+                )
+            record.size(audio=audio)
+        results = compute_channel(
+            audio,
+            self.recording_path,
+            self.channel,
+            self.orcai_parameter,
+            self.model,
+            self.shape,
+        )
+
+        chunk_steps = results["spectrogram"].shape[1]
+        chunk_row = start // self.pool
+        if final:
+            stop = start + chunk_steps
+            stop_row = chunk_row + len(results["aggregated_predictions"])
+        else:
+            stop = (start + chunk_steps - self.context) // self.pool * self.pool
+            stop_row = min(
+                stop // self.pool, chunk_row + len(results["aggregated_predictions"])
+            )
+        if stop <= self.n_steps:
+            return None
+
+        labels = results["predicted_labels"]
+        labels[["start", "stop"]] += start
+        labels = labels[
+            (labels["start"] >= self.label_boundary)
+            & (labels["stop"] > self.n_labelled)
+        ]
+        if not self.known_labels.empty:
+            labels = labels[~self.is_known(labels)]
+        label_boundary = stop
+        if not final:
+            running = labels["stop"] > stop
+            if running.any():
+                label_boundary = min(stop, int(labels.loc[running, "start"].min()))
+            labels = labels[~running]
+
+        update = TailUpdate(
+            first_step=self.n_steps,
+            first_row=self.n_predictions,
+            spectrogram=results["spectrogram"][:, self.n_steps - start : stop - start],
+            times=np.arange(self.n_steps, stop) * self.delta_t,
+            pp_spectrogram=results["pp_spectrogram"][
+                self.n_steps - start : stop - start
+            ],
+            aggregated_predictions=results["aggregated_predictions"][
+                self.n_predictions - chunk_row : stop_row - chunk_row
+            ],
+            prediction_times=np.arange(self.n_predictions, stop_row) * self.pool,
+            predicted_labels=labels.sort_values("start").reset_index(drop=True),
+        )
+        self.n_steps = stop
+        self.n_predictions = max(self.n_predictions, stop_row)
+        self.n_labelled = max(self.n_labelled, stop)
+        self.label_boundary = label_boundary
+        if (
+            not self.known_labels.empty
+            and self.label_boundary >= self.known_labels["stop"].max()
+        ):
+            self.known_labels = self.known_labels.iloc[:0]
+        return update
+
+    def is_known(self, labels: pd.DataFrame) -> np.ndarray:
+        """Whether labels overlap a known label of the same call."""
+        known = self.known_labels
+        same_call = (
+            labels["label"].str.rstrip("*").to_numpy()[:, None]
+            == known["label"].str.rstrip("*").to_numpy()[None, :]
+        )
+        overlap = (labels["start"].to_numpy()[:, None] < known["stop"].to_numpy()) & (
+            labels["stop"].to_numpy()[:, None] > known["start"].to_numpy()
+        )
+        return (same_call & overlap).any(axis=1)
+
+    def extend(self, update: TailUpdate) -> None:
+        """Append an update to the data, the labels through the journal."""
+        for name, (axis, by_row) in GROWING.items():
+            if getattr(self.data, name) is None:
+                continue
+            buffer = self.buffers.get(name)
+            if buffer is None or buffer.view is not getattr(self.data, name):
+                # first update, or the array was replaced, e.g. memory-mapped
+                buffer = GrowingArray(getattr(self.data, name), axis=axis)
+                self.buffers[name] = buffer
+            buffer.truncate(update.first_row if by_row else update.first_step)
+            setattr(self.data, name, buffer.extend(getattr(update, name)))
+        if not update.predicted_labels.empty:
+            self.data.journal.create_many(update.predicted_labels)
+
+
+class TailProcessorSignals(QObject):
+    """Signals for the TailProcessor class."""
+
+    progress = pyqtSignal(str)
+    error = pyqtSignal(tuple)
+    result = pyqtSignal(object)
+    finished = pyqtSignal()
+
+
+class TailProcessor(QRunnable):
+    """Runs one update of a followed recording."""
+
+    def __init__(self, tail: RecordingTail, final: bool = False):
+        super().__init__()
+        self.signals = TailProcessorSignals()
+        self.tail = tail
+        self.final = final
+
+    def run(self):
+        try:
+            self.signals.progress.emit(
+                f"Checking {self.tail.recording_path.name} for new audio..."
+            )
+            update = self.tail.update(final=self.final)
+        except Exception as e:
+            print(e)
+            self.signals.error.emit((type(e), e))
+        else:
+            if update is not None:
+                self.signals.result.emit(update)
+        finally:
+            self.signals.finished.emit()
@@ -0,0 +1,466 @@
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from orcaigui.audio_file_loader import (
+    channel_count,
+    compute_channel,
+    load_recording,
+    wav_layout,
+)
+from orcaigui.inference_backend import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    exported_path,
+    load_model_backend,
+)
+from orcaigui.instrumentation import recorder, stage
+from orcaigui.orcaidata import OrcaiData
+from orcaigui.playlist import default_project_path
+from orcaigui.scheduler import configure_worker
+
+STATE_DIR = ".orcaigui-watch"
+POLL_INTERVAL = 10  # seconds between scans of the watched folder
+SETTLE_TIME = 30  # seconds a recording must stay unchanged before it is queued
+THROUGHPUT_WINDOW = 3600  # seconds of finished recordings the throughput covers
+STATUSES = ("pending", "running", "done", "failed")
+MAX_ATTEMPTS = 3  # tries of a recording while worker processes die
+
+_worker_models = {}
+_inference_slots = None
+
+
+def project_paths(
+    recording_path: Path, output_dir: Path, n_channels: int
+) -> list[Path]:
+    """Projects written for a recording, one per channel."""
+    return [
+        output_dir / default_project_path(recording_path, channel, n_channels).name
+        for channel in range(1, n_channels + 1)
+    ]
+
+
+def _init_worker(inference_slots, n_processes: int) -> None:
+    global _inference_slots
+    _inference_slots = inference_slots
+    configure_worker(n_processes)
+    # the daemon decides when running recordings are abandoned
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def process_recording(
+    recording_path: Path,
+    output_dir: Path,
+    model_dir: Path,
+    spectrogram_storage: str = "full",
+    pp_spectrogram_storage: str = "full",
+    backend: str = DEFAULT_BACKEND,
+) -> dict:
+    """Write a project for every channel of a recording, in a worker process.
+
+    The model is loaded once per worker process, for the inference backend
+    ``backend``, inference waits for one of
+    the slots shared by all workers. Projects are written under a temporary
+    name and renamed when complete, so a project that exists is complete.
+    Returns the projects, the duration of the recording and the stage
+    records made while processing.
+    """
+    recorder.clear()
+    if (model_dir, backend) not in _worker_models:
+        _worker_models[(model_dir, backend)] = load_model_backend(model_dir, backend)
+    model, orcai_parameter, shape = _worker_models[(model_dir, backend)]
+    sampling_rate = orcai_parameter["spectrogram"]["sampling_rate"]
+    with stage("decode", recording=recording_path.name) as record:
+        wav_file = load_recording(recording_path, sampling_rate)
+        record.size(audio=wav_file)
+    projects = project_paths(recording_path, output_dir, channel_count(wav_file))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for channel, project_path in enumerate(projects, start=1):
+        results = compute_channel(
+            wav_file,
+            recording_path,
+            channel,
+            orcai_parameter,
+            model,
+            shape,
+            inference_lock=_inference_slots,
+        )
+        part_path = project_path.with_name(project_path.name + ".part")
+        OrcaiData(**results).save_as_hdf5(
+            part_path,
+            spectrogram_storage=spectrogram_storage,
+            pp_spectrogram_storage=pp_spectrogram_storage,
+        )
+        os.replace(part_path, project_path)
+    return {
+        "projects": [str(path) for path in projects],
+        "duration": wav_file.shape[-1] / sampling_rate,
+        "records": list(recorder.records),
+    }
+
+
+class WatchQueue:
+    """Recordings found in the watched folder and what became of them.
+
+    The queue is kept in a JSON file, rewritten on every change, so it
+    survives restarts. Recordings that were running when the daemon stopped
+    are pending again when it starts.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if path.exists():
+            self.entries = json.loads(path.read_text())["recordings"]
+        for entry in self.entries.values():
+            if entry["status"] == "running":
+                entry["status"] = "pending"
+
+    def save(self) -> None:
+        write_json(self.path, {"recordings": self.entries})
+
+    def add(self, recording_path: Path, size: int, mtime: float) -> None:
+        self.entries[str(recording_path)] = {
+            "status": "pending",
+            "size": size,
+            "mtime": mtime,
+            "queued": time.time(),
+            "attempts": 0,
+        }
+        self.save()
+
+    def is_current(self, recording_path: Path, size: int, mtime: float) -> bool:
+        """Whether the recording is queued as it is now, not since changed."""
+        entry = self.entries.get(str(recording_path))
+        return entry is not None and (entry["size"], entry["mtime"]) == (size, mtime)
+
+    def pending(self) -> list[Path]:
+        """Pending recordings, the ones queued first first."""
+        pending = [
+            (entry["queued"], key)
+            for key, entry in self.entries.items()
+            if entry["status"] == "pending"
+        ]
+        return [Path(key) for _, key in sorted(pending)]
+
+    def update(self, recording_path: Path, status: str, **info) -> None:
+        entry = self.entries[str(recording_path)]
+        entry["status"] = status
+        entry.update(info)
+        self.save()
+
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        for entry in self.entries.values():
+            counts[entry["status"]] += 1
+        return counts
+
+
+def write_json(path: Path, content: dict) -> None:
+    """Replace a JSON file at once, so readers never see half of it."""
+    part_path = path.with_name(path.name + ".part")
+    part_path.write_text(json.dumps(content, indent=2, default=str))
+    os.replace(part_path, path)
+
+
+def read_status(directory: Path, state_dir: Path | None = None) -> dict:
+    """The status last written by the daemon watching ``directory``."""
+    return json.loads(
+        ((state_dir or directory / STATE_DIR) / "status.json").read_text()
+    )
+
+
+class WatchDaemon:
+    """Turns recordings appearing in a folder into projects ready to curate.
+
+    WAV files are queued once their size and modification time have not
+    changed for ``settle_time`` seconds, so recordings still being written
+    are left alone; recordings whose projects all exist are skipped.
+    Projects of recordings in subfolders go to the same subfolders of
+    ``output_dir``.
+    ``workers`` processes take recordings from the queue. At most that many
+    are handed to the pool at once, the rest wait in the queue, and at most
+    ``max_inference`` of the workers run a model at the same time. Models
+    are run with the inference ``backend``, exported before the workers
+    start if it has not been before.
+
+    The queue and ``status.json``, with the queue depth, the running
+    recordings and the throughput, are kept in ``state_dir``. The first
+    SIGINT or SIGTERM stops taking new recordings and waits for the running
+    ones, the second abandons them; they are processed again on restart.
+
+    If a worker process dies, e.g. killed for lack of memory, the pool is
+    restarted and the recordings that were running are tried again, up to
+    ``MAX_ATTEMPTS`` times.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        model_dir: Path,
+        output_dir: Path | None = None,
+        state_dir: Path | None = None,
+        workers: int = 2,
+        max_inference: int = 1,
+        poll_interval: float = POLL_INTERVAL,
+        settle_time: float = SETTLE_TIME,
+        recursive: bool = False,
+        spectrogram_storage: str = "full",
+        pp_spectrogram_storage: str = "full",
+        backend: str = DEFAULT_BACKEND,
+        log=print,
+    ):
+        self.directory = Path(directory)
+        self.model_dir = Path(model_dir)
+        self.output_dir = Path(output_dir) if output_dir else self.directory
+        self.state_dir = Path(state_dir) if state_dir else self.directory / STATE_DIR
+        self.workers = workers
+        self.max_inference = max_inference
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.recursive = recursive
+        self.storage = (spectrogram_storage, pp_spectrogram_storage)
+        self.backend = backend
+        self.log = log
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.queue = WatchQueue(self.state_dir / "queue.json")
+        self.status_path = self.state_dir / "status.json"
+        # last size and modification time of unqueued recordings, and since when
+        self.unsettled: dict[Path, tuple[int, float, float]] = {}
+        # future and start time of the recordings handed to the pool
+        self.running: dict[Path, tuple] = {}
+        self.finished: deque[tuple[float, float]] = deque()
+        self.started = time.time()
+        self.stopping = 0
+        self.wake = threading.Event()
+
+    def scan(self) -> None:
+        """Queue the recordings that have settled."""
+        pattern = "**/*" if self.recursive else "*"
+        paths = {
+            path
+            for path in self.directory.glob(pattern)
+            if path.suffix.lower() == ".wav" and self.state_dir not in path.parents
+        }
+        now = time.time()
+        for path in self.unsettled.keys() - paths:
+            del self.unsettled[path]
+        for path in sorted(paths):
+            try:
+                info = path.stat()
+            except OSError:
+                continue
+            size, mtime = info.st_size, info.st_mtime
+            if self.queue.is_current(path, size, mtime) or path in self.running:
+                continue
+            last = self.unsettled.get(path)
+            if last is None or last[:2] != (size, mtime):
+                self.unsettled[path] = (size, mtime, now)
+                continue
+            if now - last[2] < self.settle_time:
+                continue
+            del self.unsettled[path]
+            self.queue.add(path, size, mtime)
+            if self.is_processed(path):
+                self.queue.update(path, "done", skipped=True)
+                self.log(f"Skipped {path.name}, its projects exist")
+            else:
+                self.log(f"Queued {path.name}")
+
+    def recording_output_dir(self, recording_path: Path) -> Path:
+        """Folder of the projects of a recording, mirroring its subfolder."""
+        return self.output_dir / recording_path.parent.relative_to(self.directory)
+
+    def is_processed(self, recording_path: Path) -> bool:
+        """Whether all projects of a recording exist and are newer than it."""
+        try:
+            n_channels = wav_layout(recording_path).n_channels
+        except (OSError, ValueError, struct.error):
+            return False
+        mtime = recording_path.stat().st_mtime
+        return all(
+            path.exists() and path.stat().st_mtime >= mtime
+            for path in project_paths(
+                recording_path, self.recording_output_dir(recording_path), n_channels
+            )
+        )
+
+    def submit(self, pool) -> None:
+        """Hand pending recordings to free workers."""
+        for path in self.queue.pending()[: self.workers - len(self.running)]:
+            if not path.exists():
+                self.queue.update(path, "failed", error="Recording disappeared")
+                continue
+            attempts = self.queue.entries[str(path)]["attempts"] + 1
+            self.queue.update(path, "running", started=time.time(), attempts=attempts)
+            future = pool.submit(
+                process_recording,
+                path,
+                self.recording_output_dir(path),
+                self.model_dir,
+                *self.storage,
+                self.backend,
+            )
+            self.running[path] = (future, time.time())
+            self.log(f"Processing {path.name}")
+
+    def collect(self) -> bool:
+        """Record the recordings the workers are done with.
+
+        Returns whether a worker process died, which breaks the pool.
+        """
+        broken = False
+        for path, (future, started) in list(self.running.items()):
+            if not future.done():
+                continue
+            del self.running[path]
+            try:
+                output = future.result()
+            except BrokenProcessPool:
+                broken = True
+                if self.queue.entries[str(path)]["attempts"] < MAX_ATTEMPTS:
+                    self.queue.update(path, "pending")
+                    self.log(f"Worker processing {path.name} died, trying again")
+                    continue
+                error = f"Worker process died {MAX_ATTEMPTS} times"
+                self.queue.update(path, "failed", error=error, finished=time.time())
+                self.log(f"Failed {path.name}: {error}")
+                continue
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                self.queue.update(path, "failed", error=error, finished=time.time())
+                self.log(f"Failed {path.name}: {error}")
+                continue
+            recorder.extend(output["records"])
+            now = time.time()
+            self.finished.append((now, output["duration"]))
+            self.queue.update(
+                path,
+                "done",
+                projects=output["projects"],
+                duration=output["duration"],
+                seconds=now - started,
+                finished=now,
+            )
+            self.log(
+                f"Done {path.name}: {len(output['projects'])} projects "
+                f"in {now - started:.0f} s"
+            )
+        return broken
+
+    def status(self) -> dict:
+        """Queue depth, running recordings and throughput."""
+        now = time.time()
+        while self.finished and self.finished[0][0] < now - THROUGHPUT_WINDOW:
+            self.finished.popleft()
+        window = min(THROUGHPUT_WINDOW, now - self.started)
+        audio_seconds = sum(duration for _, duration in self.finished)
+        return {
+            "pid": os.getpid(),
+            "directory": str(self.directory),
+            "started": self.started,
+            "updated": now,
+            "state": "stopping" if self.stopping else "watching",
+            "workers": self.workers,
+            "max_inference": self.max_inference,
+            "queue_depth": len(self.queue.pending()),
+            "settling": len(self.unsettled),
+            "running": {
+                str(path): now - started for path, (_, started) in self.running.items()
+            },
+            "counts": self.queue.counts(),
+            "throughput": {
+                "window": window,
+                "recordings_per_hour": len(self.finished) * 3600 / max(window, 1),
+                "audio_seconds_per_second": audio_seconds / max(window, 1),
+            },
+            "stages": {
+                name: summary["wall"] for name, summary in recorder.summary().items()
+            },
+        }
+
+    def write_status(self) -> None:
+        write_json(self.status_path, self.status())
+
+    def stop(self, *_) -> None:
+        self.stopping += 1
+        if self.stopping == 1 and self.running:
+            self.log(
+                f"Finishing {len(self.running)} running recordings, "
+                "stop again to abandon them"
+            )
+        self.wake.set()
+
+    def start_pool(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context("spawn")
+        # new inference slots, a worker that died may have held one
+        inference_slots = context.BoundedSemaphore(self.max_inference)
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(inference_slots, self.workers),
+        )
+
+    def run(self, once: bool = False) -> None:
+        """Watch until stopped, or with ``once`` until the queue is empty."""
+        if (
+            BACKENDS[self.backend][0] is not None
+            and not exported_path(self.model_dir, self.backend).exists()
+        ):
+            # once here rather than in every worker
+            self.log(f"Exporting {self.model_dir.name} for {self.backend}")
+            load_model_backend(self.model_dir, self.backend)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+        pool = self.start_pool()
+        self.log(
+            f"Watching {self.directory} with {self.workers} workers, "
+            f"{len(self.queue.pending())} recordings pending"
+        )
+        last_scan = 0.0
+        try:
+            while self.stopping < 2:
+                if not self.stopping and time.time() - last_scan >= self.poll_interval:
+                    self.scan()
+                    last_scan = time.time()
+                if self.collect():
+                    self.log("A worker process died, restarting the workers")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.start_pool()
+                if not self.stopping:
+                    self.submit(pool)
+                self.write_status()
+                if self.stopping and not self.running:
+                    break
+                if once and not (
+                    self.running or self.unsettled or self.queue.pending()
+                ):
+                    break
+                self.wake.wait(
+                    1 if self.running or self.unsettled else self.poll_interval
+                )
+                self.wake.clear()
+        finally:
+            if self.running:
+                self.log(f"Abandoning {len(self.running)} running recordings")
+                for process in multiprocessing.active_children():
+                    process.terminate()
+                for path in self.running:
+                    self.queue.update(path, "pending")
+                self.running.clear()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.stopping = max(self.stopping, 1)
+            status = self.status()
+            status["state"] = "stopped"
+            write_json(self.status_path, status)
+            self.log("Stopped watching")